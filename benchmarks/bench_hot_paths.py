@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热点路径微基准
+测量 authInfo 构造、编码、签名与频率限制的吞吐（ops/s）和单次调用的内存分配峰值，
+结果与JSON基线比较，吞吐下降或内存分配增加超过阈值时以非0状态码退出，可用于CI。
+
+用法：
+    python benchmarks/bench_hot_paths.py --save          # 记录基线
+    python benchmarks/bench_hot_paths.py                 # 与基线比较，默认阈值20%
+    python benchmarks/bench_hot_paths.py --threshold 0.1 --only get_sign_rsa2
+
+基线与机器相关，应在同一台机器（或同规格的CI节点）上记录和比较。
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import threading
+import statistics
+import tracemalloc
+from typing import Callable, Dict
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 服务初始化时的日志不计入测量
+logging.disable(logging.INFO)
+
+from config.alipay_config import alipay_config
+from services.alipay_service import AlipayService
+from rate_limiter import RateLimiter
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+PID = "2088102123816631"
+TARGET_ID = "auth_1700000000000000_ab12cd34"
+MIN_TIME = 0.2          # 每轮最短测量时间（秒）
+REPEATS = 5             # 测量轮数，取中位数
+ALLOC_SAMPLES = 50      # 测量内存分配的调用次数
+CONTENTION_THREADS = 8  # 频率限制并发测试的线程数
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    """构造被测函数，每个函数不带参数、执行一次被测操作"""
+    service = AlipayService()
+    auth_info_map = service.build_auth_info_map(PID, TARGET_ID, True)
+    private_key = alipay_config.app_private_key
+    limiter = RateLimiter(max_requests=5, time_window=60)
+
+    return {
+        "build_auth_info_map": lambda: service.build_auth_info_map(PID, TARGET_ID, True),
+        "build_auth_info_map_auto_target": lambda: service.build_auth_info_map(PID, None, True),
+        "build_order_param": lambda: service.build_order_param(auth_info_map),
+        "_build_key_value_encoded": lambda: service._build_key_value("target_id", TARGET_ID, True),
+        "_build_key_value_raw": lambda: service._build_key_value("target_id", TARGET_ID, False),
+        "get_sign_rsa": lambda: service.get_sign(auth_info_map, private_key, False),
+        "get_sign_rsa2": lambda: service.get_sign(auth_info_map, private_key, True),
+        "generate_auth_info": lambda: service.generate_auth_info(PID, TARGET_ID, True),
+        "rate_limiter_is_allowed": lambda: limiter.is_allowed("10.0.0.1"),
+    }
+
+
+def measure_ops(func: Callable[[], object]) -> float:
+    """测量单线程吞吐：先标定每轮调用次数，再取多轮的中位数"""
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_TIME / 4:
+            break
+        iterations *= 4
+    iterations = max(1, int(iterations * MIN_TIME / elapsed))
+
+    rates = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        rates.append(iterations / (time.perf_counter() - started))
+    return statistics.median(rates)
+
+
+def measure_alloc(func: Callable[[], object]) -> int:
+    """测量单次调用的内存分配峰值（字节），取多次调用的中位数"""
+    func()
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(ALLOC_SAMPLES):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return int(statistics.median(peaks))
+
+
+def measure_contention(threads: int) -> float:
+    """多线程并发调用 RateLimiter.is_allowed 的总吞吐"""
+    limiter = RateLimiter(max_requests=5, time_window=60)
+    calls = 20000
+    rates = []
+    for _ in range(REPEATS):
+        barrier = threading.Barrier(threads + 1)
+
+        def worker(index: int):
+            keys = [f"10.{index}.{i // 256}.{i % 256}" for i in range(256)]
+            barrier.wait()
+            for i in range(calls):
+                limiter.is_allowed(keys[i & 255])
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for t in workers:
+            t.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for t in workers:
+            t.join()
+        rates.append(threads * calls / (time.perf_counter() - started))
+    return statistics.median(rates)
+
+
+def run(only: str = None) -> Dict[str, Dict[str, float]]:
+    """执行全部（或指定的）基准，返回 {名称: {ops_per_sec, alloc_peak_bytes}}"""
+    results = {}
+    for name, func in build_cases().items():
+        if only and only != name:
+            continue
+        results[name] = {
+            "ops_per_sec": round(measure_ops(func), 1),
+            "alloc_peak_bytes": measure_alloc(func),
+        }
+    name = f"rate_limiter_is_allowed_{CONTENTION_THREADS}_threads"
+    if not only or only == name:
+        results[name] = {"ops_per_sec": round(measure_contention(CONTENTION_THREADS), 1)}
+    return results
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> list:
+    """与基线比较，打印对比表并返回回归项列表"""
+    regressions = []
+    print(f"{'基准':<40} {'ops/s':>14} {'基线':>14} {'变化':>8} {'分配峰值B':>10} {'基线':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        ops = result["ops_per_sec"]
+        alloc = result.get("alloc_peak_bytes")
+        if base is None:
+            print(f"{name:<40} {ops:>14,.0f} {'-':>14} {'-':>8} {alloc if alloc is not None else '-':>10} {'-':>8}")
+            continue
+
+        change = ops / base["ops_per_sec"] - 1
+        base_alloc = base.get("alloc_peak_bytes")
+        print(f"{name:<40} {ops:>14,.0f} {base['ops_per_sec']:>14,.0f} {change:>+8.1%} "
+              f"{alloc if alloc is not None else '-':>10} {base_alloc if base_alloc is not None else '-':>8}")
+
+        if change < -threshold:
+            regressions.append(f"{name}: 吞吐下降 {-change:.1%}")
+        # 分配峰值很小时允许少量字节的抖动
+        if alloc is not None and base_alloc is not None and alloc > max(base_alloc * (1 + threshold), base_alloc + 256):
+            regressions.append(f"{name}: 内存分配峰值 {base_alloc}B -> {alloc}B")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点路径微基准")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--save", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的回归比例，默认0.2（20%%）")
+    parser.add_argument("--only", help="只运行指定名称的基准")
+    args = parser.parse_args()
+
+    print("=== 热点路径微基准 ===\n")
+    results = run(args.only)
+
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2, ensure_ascii=False)
+        for name, result in results.items():
+            print(f"{name:<40} {result['ops_per_sec']:>14,.0f} ops/s  {result.get('alloc_peak_bytes', '-')} B")
+        print(f"\n基线已保存到 {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"基线文件 {args.baseline} 不存在，请先使用 --save 记录基线")
+        sys.exit(2)
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    if saved.get("environment") != environment():
+        print(f"警告：基线记录环境 {saved.get('environment')} 与当前环境 {environment()} 不同，比较结果仅供参考\n")
+
+    regressions = compare(results, saved["results"], args.threshold)
+    if regressions:
+        print(f"\n性能回归（阈值 {args.threshold:.0%}）：")
+        for item in regressions:
+            print(f"  - {item}")
+        sys.exit(1)
+    print(f"\n未发现超过 {args.threshold:.0%} 的性能回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+登录流程压测（使用本地模拟网关）
+在子进程中启动 mock_alipay_gateway，按给定并发执行“授权码换取令牌 + 获取用户信息”，
+输出吞吐与延迟分位数。模拟网关的延迟与故障注入参数原样透传。
+
+用法：
+    python benchmarks/bench_login_flow.py --concurrency 64 --requests 2000 -- --latency-ms 60 --latency-p99-ms 300
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MOCK_GATEWAY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_alipay_gateway.py")
+
+
+def start_mock_gateway(port: int, mock_args: list) -> tuple:
+    """启动模拟网关子进程，返回 (进程, 网关地址, 公钥)"""
+    process = subprocess.Popen(
+        [sys.executable, MOCK_GATEWAY, "--port", str(port), *mock_args],
+        stdout=subprocess.PIPE, text=True
+    )
+    settings = {}
+    while len(settings) < 2:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("模拟网关启动失败")
+        if line.startswith("ALIPAY_"):
+            name, value = line.strip().split("=", 1)
+            settings[name] = value
+    return process, settings["ALIPAY_MOCK_GATEWAY_URL"], settings["ALIPAY_MOCK_PUBLIC_KEY"]
+
+
+async def run(concurrency: int, total: int) -> tuple:
+    """按并发执行登录流程，返回 (每次登录耗时列表, 失败次数, 总耗时)"""
+    from services.async_alipay_service import AsyncAlipayService
+
+    service = AsyncAlipayService()
+    await service.warm_up(min(concurrency, 8))
+    latencies = []
+    failures = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal failures
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                token_info = await service.get_access_token(f"bench_code_{i}")
+                await service.get_user_info(token_info["access_token"])
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await service.aclose()
+    return latencies, failures, elapsed
+
+
+def percentile(ordered: list, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录流程压测（本地模拟网关）")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("mock_args", nargs="*", help="透传给模拟网关的参数（放在 -- 之后）")
+    args = parser.parse_args()
+
+    process, gateway_url, public_key = start_mock_gateway(args.port, args.mock_args)
+    try:
+        # 配置需在导入服务模块前设置
+        os.environ["ALIPAY_MOCK_GATEWAY_URL"] = gateway_url
+        os.environ["ALIPAY_MOCK_PUBLIC_KEY"] = public_key
+        time.sleep(0.5)
+        latencies, failures, elapsed = asyncio.run(run(args.concurrency, args.requests))
+    finally:
+        process.terminate()
+        process.wait()
+
+    ordered = sorted(latencies)
+    print("=== 登录流程压测 ===")
+    print(f"并发数: {args.concurrency}, 登录次数: {args.requests}, 模拟网关参数: {' '.join(args.mock_args) or '默认'}\n")
+    print(f"成功: {len(latencies)}, 失败: {failures}, 耗时: {elapsed:.2f}s, 吞吐: {len(latencies) / elapsed:,.1f} 次/秒")
+    print(f"延迟 p50: {percentile(ordered, 0.5) * 1000:.1f}ms, "
+          f"p90: {percentile(ordered, 0.9) * 1000:.1f}ms, "
+          f"p99: {percentile(ordered, 0.99) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
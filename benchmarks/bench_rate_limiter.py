@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RateLimiter 锁竞争微基准
+分别在 1、8、64 个线程下测量 is_allowed 的吞吐，
+对比单锁（stripes=1，等价于原来的全局锁）与默认锁分片的表现
+"""
+
+import sys
+import os
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import RateLimiter
+
+THREAD_COUNTS = [1, 8, 64]
+CALLS_PER_THREAD = 20000
+KEYS_PER_THREAD = 256
+
+
+def run_once(limiter: RateLimiter, threads: int) -> float:
+    """多线程并发调用 is_allowed，返回每秒调用次数"""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(thread_index: int):
+        keys = [f"10.{thread_index}.{i // 256}.{i % 256}" for i in range(KEYS_PER_THREAD)]
+        barrier.wait()
+        for i in range(CALLS_PER_THREAD):
+            limiter.is_allowed(keys[i % KEYS_PER_THREAD])
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return threads * CALLS_PER_THREAD / elapsed
+
+
+def main():
+    print("=== RateLimiter 锁竞争基准 ===")
+    print(f"每线程调用次数: {CALLS_PER_THREAD}, 每线程key数: {KEYS_PER_THREAD}\n")
+    print(f"{'线程数':>6} {'单锁 ops/s':>14} {'分片锁 ops/s':>14}")
+    for threads in THREAD_COUNTS:
+        single = run_once(RateLimiter(max_requests=5, time_window=60, stripes=1), threads)
+        striped = run_once(RateLimiter(max_requests=5, time_window=60), threads)
+        print(f"{threads:>6} {single:>14,.0f} {striped:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
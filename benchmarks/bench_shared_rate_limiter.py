@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享内存频率限制后端基准
+1. 单进程内对比进程内后端（memory）与共享内存后端（shm）在 1、8 个线程下的吞吐
+2. 启动多个进程同时请求同一个key，验证 shm 后端在进程之间只放行一份限额
+"""
+
+import sys
+import os
+import time
+import tempfile
+import threading
+import multiprocessing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import create_rate_limiter
+
+THREAD_COUNTS = [1, 8]
+CALLS_PER_THREAD = 20000
+KEYS_PER_THREAD = 256
+PROCESS_COUNT = 4
+MAX_REQUESTS = 5
+
+
+def run_once(limiter, threads: int) -> float:
+    """多线程并发调用 is_allowed，返回每秒调用次数"""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(thread_index: int):
+        keys = [f"10.{thread_index}.{i // 256}.{i % 256}" for i in range(KEYS_PER_THREAD)]
+        barrier.wait()
+        for i in range(CALLS_PER_THREAD):
+            limiter.is_allowed(keys[i % KEYS_PER_THREAD])
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return threads * CALLS_PER_THREAD / elapsed
+
+
+def count_allowed(path: str, mode: str, attempts: int) -> int:
+    """子进程：对同一个key请求若干次，返回被允许的次数"""
+    limiter = create_rate_limiter(MAX_REQUESTS, 60, mode=mode, backend="shm", shm_path=path)
+    return sum(limiter.is_allowed("203.0.113.1") for _ in range(attempts))
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+
+    print("=== 频率限制后端吞吐基准 ===")
+    print(f"每线程调用次数: {CALLS_PER_THREAD}, 每线程key数: {KEYS_PER_THREAD}\n")
+    print(f"{'模式':>8} {'线程数':>6} {'memory ops/s':>14} {'shm ops/s':>14}")
+    for mode in ("sliding", "gcra"):
+        for threads in THREAD_COUNTS:
+            memory = run_once(create_rate_limiter(MAX_REQUESTS, 60, mode=mode), threads)
+            shm_path = os.path.join(tmpdir, f"bench-{mode}-{threads}")
+            shm = run_once(create_rate_limiter(MAX_REQUESTS, 60, mode=mode, backend="shm", shm_path=shm_path),
+                           threads)
+            print(f"{mode:>8} {threads:>6} {memory:>14,.0f} {shm:>14,.0f}")
+
+    print(f"\n=== 跨进程限额（{PROCESS_COUNT} 个进程，同一个key，限额 {MAX_REQUESTS}）===")
+    mp_context = multiprocessing.get_context("spawn")
+    for mode in ("sliding", "gcra"):
+        path = os.path.join(tmpdir, f"cross-{mode}")
+        with mp_context.Pool(PROCESS_COUNT) as pool:
+            allowed = pool.starmap(count_allowed, [(path, mode, 20)] * PROCESS_COUNT)
+        print(f"{mode:>8}: 各进程放行 {allowed}，合计 {sum(allowed)}（期望 {MAX_REQUESTS}）")
+
+
+if __name__ == "__main__":
+    main()
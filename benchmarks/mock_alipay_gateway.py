@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟支付宝网关
+实现 alipay.system.oauth.token 与 alipay.user.info.share，响应使用模拟网关自己的密钥签名，
+服务端把 ALIPAY_MOCK_PUBLIC_KEY 配置为模拟网关的公钥后即可正常验签。
+可以设置响应延迟分布、HTTP错误率、业务错误率、限流响应和挂起（超时）比例，
+用于在无外网的环境下按接近真实的上游延迟压测登录流程。
+
+用法：
+    python benchmarks/mock_alipay_gateway.py --port 9100 --latency-ms 60 --latency-p99-ms 300
+    # 按启动时打印的内容配置服务端后启动
+    ALIPAY_MOCK_GATEWAY_URL=http://127.0.0.1:9100/gateway.do ALIPAY_MOCK_PUBLIC_KEY=<打印的公钥> python main.py
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import secrets
+import base64
+from urllib.parse import parse_qsl
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+import uvicorn
+
+METHOD_OAUTH_TOKEN = "alipay.system.oauth.token"
+METHOD_USER_INFO_SHARE = "alipay.user.info.share"
+
+# 模拟网关返回的错误（取值参照支付宝开放平台的公共错误码）
+INVALID_AUTH_CODE = {"code": "40002", "msg": "Invalid Arguments",
+                     "sub_code": "isv.code-invalid", "sub_msg": "授权码code无效"}
+INVALID_AUTH_TOKEN = {"code": "20001", "msg": "Insufficient Token Permissions",
+                      "sub_code": "aop.invalid-auth-token", "sub_msg": "无效的访问令牌"}
+THROTTLED = {"code": "40004", "msg": "Business Failed",
+             "sub_code": "aop.ACQ.SYSTEM_ERROR", "sub_msg": "调用频率超限，请稍后重试"}
+UNSUPPORTED_METHOD = {"code": "40002", "msg": "Invalid Arguments",
+                      "sub_code": "isv.invalid-method", "sub_msg": "不存在的方法名"}
+
+
+def load_or_create_key(path: str):
+    """加载模拟网关私钥，文件不存在时生成新的2048位密钥并保存"""
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            return serialization.load_pem_private_key(f.read(), password=None)
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if path:
+        with open(path, "wb") as f:
+            f.write(key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption()
+            ))
+    return key
+
+
+def public_key_base64(key) -> str:
+    """公钥的Base64内容（不含PEM头尾），可直接作为 ALIPAY_MOCK_PUBLIC_KEY"""
+    der = key.public_key().public_bytes(
+        serialization.Encoding.DER,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return base64.b64encode(der).decode("ascii")
+
+
+class LatencyModel:
+    """响应延迟分布
+
+    p99 不大于中位数时为固定延迟，否则为对数正态分布：中位数为 median_ms，99分位为 p99_ms，
+    与真实网关“大部分请求很快、少量请求很慢”的长尾形态接近。
+    """
+
+    def __init__(self, median_ms: float, p99_ms: float = 0.0):
+        self.median = median_ms / 1000
+        self.sigma = math.log(p99_ms / median_ms) / 2.326 if median_ms > 0 and p99_ms > median_ms else 0.0
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        if not self.sigma:
+            return self.median
+        return self.median * math.exp(random.gauss(0.0, self.sigma))
+
+
+class TokenBucket:
+    """模拟网关的全局QPS限制，超出时返回限流响应"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class MockAlipayGateway:
+    """模拟网关ASGI应用
+
+    令牌不在模拟网关中保存：访问令牌与刷新令牌中带有用户ID，获取用户信息时从令牌中解析，
+    因此任意授权码都能换取令牌，多个模拟网关进程之间也不需要共享状态。
+    """
+
+    def __init__(self, key, latency: LatencyModel, error_rate: float = 0.0, biz_error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, max_qps: float = 0.0, hang_rate: float = 0.0,
+                 hang_seconds: float = 30.0, sign_type: str = "RSA2"):
+        """
+        初始化模拟网关
+
+        Args:
+            key: 签名响应使用的RSA私钥
+            latency: 响应延迟分布
+            error_rate: 返回HTTP 502的比例
+            biz_error_rate: 返回业务错误（授权码或令牌无效）的比例
+            throttle_rate: 随机返回限流响应的比例
+            max_qps: 全局QPS上限，超出时返回限流响应，0表示不限制
+            hang_rate: 长时间不响应的比例，用于测试客户端超时
+            hang_seconds: 不响应的持续时间（秒）
+            sign_type: 响应签名类型，RSA2 或 RSA
+        """
+        self.key = key
+        self.latency = latency
+        self.error_rate = error_rate
+        self.biz_error_rate = biz_error_rate
+        self.throttle_rate = throttle_rate
+        self.bucket = TokenBucket(max_qps)
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.algorithm = hashes.SHA256() if sign_type == "RSA2" else hashes.SHA1()
+
+        # 统计信息
+        self.stats = {"requests": 0, "http_errors": 0, "biz_errors": 0, "throttled": 0, "hung": 0}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        if scope["path"] == "/stats":
+            await self._send(send, 200, json.dumps(self.stats).encode())
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        # HEAD 用于连接预热，直接返回
+        if scope["method"] == "HEAD":
+            await self._send(send, 200, b"")
+            return
+
+        params = dict(parse_qsl(scope.get("query_string", b"").decode()))
+        params.update(parse_qsl(body.decode()))
+        status, payload = await self.handle(params)
+        await self._send(send, status, payload)
+
+    async def handle(self, params: dict):
+        """按故障注入设置处理一次网关请求
+
+        Returns:
+            tuple: (HTTP状态码, 响应体)
+        """
+        self.stats["requests"] += 1
+        method = params.get("method", "")
+
+        if random.random() < self.hang_rate:
+            self.stats["hung"] += 1
+            await asyncio.sleep(self.hang_seconds)
+
+        delay = self.latency.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+        if random.random() < self.error_rate:
+            self.stats["http_errors"] += 1
+            return 502, b"Bad Gateway"
+
+        if not self.bucket.take() or random.random() < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return 200, self._signed("error_response", THROTTLED)
+
+        node = method.replace(".", "_") + "_response"
+        if method == METHOD_OAUTH_TOKEN:
+            content = self._oauth_token(params)
+        elif method == METHOD_USER_INFO_SHARE:
+            content = self._user_info_share(params)
+        else:
+            return 200, self._signed("error_response", UNSUPPORTED_METHOD)
+
+        if content.get("code") not in (None, "10000"):
+            self.stats["biz_errors"] += 1
+            node = "error_response"
+        return 200, self._signed(node, content)
+
+    def _oauth_token(self, params: dict) -> dict:
+        if random.random() < self.biz_error_rate:
+            return INVALID_AUTH_CODE
+
+        grant_type = params.get("grant_type")
+        if grant_type == "authorization_code" and params.get("code"):
+            user_id = "2088" + str(int(hashlib.sha1(params["code"].encode()).hexdigest(), 16))[:12]
+        elif grant_type == "refresh_token" and params.get("refresh_token", "").startswith("mockrt"):
+            user_id = params["refresh_token"][6:22]
+        else:
+            return INVALID_AUTH_CODE
+
+        return {
+            "user_id": user_id,
+            "open_id": "mock" + hashlib.sha1(user_id.encode()).hexdigest(),
+            "access_token": f"mockat{user_id}{secrets.token_hex(8)}",
+            "expires_in": 1296000,
+            "refresh_token": f"mockrt{user_id}{secrets.token_hex(8)}",
+            "re_expires_in": 2592000,
+            "auth_start": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def _user_info_share(self, params: dict) -> dict:
+        auth_token = params.get("auth_token", "")
+        if not auth_token.startswith("mockat") or random.random() < self.biz_error_rate:
+            return INVALID_AUTH_TOKEN
+
+        user_id = auth_token[6:22]
+        return {
+            "code": "10000",
+            "msg": "Success",
+            "user_id": user_id,
+            "open_id": "mock" + hashlib.sha1(user_id.encode()).hexdigest(),
+            "nick_name": f"模拟用户{user_id[-4:]}",
+            "avatar": "https://tfs.alipayobjects.com/images/partner/T1mock",
+            "gender": "m",
+            "province": "浙江省",
+            "city": "杭州市",
+            "user_type": "2",
+            "user_status": "T",
+            "is_certified": "T",
+        }
+
+    def _signed(self, node: str, content: dict) -> bytes:
+        """生成签名响应：对响应节点的原始JSON文本签名，与支付宝网关的格式一致"""
+        node_json = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+        sign = base64.b64encode(
+            self.key.sign(node_json.encode("utf-8"), padding.PKCS1v15(), self.algorithm)
+        ).decode("ascii")
+        return f'{{"{node}":{node_json},"sign":"{sign}"}}'.encode("utf-8")
+
+    @staticmethod
+    async def _send(send, status: int, body: bytes):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json;charset=utf-8"),
+                        (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟支付宝网关")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--key-file", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_gateway_key.pem"),
+                        help="模拟网关私钥文件，不存在时自动生成")
+    parser.add_argument("--sign-type", default="RSA2", choices=["RSA2", "RSA"])
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="响应延迟中位数（毫秒）")
+    parser.add_argument("--latency-p99-ms", type=float, default=0.0, help="响应延迟99分位（毫秒），不大于中位数时为固定延迟")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回HTTP 502的比例")
+    parser.add_argument("--biz-error-rate", type=float, default=0.0, help="返回业务错误的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="随机返回限流响应的比例")
+    parser.add_argument("--max-qps", type=float, default=0.0, help="全局QPS上限，0表示不限制")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="长时间不响应的比例")
+    parser.add_argument("--hang-seconds", type=float, default=30.0, help="不响应的持续时间（秒）")
+    args = parser.parse_args()
+
+    key = load_or_create_key(args.key_file)
+    app = MockAlipayGateway(
+        key=key,
+        latency=LatencyModel(args.latency_ms, args.latency_p99_ms),
+        error_rate=args.error_rate,
+        biz_error_rate=args.biz_error_rate,
+        throttle_rate=args.throttle_rate,
+        max_qps=args.max_qps,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        sign_type=args.sign_type
+    )
+
+    print("=== 模拟支付宝网关 ===")
+    print(f"ALIPAY_MOCK_GATEWAY_URL=http://{args.host}:{args.port}/gateway.do")
+    print(f"ALIPAY_MOCK_PUBLIC_KEY={public_key_base64(key)}")
+    print(f"统计信息: http://{args.host}:{args.port}/stats\n")
+    sys.stdout.flush()
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
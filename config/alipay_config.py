@@ -1,20 +1,27 @@
-# 支付宝配置 - 直接硬编码，不依赖环境变量
+# 支付宝配置 - 应用ID与密钥硬编码（压测时可用 ALIPAY_MOCK_* 覆盖网关地址与公钥），
+# 性能与运行参数从环境变量读取（见 .env.example），未设置时使用默认值
 
 import os
+import json
 from pathlib import Path
 
 class AlipayConfig:
-    """支付宝配置类"""
+    """支付宝配置类，实例化时读取环境变量"""
     
     def __init__(self):
         # 支付宝应用配置 - 直接硬编码
         self.app_id = "2021005194600693"
         # 沙盒环境私钥 - PKCS#1格式（非Java环境使用PKCS#1，Java环境使用PKCS#8）
         self.app_private_key = "MIIEpAIBAAKCAQEAijTPs8PyvGwWiLFzqDU1wWG9rVgPXlXrIoDcCoyvlS+9cnaPhbzdt1+ovS0daQJFWQJey7h/N/az7gvo5JmjfRe5/1WMHQZopS/qLwPnyz50SCPMHl0xFaxyEvKFhszw6Nucim3zFJwcOV2WRgJds/kPYnTL+UwcteTtK0LEbnOu0MuU7Zol963ogglLjRh75O9wNihbv2TDfjxf75NbDE6RSyXbQTlqId6QBgmetbj3V0tAhqYekyM5zZxSScb4cep5xTEh6sdno3eowMpaFkfzSAQL3B0ZqvevBLFnYVyVOXCT39G2xwfMnJHfrihxRlG3M/MgzsVrck9NhOYHpQIDAQABAoIBAH2TDKGeyf/wCe17psXQSx6Bi5FkMNqbIIGCKeyf9a2M6gqFtVRjzeSe0zfINS/Dc3UzlSRvZ5BW5RfG1H5ZJtYzZ7mbZiq9NvnYdmTvnH3sKkWd2QpBzKaPwDp9B1v6/G3nlO2mhzZTvcVVxoOoBLHQ++yOiQLj6DZRYjlregWMWtCWi9OO6w4HBSEg7SH06o1gKtXC+0Bchzq5F+Itdsq8QS8OLt+s4ZSMt8MonrFU2ny21V+zCdmxw+XG2iURAiTzlynmQxVzSnWKzqS1NdcL3EAsGWvdSfAPvZpXxdrXX2x7ll4gI+28YCbZRy3+weObNP9RpRjiZQld/DZlPUECgYEAw/2Z4oDcJ4lMfZdibzfF64rbDyTLifjbMZ+DZl4Uf6LHlIW9rQ/LVM+wNai1inoD4x5saYVosHP1a4s2h1DJKh1N1WdkPvRCcIm8a7kiEIoFlBhZCB+6NENZmV6dbbiRcUBKKYKVa2eAeZNko95dLR/uQzNfsrHs8iLdFr+Y7rECgYEAtIXhpCSDf1G1mAW7U+NepGkLyvxVAOn53EPp+l3nj/mAIFc7UKjnXEoEB/NsEZxo1bTFFnUnzrhQvxb4DKeucXcdDnH5a9ktHyFg3rfBJHm1t1BXAdPFP4AA59vAQNMNjWE7WTvBjMSG0mRkyFK4Rwh5ihj1MMDXmxS7n5GfrTUCgYEAwIrkIyF1J2I7Qyb2DU09o6lGjBoZ2/IfZSDQdkD24m2IpOC+9sYNe8SN2ClmMCSurPG2j/QAZVmGQaECcO1ss3MWhBCO60oL+4NVGH9Id/cgg91nmhORWsbPv1y0TJaGTDxcn2sqX9nO3aFvvY02/J3h9SMDYQprPXYCvdZ86AECgYB2gflp9yp4F5zdys16OaY0yl0aiWIIMpF7nv3oBWNxqboKARoITolrlY9l5NBKE2LjAEPuBUT3uRoRCDQYoq+q/yYNCJdTzIOJjzD3pKvflSLMz6n+ohY4JIDztNhV9fdMm8sJPmhGT/GuBof+1gbxYsfe95lmwwIHZanyC/hGDQKBgQCpvPyTRcbsm1Vcd3VTTTmkyj/p0lCVV6qr0rDHpAw0mGDT7R5URz7Fz9ukeB6XpRSL8HhOKg20vqies7eyOEsdi+CEsr3dEVryJ7ER9v2Ag3CJTGyXqkF/HCqaFbf/azIdzyBDfosg9dJdhFAr+cDMksEvPJPfGgY3eRzPgPFeHw=="
-        self.alipay_public_key = "MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEAgrluf8ZIERvuHr6P2zRGvX6dm8iQJrJACfHh1zdUEDWTxuNz3RBDGMXRTu8iZ3szGVtaWVBz5g5/fyMRCmWDAKRMkppSmm0F5jxI8xHxdWyIJ+6ab8QcpLaqTbQSJXRzt1lsGkPcMu69dLp7/FSemJAxbZ4N2ZtSqGAroTJtmTUGPsGxDV7BqBUdNU2AbKSyU6TlU4Tib/K21dQABftnTffj7VrVtAhuLhuDqBxmDWlc5vjACNnBcs8p83xLg4RLyyd0zhsmS5EscSubB/DKkZ7xPoWjGKqSDN3Hyh6pZRVIo9CEcZL9T7f3z0g+ho7EXWRbVMz3EKpZ5LmR19bMpQIDAQAB"
+        # 支付宝公钥；ALIPAY_MOCK_PUBLIC_KEY 仅在指向本地模拟网关压测时设置为模拟网关的公钥
+        self.alipay_public_key = os.getenv("ALIPAY_MOCK_PUBLIC_KEY") or "MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEAgrluf8ZIERvuHr6P2zRGvX6dm8iQJrJACfHh1zdUEDWTxuNz3RBDGMXRTu8iZ3szGVtaWVBz5g5/fyMRCmWDAKRMkppSmm0F5jxI8xHxdWyIJ+6ab8QcpLaqTbQSJXRzt1lsGkPcMu69dLp7/FSemJAxbZ4N2ZtSqGAroTJtmTUGPsGxDV7BqBUdNU2AbKSyU6TlU4Tib/K21dQABftnTffj7VrVtAhuLhuDqBxmDWlc5vjACNnBcs8p83xLg4RLyyd0zhsmS5EscSubB/DKkZ7xPoWjGKqSDN3Hyh6pZRVIo9CEcZL9T7f3z0g+ho7EXWRbVMz3EKpZ5LmR19bMpQIDAQAB"
+        
+        # 私钥文件路径（可选），配置后签名器从文件加载私钥并在文件变更时热加载
+        self.app_private_key_path = os.getenv("ALIPAY_APP_PRIVATE_KEY_PATH") or None
         
         # 支付宝网关地址 - 沙盒环境
-        self.gateway_url = "https://openapi.alipay.com/gateway.do" 
+        # ALIPAY_MOCK_GATEWAY_URL 仅在压测时指向本地模拟网关
+        self.gateway_url = os.getenv("ALIPAY_MOCK_GATEWAY_URL") or "https://openapi.alipay.com/gateway.do"
         # "https://openapi-sandbox.dl.alipaydev.com/gateway.do"
         
         # 签名配置
@@ -29,6 +36,121 @@ class AlipayConfig:
         
         # 授权范围
         self.scope = "auth_user"
+        
+        # 网关调用方式：http 使用原生异步HTTP客户端，sdk 使用官方SDK（在独立线程池中执行）
+        self.gateway_transport = os.getenv("ALIPAY_GATEWAY_TRANSPORT", "http")
+        
+        # 网关HTTP连接池：最大连接数、空闲连接保留时间（秒）、启动时预热的连接数
+        self.gateway_pool_size = int(os.getenv("GATEWAY_POOL_SIZE", "20"))
+        self.gateway_pool_idle_timeout = float(os.getenv("GATEWAY_POOL_IDLE_TIMEOUT", "60"))
+        self.gateway_pool_warmup = int(os.getenv("GATEWAY_POOL_WARMUP", "2"))
+        
+        # 网关熔断：错误率、慢调用率、慢调用耗时（秒）、统计窗口、最少调用数、熔断时长（秒）、半开探测数
+        self.circuit_breaker_failure_rate = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", "0.5"))
+        self.circuit_breaker_slow_call_rate = float(os.getenv("CIRCUIT_BREAKER_SLOW_CALL_RATE", "0.8"))
+        self.circuit_breaker_slow_call_seconds = float(os.getenv("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", "5"))
+        self.circuit_breaker_window = int(os.getenv("CIRCUIT_BREAKER_WINDOW", "20"))
+        self.circuit_breaker_min_calls = int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", "10"))
+        self.circuit_breaker_open_seconds = float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", "30"))
+        self.circuit_breaker_half_open_probes = int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_PROBES", "3"))
+        # 按接口覆盖熔断阈值，JSON格式，如 {"alipay.user.info.share": {"slow_call_seconds": 2}}
+        self.circuit_breaker_overrides = json.loads(os.getenv("CIRCUIT_BREAKER_OVERRIDES", "{}"))
+        
+        # 网关自适应并发限制（AIMD）：初始、最小、最大并发数
+        self.gateway_concurrency_initial = int(os.getenv("GATEWAY_CONCURRENCY_INITIAL", "16"))
+        self.gateway_concurrency_min = int(os.getenv("GATEWAY_CONCURRENCY_MIN", "2"))
+        self.gateway_concurrency_max = int(os.getenv("GATEWAY_CONCURRENCY_MAX", "64"))
+        
+        # 对冲请求（默认关闭）：允许对冲的只读接口、触发对冲的延迟分位数、对冲请求占比上限
+        self.hedge_enabled = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_operations = [
+            op.strip() for op in os.getenv("HEDGE_OPERATIONS", "alipay.user.info.share").split(",") if op.strip()
+        ]
+        self.hedge_percentile = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+        self.hedge_max_rate = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+        
+        # SDK阻塞调用线程池配置（可通过环境变量覆盖）
+        self.gateway_executor_workers = int(os.getenv("GATEWAY_EXECUTOR_WORKERS", "8"))  # 最大并发数
+        self.gateway_executor_queue_size = int(os.getenv("GATEWAY_EXECUTOR_QUEUE_SIZE", "64"))  # 最大排队数
+        self.gateway_executor_queue_timeout = float(os.getenv("GATEWAY_EXECUTOR_QUEUE_TIMEOUT", "5"))  # 排队超时（秒）
+        
+        # 每个uvicorn worker的authInfo签名进程数，0 表示在当前进程内签名；
+        # 默认按 WEB_CONCURRENCY（uvicorn worker数）平分CPU核心，避免多个worker各自启动CPU核心数个进程
+        self.web_concurrency = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+        self.sign_engine_workers = int(os.getenv(
+            "SIGN_ENGINE_WORKERS", str(max(1, (os.cpu_count() or 1) // self.web_concurrency))
+        ))
+        
+        # 批量authInfo接口单次最大条目数，以及每多少条消耗一次频率限制配额（不足按一次计）
+        self.authinfo_batch_max_items = int(os.getenv("AUTHINFO_BATCH_MAX_ITEMS", "50"))
+        self.authinfo_batch_items_per_unit = int(os.getenv("AUTHINFO_BATCH_ITEMS_PER_UNIT", "10"))
+        
+        # 预签名authInfo池：需要预签名的pid（逗号分隔，为空则不启用）及签名类型
+        self.authinfo_pool_pids = [p.strip() for p in os.getenv("AUTHINFO_POOL_PIDS", "").split(",") if p.strip()]
+        self.authinfo_pool_sign_types = [
+            t.strip().upper() == "RSA2" for t in os.getenv("AUTHINFO_POOL_SIGN_TYPES", "RSA2").split(",") if t.strip()
+        ]
+        self.authinfo_pool_low_watermark = int(os.getenv("AUTHINFO_POOL_LOW_WATERMARK", "50"))
+        self.authinfo_pool_high_watermark = int(os.getenv("AUTHINFO_POOL_HIGH_WATERMARK", "200"))
+        self.authinfo_pool_ttl = float(os.getenv("AUTHINFO_POOL_TTL", "600"))  # 条目有效期（秒）
+        
+        # 频率限制：模式（sliding 或 gcra）、gcra模式的突发请求数、计数存储（memory 或 shm）及shm后端的共享内存文件路径
+        self.rate_limit_mode = os.getenv("RATE_LIMIT_MODE", "sliding")
+        self.rate_limit_burst = int(os.getenv("RATE_LIMIT_BURST", "0")) or None
+        self.rate_limit_backend = os.getenv("RATE_LIMIT_BACKEND", "memory")
+        self.rate_limit_shm_path = os.getenv("RATE_LIMIT_SHM_PATH") or None
+        # 刷新令牌接口每个IP每分钟最多请求数（与authInfo接口分开计数）
+        self.refresh_rate_limit = int(os.getenv("REFRESH_RATE_LIMIT", "10"))
+        
+        # 服务端令牌存储：memory（进程内）或 sqlite（WAL模式，重启后仍然有效）
+        self.token_store_backend = os.getenv("TOKEN_STORE_BACKEND", "memory")
+        self.token_store_path = os.getenv("TOKEN_STORE_PATH", "tokens.db")
+        # 已保存的访问令牌剩余有效期不少于该值（秒）时，刷新请求直接返回已保存的令牌
+        self.token_store_min_ttl = float(os.getenv("TOKEN_STORE_MIN_TTL", "300"))
+        # 被主动刷新轮换掉的旧刷新令牌在旧访问令牌过期前仍可使用，该值为最短可用时间（秒）
+        self.token_store_alias_grace = float(os.getenv("TOKEN_STORE_ALIAS_GRACE", "300"))
+        # 定期清理过期令牌记录的间隔（秒），0 表示不清理
+        self.token_store_purge_interval = float(os.getenv("TOKEN_STORE_PURGE_INTERVAL", "600"))
+        
+        # 用户信息缓存：新鲜期、过期后仍可先返回旧数据的宽限期（秒）及最大条目数
+        self.user_info_cache_ttl = float(os.getenv("USER_INFO_CACHE_TTL", "300"))
+        self.user_info_cache_stale_ttl = float(os.getenv("USER_INFO_CACHE_STALE_TTL", "600"))
+        self.user_info_cache_max_entries = int(os.getenv("USER_INFO_CACHE_MAX_ENTRIES", "10000"))
+        
+        # 访问令牌主动刷新：是否启用、过期前多少秒刷新、随机提前的最大秒数、最大并发刷新数
+        self.token_refresh_enabled = os.getenv("TOKEN_REFRESH_ENABLED", "true").lower() == "true"
+        self.token_refresh_margin = float(os.getenv("TOKEN_REFRESH_MARGIN", "600"))
+        self.token_refresh_jitter = float(os.getenv("TOKEN_REFRESH_JITTER", "300"))
+        self.token_refresh_concurrency = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "4"))
+        
+        # 请求处理时限（秒），超时返回504；可按路由路径覆盖，如 {"/api/auth/userinfo": 8}
+        self.request_deadline_seconds = float(os.getenv("REQUEST_DEADLINE_SECONDS", "10"))
+        self.request_deadline_overrides = json.loads(os.getenv("REQUEST_DEADLINE_OVERRIDES", "{}"))
+        
+        # 保留最近多少个请求的耗时记录供 /debug/timings 导出，0 表示不记录
+        self.request_timing_buffer_size = int(os.getenv("REQUEST_TIMING_BUFFER_SIZE", "0"))
+        
+        # 日志：级别、输出格式（json 或 text）、INFO及以下级别的采样比例、日志队列容量
+        self.log_level = os.getenv("LOG_LEVEL", "INFO")
+        self.log_format = os.getenv("LOG_FORMAT", "json")
+        self.log_info_sample_rate = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+        self.log_queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+        
+        # 事件循环监控：采样间隔（秒）、阻塞超过多少秒时记录调用栈（0 表示不检测）、保留的阻塞报告数
+        self.loop_monitor_interval = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+        self.loop_block_threshold = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+        self.loop_block_reports = int(os.getenv("LOOP_BLOCK_REPORTS", "20"))
+        # 是否开放 /debug/loop-stalls（报告中包含代码调用栈，默认关闭）
+        self.loop_stalls_endpoint = os.getenv("LOOP_STALLS_ENDPOINT", "false").lower() == "true"
+        
+        # 就绪检查（/health?mode=ready）：近期事件循环延迟上限（秒）、网关线程池排队占比上限、每个签名进程的排队上限
+        self.readiness_max_loop_lag = float(os.getenv("READINESS_MAX_LOOP_LAG", "0.5"))
+        self.readiness_max_executor_queue_ratio = float(os.getenv("READINESS_MAX_EXECUTOR_QUEUE_RATIO", "0.8"))
+        self.readiness_max_sign_queue = int(os.getenv("READINESS_MAX_SIGN_QUEUE", "64"))
+        
+        # 静态文件：非HTML资源的浏览器缓存时间（秒），开发模式下文件修改后自动重新加载
+        self.static_max_age = int(os.getenv("STATIC_MAX_AGE", "3600"))
+        self.static_reload = os.getenv("STATIC_RELOAD", "false").lower() == "true"
     
     def validate_config(self) -> bool:
         """验证配置是否完整"""
@@ -1,26 +1,46 @@
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers
 from pydantic import BaseModel
 import uvicorn
 import os
-from typing import Optional
+import json
+import math
+import time
+import asyncio
+from typing import List, Optional
 from dotenv import load_dotenv
 import logging
 
 # 加载环境变量
 load_dotenv()
 
-# 配置日志
+# 配置日志：后台线程格式化、脱敏并写入JSON日志
+from services.log_pipeline import log_pipeline, setup_logging
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # 导入自定义模块
-from config.alipay_config import AlipayConfig
-from services.alipay_service import AlipayService
+from config.alipay_config import AlipayConfig, alipay_config
+from services.async_alipay_service import AsyncAlipayService
+from services.errors import GatewayUnavailableError, DeadlineExceededError
+from services import deadline, request_timing
+from services.request_timing import timing_buffer
+from services.metrics import registry as metrics_registry, http_request_duration, rate_limit_decisions
+from services.circuit_breaker import gateway_guard
+from services.hedging import hedger
+from services.gateway_executor import gateway_executor
+from services.sign_engine import sign_engine
+from services.loop_monitor import loop_monitor
+from services.static_cache import static_cache
+from services.auth_info_pool import AuthInfoPool
+from services.token_store import token_store
+from services.user_info_cache import UserInfoCache
+from services.token_refresh_scheduler import TokenRefreshScheduler
 from models.user_models import UserInfo, LoginResponse
 from pydantic import BaseModel
-from rate_limiter import auth_rate_limiter
+from rate_limiter import auth_rate_limiter, refresh_rate_limiter, rate_limit_headers
 
 # 请求模型
 class AuthInfoRequest(BaseModel):
@@ -28,14 +48,25 @@ class AuthInfoRequest(BaseModel):
     target_id: Optional[str] = None
     rsa2: Optional[bool] = True
 
+class AuthInfoBatchRequest(BaseModel):
+    items: List[AuthInfoRequest]
+
 class UserInfoRequest(BaseModel):
     authCode: Optional[str] = None
     auth_code: Optional[str] = None  # 兼容Java客户端发送的参数名
 
+class TimedJSONResponse(JSONResponse):
+    """记录JSON序列化耗时（Server-Timing 中的 json 阶段）的默认响应类"""
+
+    def render(self, content) -> bytes:
+        with request_timing.span("json"):
+            return super().render(content)
+
 app = FastAPI(
     title="支付宝H5登录系统",
     description="基于FastAPI的支付宝OAuth授权登录系统",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=TimedJSONResponse
 )
 
 # CORS配置
@@ -47,17 +78,279 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 静态文件服务
-app.mount("/static", StaticFiles(directory="static"), name="static")
+class RequestDeadlineMiddleware:
+    """为每个请求设置处理时限：路由时限与客户端 X-Request-Timeout 的较小值，超时返回504
+
+    以纯ASGI中间件实现，时限到达时取消的是执行路由处理函数的任务本身，请求被真正放弃；
+    只有配置的时限可以关闭处理时限，客户端传入的非正数或非法值被忽略。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = alipay_config.request_deadline_overrides.get(scope["path"], alipay_config.request_deadline_seconds)
+        if budget <= 0:
+            await self.app(scope, receive, send)
+            return
+        try:
+            client_budget = float(Headers(scope=scope).get(deadline.DEADLINE_HEADER) or 0)
+        except ValueError:
+            client_budget = 0.0
+        if client_budget > 0:
+            budget = min(budget, client_budget)
+
+        response_started = False
+
+        async def send_tracking(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        token = deadline.set_deadline(budget)
+        try:
+            async with asyncio.timeout(budget):
+                await self.app(scope, receive, send_tracking)
+        except TimeoutError:
+            logger.warning("请求处理超时（%s秒），已放弃: %s %s", budget, scope["method"], scope["path"])
+            # 流式响应已开始发送时无法再改为504，只能中断响应
+            if not response_started:
+                await JSONResponse(status_code=504, content={"detail": "请求处理超时"})(scope, receive, send)
+        finally:
+            deadline.reset_deadline(token)
+
+app.add_middleware(RequestDeadlineMiddleware)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """记录每个请求的处理耗时，按路由模板（而不是实际路径）区分，避免路径参数造成指标爆炸"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        http_request_duration.labels(request.method, route_path, str(status)).observe(time.perf_counter() - started)
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """为每个请求分配请求ID，并在响应中返回 Server-Timing 耗时分解与 X-Request-ID"""
+    request_id = request_timing.new_request_id(request.headers.get(request_timing.REQUEST_ID_HEADER))
+    token = request_timing.start_request(request_id)
+    timing = request_timing.current()
+    try:
+        response = await call_next(request)
+        response.headers["Server-Timing"] = timing.server_timing()
+        response.headers[request_timing.REQUEST_ID_HEADER] = request_id
+        if timing_buffer.enabled:
+            route = request.scope.get("route")
+            timing_buffer.record(timing, request.method, route.path if route is not None else request.url.path,
+                                 response.status_code)
+        return response
+    finally:
+        request_timing.finish_request(token)
+
+# 初始化支付宝服务（网关调用为异步非阻塞）
+alipay_service = AsyncAlipayService()
+
+# 预签名authInfo池（未指定target_id时使用）
+auth_info_pool = AuthInfoPool(
+    producer=alipay_service.presign_auth_info,
+    pids=alipay_config.authinfo_pool_pids,
+    sign_types=alipay_config.authinfo_pool_sign_types,
+    low_watermark=alipay_config.authinfo_pool_low_watermark,
+    high_watermark=alipay_config.authinfo_pool_high_watermark,
+    ttl=alipay_config.authinfo_pool_ttl
+)
+
+# 用户信息缓存（按访问令牌和user_id缓存，过期后先返回旧数据并在后台刷新）
+user_info_cache = UserInfoCache(
+    fetcher=alipay_service.get_user_info,
+    ttl=alipay_config.user_info_cache_ttl,
+    stale_ttl=alipay_config.user_info_cache_stale_ttl,
+    max_entries=alipay_config.user_info_cache_max_entries
+)
+
+# 访问令牌主动刷新调度（在过期前的空闲时间刷新，而不是等客户端请求时再刷新）
+token_refresh_scheduler = TokenRefreshScheduler(
+    refresher=lambda refresh_token: alipay_service.refresh_access_token(refresh_token, use_stored=False),
+    store=token_store,
+    margin=alipay_config.token_refresh_margin,
+    jitter=alipay_config.token_refresh_jitter,
+    concurrency=alipay_config.token_refresh_concurrency
+)
+if alipay_config.token_refresh_enabled:
+    alipay_service.token_listeners.append(token_refresh_scheduler.schedule)
+
+# 各组件的统计信息通过 /metrics 以 gauge 导出
+metrics_registry.register_stats("gateway_executor", gateway_executor.stats)
+metrics_registry.register_stats("gateway_guard", gateway_guard.stats)
+metrics_registry.register_stats("gateway_connections", alipay_service.connection_stats.stats)
+metrics_registry.register_stats("gateway_single_flight", alipay_service.single_flight.stats)
+metrics_registry.register_stats("gateway_hedging", hedger.stats)
+metrics_registry.register_stats("sign_engine", sign_engine.stats)
+metrics_registry.register_stats("authinfo_pool", auth_info_pool.stats)
+metrics_registry.register_stats("user_info_cache", user_info_cache.stats)
+metrics_registry.register_stats("token_refresh", token_refresh_scheduler.stats)
+metrics_registry.register_stats("auth_rate_limiter", auth_rate_limiter.stats)
+metrics_registry.register_stats("refresh_rate_limiter", refresh_rate_limiter.stats)
+metrics_registry.register_stats("logging", log_pipeline.stats)
+metrics_registry.register_stats("event_loop", loop_monitor.stats)
+metrics_registry.register_stats("static_cache", static_cache.stats)
 
-# 初始化支付宝服务
-alipay_service = AlipayService()
+# 频率限制判定计数
+_rate_limit_allowed = rate_limit_decisions.labels("authinfo", "allowed")
+_rate_limit_denied = rate_limit_decisions.labels("authinfo", "denied")
+_refresh_limit_allowed = rate_limit_decisions.labels("refresh", "allowed")
+_refresh_limit_denied = rate_limit_decisions.labels("refresh", "denied")
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    """首页 - 显示登录页面"""
-    with open("static/login.html", "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
+# 后台网关连接预热任务，保留引用以免被垃圾回收，关闭时未完成则取消
+gateway_warm_up: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def startup_sign_engine():
+    """启动事件循环监控，载入静态文件，启动authInfo签名进程、预签名池、过期令牌清理和令牌主动刷新调度，并在后台预热网关连接"""
+    loop_monitor.start()
+    static_cache.load()
+    global gateway_warm_up
+    # 启动签名进程会阻塞到全部进程就绪，放到线程中执行，不阻塞事件循环
+    await asyncio.to_thread(sign_engine.start)
+    gateway_warm_up = asyncio.create_task(alipay_service.warm_up())
+    auth_info_pool.start()
+    token_store.start_purge(alipay_config.token_store_purge_interval)
+    if alipay_config.token_refresh_enabled:
+        token_refresh_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_alipay_service():
+    """关闭预签名池、令牌主动刷新、用户信息后台刷新、网关连接预热、网关HTTP客户端、SDK调用线程池、签名进程、令牌存储、事件循环监控，最后写完剩余日志"""
+    await auth_info_pool.stop()
+    await token_refresh_scheduler.stop()
+    await user_info_cache.stop()
+    if gateway_warm_up is not None and not gateway_warm_up.done():
+        gateway_warm_up.cancel()
+        await asyncio.gather(gateway_warm_up, return_exceptions=True)
+    await alipay_service.aclose()
+    gateway_executor.shutdown()
+    sign_engine.shutdown()
+    await token_store.stop_purge()
+    token_store.close()
+    await loop_monitor.stop()
+    log_pipeline.stop()
+
+def check_auth_rate_limit(client_ip: str, cost: int = 1) -> dict:
+    """检查authInfo接口频率限制
+    
+    Args:
+        client_ip: 客户端IP
+        cost: 本次请求消耗的配额数
+        
+    Returns:
+        dict: X-RateLimit-* 响应头
+        
+    Raises:
+        HTTPException: 超出限制时返回429，并带上 Retry-After 响应头
+    """
+    with request_timing.span("ratelimit"):
+        result = auth_rate_limiter.check(client_ip, cost)
+    (_rate_limit_allowed if result.allowed else _rate_limit_denied).inc()
+    headers = rate_limit_headers(result)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=429, 
+            detail=f"请求过于频繁，请等待 {headers['Retry-After']} 秒后再试。为避免触发支付宝限流，建议使用 refresh_token 刷新令牌。",
+            headers=headers
+        )
+    return headers
+
+def check_refresh_rate_limit(client_ip: str) -> dict:
+    """检查刷新令牌接口频率限制
+    
+    Args:
+        client_ip: 客户端IP
+        
+    Returns:
+        dict: X-RateLimit-* 响应头
+        
+    Raises:
+        HTTPException: 超出限制时返回429，并带上 Retry-After 响应头
+    """
+    with request_timing.span("ratelimit"):
+        result = refresh_rate_limiter.check(client_ip)
+    (_refresh_limit_allowed if result.allowed else _refresh_limit_denied).inc()
+    headers = rate_limit_headers(result)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=f"刷新令牌请求过于频繁，请等待 {headers['Retry-After']} 秒后再试",
+            headers=headers
+        )
+    return headers
+
+def gateway_unavailable(action: str, error: GatewayUnavailableError) -> HTTPException:
+    """网关暂不可用（繁忙、熔断或并发达到上限）时返回的503异常
+    
+    Args:
+        action: 操作名称，用于错误信息
+        error: 网关不可用异常
+        
+    Returns:
+        HTTPException: 503异常，已知恢复时间时带上 Retry-After 响应头
+    """
+    headers = None
+    if error.retry_after:
+        headers = {"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    return HTTPException(status_code=503, detail=f"{action}: 支付宝网关繁忙，请稍后重试", headers=headers)
+
+def readiness_checks() -> dict:
+    """就绪检查：近期事件循环延迟、网关线程池排队与签名进程排队是否超过上限
+    
+    Returns:
+        dict: 各项检查结果，ok 表示该项通过
+    """
+    loop_lag = loop_monitor.recent_max_lag()
+    executor = gateway_executor.stats()
+    shards = sign_engine.stats()["shards"]
+    sign_queue = sum(shard["queue_depth"] for shard in shards) / len(shards) if shards else 0.0
+    return {
+        "event_loop": {
+            "ok": loop_monitor.running and loop_lag <= alipay_config.readiness_max_loop_lag,
+            "recent_max_lag_ms": round(loop_lag * 1000, 1),
+            "stalls": loop_monitor.stats()["stalls"],
+        },
+        "gateway_executor": {
+            "ok": executor["queue_depth"] <= executor["max_queue"] * alipay_config.readiness_max_executor_queue_ratio,
+            "queue_depth": executor["queue_depth"],
+            "max_queue": executor["max_queue"],
+            "active_workers": executor["active_workers"],
+            "oldest_active_seconds": executor["oldest_active_seconds"],
+        },
+        "sign_engine": {
+            "ok": sign_queue <= alipay_config.readiness_max_sign_queue,
+            "avg_queue_depth": round(sign_queue, 1),
+        },
+    }
+
+@app.api_route("/", methods=["GET", "HEAD"], response_class=HTMLResponse)
+async def root(request: Request):
+    """首页 - 显示登录页面（内存中的预压缩页面）"""
+    return await static_file(request, "login.html")
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def static_file(request: Request, path: str):
+    """静态文件（内存中的预压缩内容，带强ETag，未修改时返回304）"""
+    response = static_cache.response(request, path)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
 
 @app.post("/auth/alipay")
 async def alipay_auth(request: Request):
@@ -84,22 +377,20 @@ async def alipay_callback(auth_code: Optional[str] = None, state: Optional[str]
     import logging
     logger = logging.getLogger(__name__)
     
-    logger.info(f"收到支付宝回调请求 - auth_code: {auth_code}, state: {state}")
+    logger.info("收到支付宝回调请求 - auth_code: %s, state: %s", auth_code, state)
     
     if not auth_code:
         logger.error("授权码为空")
         raise HTTPException(status_code=400, detail="授权码不能为空")
     
     try:
-        logger.info(f"开始获取访问令牌，授权码: {auth_code[:10]}...")
         # 使用授权码获取访问令牌
-        token_info = alipay_service.get_access_token(auth_code)
-        logger.info(f"成功获取访问令牌: {token_info}")
+        token_info = await alipay_service.get_access_token(auth_code)
+        logger.info("成功获取访问令牌，用户ID: %s", token_info.get('user_id'))
         
         # 使用访问令牌获取用户信息
-        logger.info(f"开始获取用户信息，访问令牌: {token_info['access_token'][:10]}...")
-        user_info = alipay_service.get_user_info(token_info['access_token'])
-        logger.info(f"成功获取用户信息: {user_info}")
+        user_info = await user_info_cache.get(token_info['access_token'], user_id=token_info.get('user_id') or token_info.get('open_id'))
+        logger.info("成功获取用户信息，用户ID: %s", user_info.get('user_id'))
         
         # 这里可以将用户信息保存到数据库
         # 重定向到成功页面并传递用户信息
@@ -114,28 +405,41 @@ async def alipay_callback(auth_code: Optional[str] = None, state: Optional[str]
         
         success_url = f"/static/success.html?user_info={user_info_encoded}&token={token_info_encoded}"
         return RedirectResponse(url=success_url, status_code=302)
+    except DeadlineExceededError:
+        logger.warning("登录失败，请求处理超时")
+        raise HTTPException(status_code=504, detail="登录失败: 请求处理超时")
+    except GatewayUnavailableError as e:
+        logger.warning("登录失败，支付宝网关暂不可用: %s", e)
+        raise gateway_unavailable("登录失败", e)
     except Exception as e:
-        logger.error(f"登录失败，详细错误: {str(e)}", exc_info=True)
+        logger.error("登录失败，详细错误: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"登录失败: {str(e)}")
 
 @app.post("/api/user/info")
 async def get_user_info(access_token: str):
     """获取用户信息API"""
     try:
-        user_info = alipay_service.get_user_info(access_token)
+        user_info = await user_info_cache.get(access_token)
         return {
             "success": True,
             "data": user_info
         }
+    except DeadlineExceededError:
+        logger.warning("获取用户信息失败，请求处理超时")
+        raise HTTPException(status_code=504, detail="获取用户信息失败: 请求处理超时")
+    except GatewayUnavailableError as e:
+        logger.warning("获取用户信息失败，支付宝网关暂不可用: %s", e)
+        raise gateway_unavailable("获取用户信息失败", e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取用户信息失败: {str(e)}")
 
 @app.post("/api/auth/authinfo")
-async def generate_auth_info_post(request: Request):
+async def generate_auth_info_post(request: Request, response: Response):
     """生成支付宝授权信息字符串 - POST方式
     
     Args:
         request: 包含pid、target_id和rsa2参数的请求体
+        response: 用于写入限流响应头
         
     Returns:
         dict: 包含authInfo的响应
@@ -147,13 +451,8 @@ async def generate_auth_info_post(request: Request):
         # 获取客户端IP用于频率限制
         client_ip = request.client.host
         
-        # 检查频率限制
-        if not auth_rate_limiter.is_allowed(client_ip):
-            remaining_time = auth_rate_limiter.get_remaining_time(client_ip)
-            raise HTTPException(
-                status_code=429, 
-                detail=f"请求过于频繁，请等待 {remaining_time} 秒后再试。为避免触发支付宝限流，建议使用 refresh_token 刷新令牌。"
-            )
+        # 检查频率限制，并在响应中返回限流头
+        response.headers.update(check_auth_rate_limit(client_ip))
         
         # 解析请求体
         body = await request.json()
@@ -164,14 +463,16 @@ async def generate_auth_info_post(request: Request):
         if not pid:
             raise HTTPException(status_code=400, detail="pid不能为空")
         
-        logger.info(f"收到生成authInfo请求，PID: {pid}, target_id: {target_id}")
+        logger.info("收到生成authInfo请求，PID: %s, target_id: %s", pid, target_id)
         
-        # 生成authInfo
-        auth_info = alipay_service.generate_auth_info(
-            pid=pid,
-            target_id=target_id,
-            rsa2=rsa2
-        )
+        # 生成authInfo：未指定target_id时优先使用预签名池，池空时实时签名
+        auth_info = None if target_id else auth_info_pool.pop(pid, rsa2)
+        if auth_info is None:
+            auth_info = await alipay_service.generate_auth_info(
+                pid=pid,
+                target_id=target_id,
+                rsa2=rsa2
+            )
         
         return {
             "success": True,
@@ -187,18 +488,55 @@ async def generate_auth_info_post(request: Request):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"生成authInfo失败: {str(e)}")
+        logger.error("生成authInfo失败: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"生成authInfo失败: {str(e)}"
         )
 
+@app.post("/api/auth/authinfo/batch")
+async def generate_auth_info_batch(request: Request, batch: AuthInfoBatchRequest):
+    """批量生成支付宝授权信息字符串
+    
+    结果以NDJSON流式返回，每条签名完成后立即输出一行；
+    单条失败通过该行的error字段返回，不影响整批请求。
+    
+    Args:
+        request: FastAPI请求对象
+        batch: 包含pid、target_id、rsa2条目列表的请求体
+        
+    Returns:
+        StreamingResponse: application/x-ndjson 格式的结果流
+    """
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="items不能为空")
+    if len(batch.items) > alipay_config.authinfo_batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多生成 {alipay_config.authinfo_batch_max_items} 条authInfo"
+        )
+    
+    # 按条目数消耗频率限制配额，每 AUTHINFO_BATCH_ITEMS_PER_UNIT 条计一次
+    client_ip = request.client.host
+    cost = math.ceil(len(batch.items) / max(1, alipay_config.authinfo_batch_items_per_unit))
+    limit_headers = check_auth_rate_limit(client_ip, cost)
+    
+    logger.info("收到批量生成authInfo请求，条目数: %d", len(batch.items))
+    
+    async def ndjson_lines():
+        items = [item.model_dump() for item in batch.items]
+        async for result in alipay_service.generate_auth_info_batch(items):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson", headers=limit_headers)
+
 @app.get("/api/auth/authinfo/{pid}")
-async def generate_auth_info_get(request: Request, pid: str, target_id: Optional[str] = None, rsa2: Optional[bool] = True):
+async def generate_auth_info_get(request: Request, response: Response, pid: str, target_id: Optional[str] = None, rsa2: Optional[bool] = True):
     """生成支付宝授权信息字符串 - GET方式
     
     Args:
         request: FastAPI请求对象
+        response: 用于写入限流响应头
         pid: 商户签约拿到的pid
         target_id: 商户唯一标识，可选
         rsa2: 是否使用RSA2签名，默认True
@@ -213,22 +551,19 @@ async def generate_auth_info_get(request: Request, pid: str, target_id: Optional
         # 获取客户端IP用于频率限制
         client_ip = request.client.host
         
-        # 检查频率限制
-        if not auth_rate_limiter.is_allowed(client_ip):
-            remaining_time = auth_rate_limiter.get_remaining_time(client_ip)
-            raise HTTPException(
-                status_code=429, 
-                detail=f"请求过于频繁，请等待 {remaining_time} 秒后再试。为避免触发支付宝限流，建议使用 refresh_token 刷新令牌。"
-            )
+        # 检查频率限制，并在响应中返回限流头
+        response.headers.update(check_auth_rate_limit(client_ip))
         
-        logger.info(f"收到生成authInfo请求，PID: {pid}, target_id: {target_id}")
+        logger.info("收到生成authInfo请求，PID: %s, target_id: %s", pid, target_id)
         
-        # 生成authInfo
-        auth_info = alipay_service.generate_auth_info(
-            pid=pid,
-            target_id=target_id,
-            rsa2=rsa2
-        )
+        # 生成authInfo：未指定target_id时优先使用预签名池，池空时实时签名
+        auth_info = None if target_id else auth_info_pool.pop(pid, rsa2)
+        if auth_info is None:
+            auth_info = await alipay_service.generate_auth_info(
+                pid=pid,
+                target_id=target_id,
+                rsa2=rsa2
+            )
         
         return {
             "success": True,
@@ -244,7 +579,7 @@ async def generate_auth_info_get(request: Request, pid: str, target_id: Optional
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"生成authInfo失败: {str(e)}")
+        logger.error("生成authInfo失败: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"生成authInfo失败: {str(e)}"
@@ -274,11 +609,11 @@ async def generate_auth_info_get(request: Request, pid: str, target_id: Optional
 #         logger.info(f"收到获取用户信息请求，authCode: {auth_code[:10]}...")
         
 #         # 使用授权码获取访问令牌
-#         token_info = alipay_service.get_access_token(auth_code)
+#         token_info = await alipay_service.get_access_token(auth_code)
 #         logger.info(f"成功获取访问令牌: {token_info}")
         
 #         # 使用访问令牌获取用户信息
-#         user_info = alipay_service.get_user_info(token_info['access_token'])
+#         user_info = await alipay_service.get_user_info(token_info['access_token'])
 #         logger.info(f"成功获取用户信息: {user_info}")
         
 #         return {
@@ -307,11 +642,12 @@ async def generate_auth_info_get(request: Request, pid: str, target_id: Optional
 #         )
 
 @app.post("/api/auth/refresh")
-async def refresh_token_endpoint(request: Request):
+async def refresh_token_endpoint(request: Request, response: Response):
     """刷新访问令牌接口
     
     Args:
         request: 包含refresh_token的请求体
+        response: 用于写入限流响应头
         
     Returns:
         dict: 包含新的访问令牌信息的响应
@@ -320,6 +656,9 @@ async def refresh_token_endpoint(request: Request):
     logger = logging.getLogger(__name__)
     
     try:
+        # 检查频率限制，并在响应中返回限流头
+        response.headers.update(check_refresh_rate_limit(request.client.host))
+        
         # 解析请求体
         body = await request.json()
         refresh_token = body.get('refresh_token')
@@ -327,11 +666,11 @@ async def refresh_token_endpoint(request: Request):
         if not refresh_token:
             raise HTTPException(status_code=400, detail="refresh_token不能为空")
         
-        logger.info(f"收到刷新令牌请求，refresh_token: {refresh_token[:20]}...")
+        logger.info("收到刷新令牌请求")
         
         # 使用刷新令牌获取新的访问令牌
-        token_info = alipay_service.refresh_access_token(refresh_token)
-        logger.info(f"成功刷新访问令牌: {token_info}")
+        token_info = await alipay_service.refresh_access_token(refresh_token)
+        logger.info("成功刷新访问令牌，用户ID: %s", token_info.get('user_id'))
         
         return {
             "success": True,
@@ -348,16 +687,52 @@ async def refresh_token_endpoint(request: Request):
         
     except HTTPException:
         raise
+    except DeadlineExceededError:
+        logger.warning("刷新访问令牌失败，请求处理超时")
+        raise HTTPException(status_code=504, detail="刷新访问令牌失败: 请求处理超时")
+    except GatewayUnavailableError as e:
+        logger.warning("刷新访问令牌失败，支付宝网关暂不可用: %s", e)
+        raise gateway_unavailable("刷新访问令牌失败", e)
     except Exception as e:
-        logger.error(f"刷新访问令牌失败: {str(e)}")
+        logger.error("刷新访问令牌失败: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"刷新访问令牌失败: {str(e)}"
         )
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus指标（文本格式）"""
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/timings")
+async def debug_timings(limit: int = 100, min_total_ms: float = 0.0):
+    """导出最近请求的耗时记录（从新到旧），需配置 REQUEST_TIMING_BUFFER_SIZE 启用"""
+    if not timing_buffer.enabled:
+        raise HTTPException(status_code=404, detail="未启用请求耗时记录")
+    return {"success": True, "data": timing_buffer.dump(limit, min_total_ms)}
+
+@app.get("/debug/loop-stalls")
+async def debug_loop_stalls():
+    """导出最近的事件循环阻塞报告（从新到旧），包含阻塞时长与阻塞位置的调用栈，需配置 LOOP_STALLS_ENDPOINT=true 启用"""
+    if not alipay_config.loop_stalls_endpoint:
+        raise HTTPException(status_code=404, detail="未开放事件循环阻塞报告")
+    return {"success": True, "data": loop_monitor.reports()}
+
 @app.get("/health")
-async def health_check():
-    """健康检查接口"""
+async def health_check(mode: str = "live"):
+    """健康检查接口
+    
+    mode=ready 时进行就绪检查：事件循环延迟或线程池、签名进程排队超过上限时返回503，
+    编排系统据此停止向该实例转发请求
+    """
+    if mode == "ready":
+        checks = readiness_checks()
+        ready = all(check["ok"] for check in checks.values())
+        return JSONResponse(
+            status_code=200 if ready else 503,
+            content={"status": "ready" if ready else "not_ready", "checks": checks}
+        )
     return {"status": "healthy", "message": "支付宝H5登录系统运行正常"}
 
 if __name__ == "__main__":
@@ -379,15 +754,12 @@ async def get_user_info_by_auth_code(request: UserInfoRequest):
             logger.error("授权码为空")
             raise HTTPException(status_code=400, detail="授权码不能为空")
         
-        logger.info(f"开始获取访问令牌，授权码: {auth_code[:10]}...")
         # 使用授权码获取访问令牌
-        token_info = alipay_service.get_access_token(auth_code)
-        logger.info(f"成功获取访问令牌")
+        token_info = await alipay_service.get_access_token(auth_code)
         
         # 使用访问令牌获取用户信息
-        logger.info(f"开始获取用户信息")
-        user_info = alipay_service.get_user_info(token_info['access_token'])
-        logger.info(f"成功获取用户信息")
+        user_info = await user_info_cache.get(token_info['access_token'], user_id=token_info.get('user_id') or token_info.get('open_id'))
+        logger.info("成功获取用户信息，用户ID: %s", token_info.get('user_id'))
         
         return {
             "success": True,
@@ -404,6 +776,12 @@ async def get_user_info_by_auth_code(request: UserInfoRequest):
         
     except HTTPException:
         raise
+    except DeadlineExceededError:
+        logger.warning("获取用户信息失败，请求处理超时")
+        raise HTTPException(status_code=504, detail="获取用户信息失败: 请求处理超时")
+    except GatewayUnavailableError as e:
+        logger.warning("获取用户信息失败，支付宝网关暂不可用: %s", e)
+        raise gateway_unavailable("获取用户信息失败", e)
     except Exception as e:
-        logger.error(f"获取用户信息失败，详细错误: {str(e)}", exc_info=True)
+        logger.error("获取用户信息失败，详细错误: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"获取用户信息失败: {str(e)}")
\ No newline at end of file
@@ -27,6 +27,8 @@ class TokenInfo(BaseModel):
     user_id: Optional[str] = None  # 支付宝用户ID
     open_id: Optional[str] = None  # 支付宝用户唯一标识
     auth_start: Optional[str] = None  # 授权开始时间
+    expires_at: Optional[float] = None  # 访问令牌过期时间（Unix时间戳，秒）
+    re_expires_at: Optional[float] = None  # 刷新令牌过期时间（Unix时间戳，秒）
 
 class LoginResponse(BaseModel):
     """登录响应模型"""
@@ -3,77 +3,436 @@
 防止频繁调用支付宝授权接口，避免触发限流
 """
 
+import sys
+import math
 import time
-from typing import Dict, Optional
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
 from threading import Lock
+from config.alipay_config import alipay_config
 
-class RateLimiter:
-    """简单的频率限制器"""
-    
-    def __init__(self, max_requests: int = 5, time_window: int = 60):
+
+class RateLimitResult(NamedTuple):
+    """一次频率检查的结果，可直接转换为标准限流响应头"""
+    allowed: bool  # 是否允许请求
+    limit: int  # 窗口内（或突发）允许的最大请求数
+    remaining: int  # 剩余可用请求数
+    reset_after: float  # 配额完全恢复所需时间（秒）
+    retry_after: float  # 被拒绝时距离下次可以请求的时间（秒），允许时为0
+
+
+def rate_limit_headers(result: RateLimitResult) -> Dict[str, str]:
+    """根据检查结果生成 X-RateLimit-* 与 Retry-After 响应头
+
+    Args:
+        result: 频率检查结果
+
+    Returns:
+        Dict[str, str]: 响应头
+    """
+    headers = {
+        "X-RateLimit-Limit": str(result.limit),
+        "X-RateLimit-Remaining": str(result.remaining),
+        "X-RateLimit-Reset": str(math.ceil(result.reset_after)),
+    }
+    if not result.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(result.retry_after)))
+    return headers
+
+
+class _Stripe:
+    """一个锁分片：一把锁保护一部分key的状态
+
+    requests 按最近访问顺序排列（最久未访问的在前），用于过期清理和LRU淘汰。
+    entry_bytes 为各key字符串与状态的估算字节数之和，在写入和淘汰时增量维护，统计时无需遍历。
+    """
+
+    __slots__ = ("lock", "requests", "entry_bytes", "evicted_expired", "evicted_lru")
+
+    def __init__(self):
+        self.lock = Lock()
+        self.requests: "OrderedDict[str, Any]" = OrderedDict()
+        self.entry_bytes = 0
+        self.evicted_expired = 0
+        self.evicted_lru = 0
+
+
+class _StripedLimiter(ABC):
+    """按key分片加锁、带过期清理与LRU淘汰的限制器基类
+
+    窗口已完全过期的key在访问同一分片时从LRU队头顺带清理；
+    key总数超过 max_keys 时淘汰最久未访问的key。
+    子类实现 _check（在分片锁内执行）与 _is_idle。
+    """
+
+    def __init__(self, stripes: int = 64, max_keys: int = 100000):
+        self._stripes: List[_Stripe] = [_Stripe() for _ in range(max(1, stripes))]
+        self._max_keys_per_stripe = max(1, -(-max_keys // len(self._stripes)))
+
+    def _stripe(self, key: str) -> _Stripe:
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def check(self, key: str, cost: int = 1) -> RateLimitResult:
+        """
+        检查并记录一次请求
+
+        Args:
+            key: 请求标识（如IP地址、用户ID等）
+            cost: 本次请求消耗的配额数（如批量请求按条目数计），超过上限的请求总是被拒绝
+
+        Returns:
+            RateLimitResult: 是否允许以及剩余配额、重置时间
+        """
+        stripe = self._stripe(key)
+        with stripe.lock:
+            current_time = time.time()
+            requests = stripe.requests
+
+            # 顺带清理该分片中窗口已完全过期的key
+            self._evict_expired(stripe, current_time)
+
+            state = requests.get(key)
+            if state is None:
+                self._evict_lru(stripe)
+                size_before = 0
+            else:
+                requests.move_to_end(key)
+                size_before = self._entry_size(key, state)
+
+            result = self._check(requests, key, state, current_time, cost)
+            state = requests.get(key)
+            stripe.entry_bytes += (self._entry_size(key, state) if state is not None else 0) - size_before
+            return result
+
+    def is_allowed(self, key: str) -> bool:
+        """
+        检查是否允许请求
+
+        Args:
+            key: 请求标识（如IP地址、用户ID等）
+
+        Returns:
+            bool: 是否允许请求
+        """
+        return self.check(key).allowed
+
+    @abstractmethod
+    def _check(self, requests: "OrderedDict[str, Any]", key: str, state: Any,
+               current_time: float, cost: int) -> RateLimitResult:
+        """按算法检查并更新单个key的状态（在分片锁内执行）"""
+
+    @abstractmethod
+    def _is_idle(self, state: Any, current_time: float) -> bool:
+        """key的状态是否已过期（不再影响限流结果），可以被清理"""
+
+    def _evict_expired(self, stripe: _Stripe, current_time: float):
+        """从LRU队头清理窗口已完全过期的key，遇到未过期的key即停止（均摊O(1)）"""
+        requests = stripe.requests
+        while requests:
+            oldest_key, oldest_state = next(iter(requests.items()))
+            if not self._is_idle(oldest_state, current_time):
+                return
+            del requests[oldest_key]
+            stripe.entry_bytes -= self._entry_size(oldest_key, oldest_state)
+            stripe.evicted_expired += 1
+
+    def _evict_lru(self, stripe: _Stripe):
+        """新增key前检查容量，超出时淘汰最久未访问的key"""
+        while len(stripe.requests) >= self._max_keys_per_stripe:
+            key, state = stripe.requests.popitem(last=False)
+            stripe.entry_bytes -= self._entry_size(key, state)
+            stripe.evicted_lru += 1
+
+    def sweep(self) -> int:
+        """全量清理所有窗口已过期的key
+
+        Returns:
+            int: 清理的key数量
+        """
+        removed = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                current_time = time.time()
+                expired = [k for k, state in stripe.requests.items() if self._is_idle(state, current_time)]
+                for key in expired:
+                    stripe.entry_bytes -= self._entry_size(key, stripe.requests.pop(key))
+                stripe.evicted_expired += len(expired)
+                removed += len(expired)
+        return removed
+
+    def key_count(self) -> int:
+        """当前保存的key数量"""
+        return sum(len(stripe.requests) for stripe in self._stripes)
+
+    def memory_usage(self) -> int:
+        """估算限制器状态占用的字节数（字典、key字符串与每个key的状态）
+
+        key与状态的字节数在写入和淘汰时增量维护，这里只做按分片求和，不加锁、不遍历key，
+        供 /metrics 每次抓取时调用。
+        """
+        return sum(sys.getsizeof(stripe.requests) + stripe.entry_bytes for stripe in self._stripes)
+
+    def _entry_size(self, key: str, state: Any) -> int:
+        return sys.getsizeof(key) + self._state_size(state)
+
+    def _state_size(self, state: Any) -> int:
+        return sys.getsizeof(state)
+
+    def stats(self) -> Dict[str, int]:
+        """获取限制器内存统计
+
+        Returns:
+            Dict[str, int]: key数量、估算字节数与淘汰计数
+        """
+        return {
+            "keys": self.key_count(),
+            "bytes": self.memory_usage(),
+            "evicted_expired": sum(stripe.evicted_expired for stripe in self._stripes),
+            "evicted_lru": sum(stripe.evicted_lru for stripe in self._stripes),
+        }
+
+
+class RateLimiter(_StripedLimiter):
+    """滑动窗口频率限制器
+
+    每个key的请求时间按先后顺序保存在最多 max_requests 个元素的队列中，
+    过期记录只会从队头移除，因此单次检查是均摊O(1)的；
+    key按哈希分散到多个锁分片上，不同key的请求不会在同一把锁上排队。
+    """
+
+    def __init__(self, max_requests: int = 5, time_window: int = 60, stripes: int = 64,
+                 max_keys: int = 100000):
         """
         初始化频率限制器
-        
+
         Args:
             max_requests: 时间窗口内最大请求数
             time_window: 时间窗口（秒）
+            stripes: 锁分片数量
+            max_keys: 最多保存的key数量，超出后按LRU淘汰
         """
+        super().__init__(stripes=stripes, max_keys=max_keys)
         self.max_requests = max_requests
         self.time_window = time_window
-        self.requests: Dict[str, list] = {}
-        self.lock = Lock()
-    
-    def is_allowed(self, key: str) -> bool:
+
+    @property
+    def state_size(self) -> int:
+        """共享内存后端中每个key占用的时间戳个数"""
+        return self.max_requests
+
+    def _check(self, requests: "OrderedDict[str, Deque[float]]", key: str,
+               request_times: Optional[Deque[float]], current_time: float, cost: int) -> RateLimitResult:
+        if request_times is None:
+            request_times = requests[key] = deque()
+        return self._admit(request_times, current_time, cost)
+
+    def _admit(self, request_times: Deque[float], current_time: float, cost: int = 1) -> RateLimitResult:
+        """在请求记录上执行一次检查，允许时按消耗的配额数记录本次请求"""
+        # 清理过期的请求记录（按时间顺序，过期的都在队头）
+        cutoff_time = current_time - self.time_window
+        while request_times and request_times[0] <= cutoff_time:
+            request_times.popleft()
+
+        # 检查是否超过限制
+        if len(request_times) + cost > self.max_requests:
+            if not request_times:
+                return RateLimitResult(False, self.max_requests, self.max_requests, 0.0, self.time_window)
+            # 需要等到足够多的旧记录过期，才能容纳本次消耗的配额
+            freed = min(len(request_times) + cost - self.max_requests, len(request_times))
+            retry_after = request_times[freed - 1] + self.time_window - current_time
+            return RateLimitResult(False, self.max_requests, max(0, self.max_requests - len(request_times)),
+                                   request_times[-1] + self.time_window - current_time, retry_after)
+
+        # 记录当前请求
+        request_times.extend([current_time] * cost)
+        return RateLimitResult(True, self.max_requests, self.max_requests - len(request_times),
+                               self.time_window, 0.0)
+
+    def _check_state(self, values: List[float], current_time: float,
+                     cost: int = 1) -> Tuple[RateLimitResult, List[float]]:
+        """共享内存后端使用的检查：状态为升序时间戳，0 表示空位"""
+        request_times = deque(v for v in values if v > 0)
+        result = self._admit(request_times, current_time, cost)
+        return result, list(request_times)
+
+    def _is_idle(self, request_times: Sequence[float], current_time: float) -> bool:
+        return not request_times or request_times[-1] <= current_time - self.time_window
+
+    def _is_idle_state(self, values: List[float], current_time: float) -> bool:
+        return self._is_idle([v for v in values if v > 0], current_time)
+
+    def _remaining_time_state(self, values: List[float], current_time: float) -> Optional[int]:
+        return self._remaining_time([v for v in values if v > 0], current_time)
+
+    def _state_size(self, request_times: Deque[float]) -> int:
+        return sys.getsizeof(request_times) + len(request_times) * sys.getsizeof(0.0)
+
+    def _remaining_time(self, request_times: Optional[Sequence[float]], current_time: float) -> Optional[int]:
+        if not request_times or len(request_times) < self.max_requests:
+            return None
+
+        oldest_request = request_times[0]
+        remaining = self.time_window - (current_time - oldest_request)
+
+        return max(0, int(remaining))
+
+    def get_remaining_time(self, key: str) -> Optional[int]:
         """
-        检查是否允许请求
-        
+        获取距离下次可以请求的剩余时间
+
         Args:
-            key: 请求标识（如IP地址、用户ID等）
-            
+            key: 请求标识
+
         Returns:
-            bool: 是否允许请求
+            Optional[int]: 剩余时间（秒），如果可以立即请求则返回None
         """
-        with self.lock:
-            current_time = time.time()
-            
-            # 获取该key的请求历史
-            if key not in self.requests:
-                self.requests[key] = []
-            
-            request_times = self.requests[key]
-            
-            # 清理过期的请求记录
-            cutoff_time = current_time - self.time_window
-            request_times[:] = [t for t in request_times if t > cutoff_time]
-            
-            # 检查是否超过限制
-            if len(request_times) >= self.max_requests:
-                return False
-            
-            # 记录当前请求
-            request_times.append(current_time)
-            return True
-    
+        stripe = self._stripe(key)
+        with stripe.lock:
+            return self._remaining_time(stripe.requests.get(key), time.time())
+
+
+class GcraRateLimiter(_StripedLimiter):
+    """GCRA（通用信元速率算法）频率限制器，等价于令牌桶
+
+    每个key只保存一个时间戳：理论到达时间（TAT）。
+    持续速率为每 period 秒 rate 次，允许最多 burst 次突发；
+    剩余配额与重置时间都可由TAT直接算出，检查为O(1)。
+    """
+
+    def __init__(self, rate: int = 5, period: float = 60, burst: int = None, stripes: int = 64,
+                 max_keys: int = 100000):
+        """
+        初始化GCRA限制器
+
+        Args:
+            rate: 每个周期内允许的持续请求数
+            period: 周期（秒）
+            burst: 允许的突发请求数，默认等于rate
+            stripes: 锁分片数量
+            max_keys: 最多保存的key数量，超出后按LRU淘汰
+        """
+        super().__init__(stripes=stripes, max_keys=max_keys)
+        self.rate = rate
+        self.period = period
+        self.burst = burst or rate
+        # 每个请求消耗的时间间隔，以及突发容量对应的时间长度
+        self.emission_interval = period / rate
+        self.burst_offset = self.emission_interval * self.burst
+
+    state_size = 1
+
+    def _check(self, requests: "OrderedDict[str, float]", key: str, tat: Optional[float],
+               current_time: float, cost: int) -> RateLimitResult:
+        result, new_tat = self._admit(tat, current_time, cost)
+        if result.allowed:
+            requests[key] = new_tat
+        return result
+
+    def _admit(self, tat: Optional[float], current_time: float, cost: int = 1) -> Tuple[RateLimitResult, float]:
+        """根据当前TAT计算检查结果及允许时的新TAT（每份配额推后一个发放间隔）"""
+        tat = max(tat or current_time, current_time)
+        new_tat = tat + self.emission_interval * cost
+        allow_at = new_tat - self.burst_offset
+
+        if current_time < allow_at:
+            return RateLimitResult(False, self.burst, 0, tat - current_time, allow_at - current_time), tat
+
+        # 加一个极小量抵消浮点误差，避免 1.9999 被截断为 1
+        remaining = int((current_time - allow_at) / self.emission_interval + 1e-9)
+        return RateLimitResult(True, self.burst, remaining, new_tat - current_time, 0.0), new_tat
+
+    def _check_state(self, values: List[float], current_time: float,
+                     cost: int = 1) -> Tuple[RateLimitResult, List[float]]:
+        """共享内存后端使用的检查：状态为单个TAT，0 表示空位"""
+        result, new_tat = self._admit(values[0] or None, current_time, cost)
+        return result, [new_tat]
+
+    def _is_idle(self, tat: float, current_time: float) -> bool:
+        return tat <= current_time
+
+    def _is_idle_state(self, values: List[float], current_time: float) -> bool:
+        return self._is_idle(values[0], current_time)
+
+    def _remaining_time_state(self, values: List[float], current_time: float) -> Optional[int]:
+        return self._remaining_time(values[0], current_time)
+
+    def _remaining_time(self, tat: Optional[float], current_time: float) -> Optional[int]:
+        if not tat:
+            return None
+        retry_after = tat + self.emission_interval - self.burst_offset - current_time
+        if retry_after <= 0:
+            return None
+        return math.ceil(retry_after)
+
     def get_remaining_time(self, key: str) -> Optional[int]:
         """
         获取距离下次可以请求的剩余时间
-        
+
         Args:
             key: 请求标识
-            
+
         Returns:
             Optional[int]: 剩余时间（秒），如果可以立即请求则返回None
         """
-        with self.lock:
-            if key not in self.requests or len(self.requests[key]) < self.max_requests:
-                return None
-            
-            current_time = time.time()
-            oldest_request = min(self.requests[key])
-            remaining = self.time_window - (current_time - oldest_request)
-            
-            return max(0, int(remaining))
+        stripe = self._stripe(key)
+        with stripe.lock:
+            return self._remaining_time(stripe.requests.get(key), time.time())
+
+
+def create_rate_limiter(max_requests: int, time_window: int, mode: str = "sliding",
+                        burst: int = None, max_keys: int = 100000,
+                        backend: str = "memory", shm_path: str = None, shm_name: str = "ratelimit"):
+    """按模式创建频率限制器
+
+    Args:
+        max_requests: 时间窗口内最大请求数
+        time_window: 时间窗口（秒）
+        mode: sliding（滑动窗口）或 gcra（令牌桶）
+        burst: gcra模式下允许的突发请求数，默认等于max_requests
+        max_keys: 最多保存的key数量
+        backend: memory（进程内）或 shm（同一主机的所有worker共享）
+        shm_path: shm后端的共享内存文件路径
+        shm_name: 未指定 shm_path 时默认路径中的名称，每个限制器需不同
+
+    Returns:
+        频率限制器实例
+    """
+    if mode == "gcra":
+        limiter = GcraRateLimiter(rate=max_requests, period=time_window, burst=burst, max_keys=max_keys)
+    elif mode == "sliding":
+        limiter = RateLimiter(max_requests=max_requests, time_window=time_window, max_keys=max_keys)
+    else:
+        raise ValueError(f"不支持的频率限制模式: {mode}")
+
+    if backend == "memory":
+        return limiter
+    if backend == "shm":
+        # 延迟导入：共享内存后端只在启用时才需要 fcntl/mmap
+        from shared_rate_limiter import SharedMemoryRateLimiter, default_shm_path
+        return SharedMemoryRateLimiter(limiter, path=shm_path or default_shm_path(shm_name), max_keys=max_keys)
+    raise ValueError(f"不支持的频率限制后端: {backend}")
 
 # 全局频率限制器实例
-# 每分钟最多5次授权请求
-auth_rate_limiter = RateLimiter(max_requests=5, time_window=60)
\ No newline at end of file
+# 每分钟最多5次授权请求；RATE_LIMIT_MODE=gcra 时改用令牌桶，RATE_LIMIT_BURST 控制突发量；
+# 多worker部署时设置 RATE_LIMIT_BACKEND=shm，使所有worker共用一份计数
+auth_rate_limiter = create_rate_limiter(
+    max_requests=5,
+    time_window=60,
+    mode=alipay_config.rate_limit_mode,
+    burst=alipay_config.rate_limit_burst,
+    max_keys=100000,
+    backend=alipay_config.rate_limit_backend,
+    shm_path=alipay_config.rate_limit_shm_path
+)
+
+# 刷新令牌接口的频率限制：每个IP每分钟最多 REFRESH_RATE_LIMIT 次，与authInfo接口分开计数
+refresh_rate_limiter = create_rate_limiter(
+    max_requests=alipay_config.refresh_rate_limit,
+    time_window=60,
+    mode=alipay_config.rate_limit_mode,
+    max_keys=100000,
+    backend=alipay_config.rate_limit_backend,
+    shm_path=f"{alipay_config.rate_limit_shm_path}-refresh" if alipay_config.rate_limit_shm_path else None,
+    shm_name="ratelimit-refresh"
+)
@@ -0,0 +1,518 @@
+import asyncio
+import logging
+import json
+import time
+import base64
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import httpx
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from alipay.aop.api.request.AlipaySystemOauthTokenRequest import AlipaySystemOauthTokenRequest
+from alipay.aop.api.request.AlipayUserInfoShareRequest import AlipayUserInfoShareRequest
+from config.alipay_config import alipay_config
+from models.user_models import TokenInfo
+from services.alipay_service import AlipayService, parse_token_response, parse_user_info_response
+from services.circuit_breaker import gateway_guard
+from services.connection_stats import ConnectionStats
+from services import deadline
+from services.errors import DeadlineExceededError
+from services.gateway_executor import gateway_executor
+from services.metrics import observe_operation
+from services.request_timing import span
+from services.hedging import hedger
+from services.rsa_signer import rsa_signer
+from services.sign_engine import sign_engine
+from services.single_flight import SingleFlight
+from services.token_store import TokenStore, build_token_info, token_info_to_dict, token_store as default_token_store
+
+logger = logging.getLogger(__name__)
+
+# 网关接口名称
+METHOD_OAUTH_TOKEN = "alipay.system.oauth.token"
+METHOD_USER_INFO_SHARE = "alipay.user.info.share"
+
+# 网关请求超时（秒），与SDK默认值保持一致
+DEFAULT_GATEWAY_TIMEOUT = 15.0
+
+
+class AsyncAlipayService(AlipayService):
+    """异步支付宝服务类 - 基于非阻塞HTTP客户端访问支付宝网关
+
+    请求签名与响应解析与 DefaultAlipayClient 保持一致：
+    公共参数与签名放在URL查询串中，业务参数以表单形式POST，
+    响应按 `<method>_response` 节点验签后交给与同步服务相同的解析函数。
+    transport 为 sdk 时改用官方SDK，阻塞调用在 gateway_executor 线程池中执行。
+    generate_auth_info 的签名交给多进程签名引擎，其余 authInfo 构造方法继承自 AlipayService。
+    换取和刷新得到的令牌保存在令牌存储中，刷新令牌对应的访问令牌仍然有效时不再访问网关。
+    相同操作、相同凭证的并发网关调用经 single_flight 合并为一次上游请求。
+    网关调用经 gateway_guard 的熔断器与自适应并发限制保护，网关故障时快速失败；
+    启用对冲的只读接口在延迟超过历史分位数时由 hedger 发出对冲请求。
+    HTTP方式使用有界的keep-alive连接池，启动时预热，回调中的换取令牌与获取用户信息复用同一条已建立的连接。
+    """
+
+    def __init__(self, timeout: float = DEFAULT_GATEWAY_TIMEOUT, transport: str = None,
+                 token_store: TokenStore = None):
+        """初始化异步网关客户端
+
+        Args:
+            timeout: 单次网关请求超时时间（秒）
+            transport: 网关调用方式，http 或 sdk，默认读取配置
+            token_store: 令牌存储，默认使用全局令牌存储
+        """
+        super().__init__()
+        self.timeout = timeout
+        self.transport = transport or alipay_config.gateway_transport
+        self.token_store = token_store or default_token_store
+        self.single_flight = SingleFlight()
+
+        # 令牌保存后的回调（如主动刷新调度器），参数为保存的 TokenInfo
+        self.token_listeners: List[Callable[[TokenInfo], None]] = []
+
+        # 验签公钥只解析一次，签名使用共享的 rsa_signer
+        self._public_key = serialization.load_pem_public_key(
+            alipay_config.get_public_key().encode('utf-8')
+        )
+
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self.connection_stats = ConnectionStats()
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """延迟创建HTTP客户端，使其绑定到运行中的事件循环
+
+        连接池大小与空闲连接保留时间读取配置；同一客户端内的连接共用一个SSL上下文，
+        空闲连接在 keepalive_expiry 内被复用，不再重复DNS解析与TLS握手。
+        """
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=alipay_config.gateway_pool_size,
+                    max_keepalive_connections=alipay_config.gateway_pool_size,
+                    keepalive_expiry=alipay_config.gateway_pool_idle_timeout
+                )
+            )
+        return self._http_client
+
+    async def warm_up(self, connections: int = None):
+        """预先建立到网关的连接，使第一批请求不必等待握手
+
+        Args:
+            connections: 预热的连接数，默认读取配置
+        """
+        if self.transport == "sdk":
+            return
+        connections = alipay_config.gateway_pool_warmup if connections is None else connections
+        if connections <= 0:
+            return
+
+        # 并发发出请求才能同时占用并建立多条连接；只关心连接是否建立，不关心响应内容。
+        # 预热请求不经过 connection_stats，连接复用统计只反映真实的网关调用
+        results = await asyncio.gather(*(
+            self.http_client.head(str(alipay_config.gateway_url))
+            for _ in range(connections)
+        ), return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            logger.warning("网关连接预热失败 %d/%d: %s", len(failed), connections, failed[0])
+        else:
+            logger.info("网关连接预热完成，连接数: %d", connections)
+
+    async def aclose(self):
+        """关闭HTTP客户端"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    @observe_operation("get_access_token")
+    async def get_access_token(self, auth_code: str) -> Dict[str, Any]:
+        """使用授权码获取访问令牌
+
+        Args:
+            auth_code: 授权码
+
+        Returns:
+            Dict[str, Any]: 包含访问令牌信息的字典
+        """
+        with span("token"):
+            return await self.single_flight.do((METHOD_OAUTH_TOKEN, 'authorization_code', auth_code),
+                                               self._get_access_token, auth_code)
+
+    async def _get_access_token(self, auth_code: str) -> Dict[str, Any]:
+        try:
+            response = await self._execute(METHOD_OAUTH_TOKEN, {
+                'grant_type': 'authorization_code',
+                'code': auth_code
+            })
+            logger.debug("支付宝API响应: %s", response)
+
+            token_info = parse_token_response(response)
+            await self._save_token(token_info)
+
+            logger.info("获取访问令牌成功，用户ID: %s", token_info.get('user_id'))
+            return token_info
+
+        except Exception as e:
+            logger.error("获取访问令牌异常: %s", e)
+            raise
+
+    @observe_operation("get_user_info")
+    async def get_user_info(self, access_token: str) -> Dict[str, Any]:
+        """使用访问令牌获取用户信息
+
+        Args:
+            access_token: 访问令牌
+
+        Returns:
+            Dict[str, Any]: 用户信息字典
+        """
+        with span("userinfo"):
+            return await self.single_flight.do((METHOD_USER_INFO_SHARE, access_token),
+                                               self._get_user_info, access_token)
+
+    async def _get_user_info(self, access_token: str) -> Dict[str, Any]:
+        try:
+            response = await self._execute(METHOD_USER_INFO_SHARE, {}, auth_token=access_token)
+
+            user_info = parse_user_info_response(response)
+
+            logger.info("获取用户信息成功，用户ID: %s", user_info.get('user_id'))
+            return user_info
+
+        except Exception as e:
+            logger.error("获取用户信息异常: %s", e)
+            raise
+
+    @observe_operation("refresh_access_token")
+    async def refresh_access_token(self, refresh_token: str, use_stored: bool = True) -> Dict[str, Any]:
+        """刷新访问令牌
+
+        Args:
+            refresh_token: 刷新令牌
+            use_stored: 已保存的访问令牌仍然有效时是否直接返回，主动刷新时为False
+
+        Returns:
+            Dict[str, Any]: 新的访问令牌信息
+        """
+        # 已保存的访问令牌仍然有效时直接返回，省去一次网关往返
+        if use_stored:
+            stored = await self.token_store.call(self.token_store.get_by_refresh_token, refresh_token)
+            if stored is not None:
+                if stored.expires_at - time.time() >= alipay_config.token_store_min_ttl:
+                    logger.info("访问令牌仍然有效，返回已保存的令牌")
+                    return token_info_to_dict(stored)
+                # 客户端持有的刷新令牌已被主动刷新轮换时，用最新的刷新令牌向网关刷新
+                refresh_token = stored.refresh_token or refresh_token
+
+        with span("refresh"):
+            return await self.single_flight.do((METHOD_OAUTH_TOKEN, 'refresh_token', refresh_token),
+                                               self._refresh_access_token, refresh_token)
+
+    async def _refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
+        try:
+            response = await self._execute(METHOD_OAUTH_TOKEN, {
+                'grant_type': 'refresh_token',
+                'refresh_token': refresh_token
+            })
+
+            token_info = parse_token_response(response, "刷新访问令牌")
+            await self._save_token(token_info)
+
+            logger.info("刷新访问令牌成功")
+            return token_info
+
+        except Exception as e:
+            logger.error("刷新访问令牌异常: %s", e)
+            raise
+
+    async def _save_token(self, token_info: Dict[str, Any]):
+        """保存令牌并通知监听者"""
+        token = build_token_info(token_info)
+        await self.token_store.call(self.token_store.save, token)
+        for listener in self.token_listeners:
+            listener(token)
+
+    @observe_operation("generate_auth_info")
+    async def generate_auth_info(self, pid: str, target_id: str = None, rsa2: bool = True) -> str:
+        """生成完整的authInfo字符串
+        待签名字符串交给多进程签名引擎，签名期间不阻塞事件循环
+
+        Args:
+            pid: 商户签约拿到的pid
+            target_id: 商户唯一标识，如果不提供则自动生成
+            rsa2: 是否使用RSA2签名，默认True
+
+        Returns:
+            str: 完整的authInfo字符串
+        """
+        try:
+            with span("authinfo"):
+                auth_info, auth_info_map = await self._sign_auth_info(pid, target_id, rsa2)
+
+            logger.info("生成authInfo成功，target_id: %s", auth_info_map.get('target_id'))
+            return auth_info
+
+        except Exception as e:
+            logger.error("生成authInfo失败: %s", e)
+            raise
+
+    @observe_operation("presign_auth_info")
+    async def presign_auth_info(self, pid: str, target_id: str = None, rsa2: bool = True) -> str:
+        """为预签名池生成authInfo
+
+        后台补充池时使用，耗时按 presign_auth_info 单独统计，不计入请求路径的 generate_auth_info
+
+        Args:
+            pid: 商户签约拿到的pid
+            target_id: 商户唯一标识，如果不提供则自动生成
+            rsa2: 是否使用RSA2签名，默认True
+
+        Returns:
+            str: 完整的authInfo字符串
+        """
+        auth_info, _ = await self._sign_auth_info(pid, target_id, rsa2)
+        return auth_info
+
+    async def generate_auth_info_batch(self, items: List[Dict[str, Any]],
+                                       concurrency: int = 64) -> AsyncIterator[Dict[str, Any]]:
+        """批量生成authInfo，按签名完成顺序逐条返回结果
+
+        单条失败只在该条结果的 error 字段中体现，不影响其余条目。
+
+        Args:
+            items: 包含 pid、target_id、rsa2 的条目列表
+            concurrency: 同时提交给签名引擎的最大条目数
+
+        Yields:
+            Dict[str, Any]: 单条结果，包含 index、pid、target_id、sign_type、authInfo、error
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def sign_item(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            pid = item.get('pid')
+            rsa2 = item.get('rsa2', True)
+            result = {
+                "index": index,
+                "pid": pid,
+                "target_id": item.get('target_id'),
+                "sign_type": "RSA2" if rsa2 else "RSA",
+                "authInfo": None,
+                "error": None
+            }
+            if not pid:
+                result["error"] = "pid不能为空"
+                return result
+            async with semaphore:
+                try:
+                    auth_info, auth_info_map = await self._sign_auth_info(pid, item.get('target_id'), rsa2)
+                    result["authInfo"] = auth_info
+                    result["target_id"] = auth_info_map.get('target_id')
+                except Exception as e:
+                    logger.error("批量生成authInfo失败，index: %d, 错误: %s", index, e)
+                    result["error"] = f"生成authInfo失败: {str(e)}"
+            return result
+
+        tasks = [asyncio.ensure_future(sign_item(index, item)) for index, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 客户端断开时取消尚未完成的签名
+            for task in tasks:
+                task.cancel()
+
+    async def _sign_auth_info(self, pid: str, target_id: str = None,
+                              rsa2: bool = True) -> Tuple[str, Dict[str, str]]:
+        """构造授权参数并通过签名引擎签名
+
+        Returns:
+            Tuple[str, Dict[str, str]]: (authInfo字符串, 授权参数字典)
+        """
+        # 构建授权参数
+        auth_info_map = self.build_auth_info_map(pid, target_id, rsa2)
+
+        # 构建参数字符串
+        info = self.build_order_param(auth_info_map)
+
+        # 生成签名
+        with span("sign"):
+            ori_sign = await sign_engine.sign(self.build_sign_content(auth_info_map), rsa2)
+        sign = self.format_sign(ori_sign)
+
+        # 拼接完整的authInfo
+        return f"{info}&{sign}", auth_info_map
+
+    async def _execute(self, method: str, biz_params: Dict[str, str], auth_token: str = None) -> str:
+        """执行网关请求
+
+        Args:
+            method: 网关接口名称
+            biz_params: 业务参数
+            auth_token: 用户授权令牌（可选）
+
+        Returns:
+            str: 验签通过的响应节点JSON字符串，与 DefaultAlipayClient.execute 的返回值一致
+
+        Raises:
+            CircuitOpenError: 接口熔断中
+            ConcurrencyLimitError: 网关并发调用数达到上限
+        """
+        if hedger.applies(method):
+            return await hedger.run(method, gateway_guard.call, method, self._execute_once,
+                                    method, biz_params, auth_token)
+        return await gateway_guard.call(method, self._execute_once, method, biz_params, auth_token)
+
+    async def _execute_once(self, method: str, biz_params: Dict[str, str], auth_token: str = None) -> str:
+        """执行一次网关请求（不经过熔断与并发限制），超时时间不超过当前请求的剩余时限
+
+        Raises:
+            DeadlineExceededError: 请求处理时限已用完
+        """
+        timeout = deadline.timeout_for(self.timeout)
+
+        if self.transport == "sdk":
+            request = self._build_sdk_request(method, biz_params, auth_token)
+            # SDK调用在线程中执行无法中断，时限到达后放弃等待，结果由线程自行丢弃
+            try:
+                async with asyncio.timeout(timeout):
+                    return await gateway_executor.run(self.alipay_client.execute, request)
+            except TimeoutError:
+                raise DeadlineExceededError(f"{method} 超出请求处理时限")
+
+        query_params, body_params = self._prepare_request(method, biz_params, auth_token)
+
+        try:
+            response = await self.http_client.post(
+                str(alipay_config.gateway_url),
+                params=query_params,
+                data=body_params,
+                headers={
+                    'Content-Type': f"application/x-www-form-urlencoded;charset={alipay_config.charset}"
+                },
+                timeout=timeout,
+                extensions={"trace": self.connection_stats.tracer()}
+            )
+        except httpx.TimeoutException as e:
+            if timeout < self.timeout:
+                raise DeadlineExceededError(f"{method} 超出请求处理时限") from e
+            raise
+        response.raise_for_status()
+
+        return self._parse_gateway_response(response.text, method)
+
+    @staticmethod
+    def _build_sdk_request(method: str, biz_params: Dict[str, str], auth_token: str = None):
+        """构造与网关接口对应的SDK请求对象"""
+        if method == METHOD_OAUTH_TOKEN:
+            request = AlipaySystemOauthTokenRequest()
+            request.grant_type = biz_params.get('grant_type')
+            if biz_params.get('code'):
+                request.code = biz_params['code']
+            if biz_params.get('refresh_token'):
+                request.refresh_token = biz_params['refresh_token']
+        elif method == METHOD_USER_INFO_SHARE:
+            request = AlipayUserInfoShareRequest()
+        else:
+            raise ValueError(f"不支持的网关接口: {method}")
+
+        if auth_token:
+            request.udf_params = {'auth_token': auth_token}
+        return request
+
+    def _prepare_request(self, method: str, biz_params: Dict[str, str],
+                         auth_token: str = None) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """构造公共参数并签名
+
+        Args:
+            method: 网关接口名称
+            biz_params: 业务参数
+            auth_token: 用户授权令牌（可选）
+
+        Returns:
+            Tuple[Dict[str, str], Dict[str, str]]: (URL查询参数, 表单参数)
+        """
+        common_params = {
+            'app_id': str(alipay_config.app_id),
+            'method': method,
+            'format': alipay_config.format,
+            'charset': alipay_config.charset,
+            'sign_type': str(alipay_config.sign_type),
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'version': alipay_config.version
+        }
+        if auth_token:
+            common_params['auth_token'] = auth_token
+
+        body_params = {k: v for k, v in biz_params.items() if v}
+
+        # 公共参数与业务参数一起参与签名
+        sign_content = self._build_gateway_sign_content({**common_params, **body_params})
+        with span("sign"):
+            common_params['sign'] = self._sign(sign_content)
+
+        return common_params, body_params
+
+    def _build_gateway_sign_content(self, params: Dict[str, str]) -> str:
+        """按key排序拼接待签名字符串，忽略空值"""
+        return "&".join(
+            self._build_key_value(key, params[key], False)
+            for key in sorted(params)
+            if params[key]
+        )
+
+    def _sign(self, content: str) -> str:
+        """使用应用私钥签名"""
+        return rsa_signer.sign_base64(
+            content.encode(alipay_config.charset),
+            rsa2=alipay_config.sign_type == "RSA2"
+        )
+
+    def _parse_gateway_response(self, body: str, method: str) -> str:
+        """提取响应节点并使用支付宝公钥验签
+
+        Args:
+            body: 网关原始响应
+            method: 网关接口名称
+
+        Returns:
+            str: 响应节点JSON字符串
+        """
+        response_dict = json.loads(body)
+
+        node = method.replace('.', '_') + '_response'
+        if node not in response_dict:
+            node = 'error_response'
+        if node not in response_dict:
+            raise Exception(f"网关响应格式错误: {body}")
+
+        sign = response_dict.get('sign')
+        if sign:
+            content = self._extract_node_content(body, node)
+            algorithm = hashes.SHA256() if alipay_config.sign_type == "RSA2" else hashes.SHA1()
+            try:
+                self._public_key.verify(
+                    base64.b64decode(sign),
+                    content.encode(alipay_config.charset),
+                    padding.PKCS1v15(),
+                    algorithm
+                )
+            except InvalidSignature:
+                raise Exception(f"支付宝响应验签失败: {body}")
+        elif node == 'error_response':
+            # 未签名的错误响应直接交给解析函数生成错误信息
+            content = json.dumps(response_dict[node], ensure_ascii=False)
+        else:
+            raise Exception(f"支付宝响应缺少签名: {body}")
+
+        return content
+
+    @staticmethod
+    def _extract_node_content(body: str, node: str) -> str:
+        """截取响应节点的原始文本，验签必须基于未经重新序列化的原文"""
+        start = body.index(f'"{node}"')
+        start = body.index(':', start) + 1
+        end = body.rfind('"sign"')
+        end = body.rfind(',', start, end)
+        return body[start:end].strip()
@@ -0,0 +1,179 @@
+"""
+预签名authInfo池
+未指定target_id时，authInfo只取决于pid和签名类型，可以提前在后台签好。
+接口直接从池中取出一条（O(1)），池空时再回退到实时签名。
+"""
+
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, bool]
+
+
+class AuthInfoPool:
+    """预签名authInfo池
+
+    - 每个 (pid, rsa2) 一个先进先出队列，最旧的条目在队头
+    - 数量低于 low_watermark 时唤醒后台生产者，补充到 high_watermark
+    - 超过 ttl 秒的条目在取出或补充时丢弃
+    """
+
+    def __init__(self, producer: Callable[[str, str, bool], Awaitable[str]],
+                 pids: Iterable[str], sign_types: Iterable[bool] = (True,),
+                 low_watermark: int = 50, high_watermark: int = 200,
+                 ttl: float = 600.0, concurrency: int = 8):
+        """
+        初始化预签名池
+
+        Args:
+            producer: 生成authInfo的协程函数，参数为 (pid, target_id, rsa2)
+            pids: 需要预签名的pid列表
+            sign_types: 需要预签名的签名类型，True 为RSA2，False 为RSA
+            low_watermark: 低水位，低于此数量时触发补充
+            high_watermark: 高水位，每次补充到此数量
+            ttl: 条目有效期（秒）
+            concurrency: 补充时同时签名的条目数
+        """
+        if low_watermark > high_watermark:
+            raise ValueError("low_watermark 不能大于 high_watermark")
+
+        self.producer = producer
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.ttl = ttl
+        self.concurrency = concurrency
+
+        self._pools: Dict[PoolKey, Deque[Tuple[float, str]]] = {
+            (pid, rsa2): deque() for pid in pids for rsa2 in sign_types
+        }
+        self._refill_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.produced = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否配置了需要预签名的pid"""
+        return bool(self._pools)
+
+    def pop(self, pid: str, rsa2: bool = True) -> Optional[str]:
+        """取出一条预签名的authInfo
+
+        Args:
+            pid: 商户pid
+            rsa2: 是否使用RSA2签名
+
+        Returns:
+            Optional[str]: authInfo，池中没有可用条目时返回None
+        """
+        pool = self._pools.get((pid, bool(rsa2)))
+        if pool is None:
+            return None
+
+        deadline = time.monotonic() - self.ttl
+        while pool:
+            created_at, auth_info = pool.popleft()
+            if created_at > deadline:
+                self.hits += 1
+                if len(pool) < self.low_watermark:
+                    self._wake_producer()
+                return auth_info
+            self.expired += 1
+
+        self.misses += 1
+        self._wake_producer()
+        return None
+
+    def start(self):
+        """启动后台生产者"""
+        if not self.enabled or self._task is not None:
+            return
+        self._refill_event = asyncio.Event()
+        self._refill_event.set()
+        self._task = asyncio.create_task(self._run())
+        logger.info("预签名authInfo池已启动，条目类型数: %s", len(self._pools))
+
+    async def stop(self):
+        """停止后台生产者"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """获取池统计信息
+
+        Returns:
+            Dict[str, Any]: 各池的可用数量与命中、未命中、过期计数
+        """
+        return {
+            "sizes": {
+                f"{pid}:{'RSA2' if rsa2 else 'RSA'}": len(pool)
+                for (pid, rsa2), pool in self._pools.items()
+            },
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "produced": self.produced,
+            "errors": self.errors,
+        }
+
+    def _wake_producer(self):
+        if self._refill_event is not None:
+            self._refill_event.set()
+
+    async def _run(self):
+        """生产者主循环：被唤醒或每隔ttl的一部分时间检查一次各池"""
+        while True:
+            # 使用 asyncio.timeout 而非 wait_for：事件恰好被设置时 wait_for 会吞掉 stop() 的取消
+            try:
+                async with asyncio.timeout(max(self.ttl / 4, 1.0)):
+                    await self._refill_event.wait()
+            except TimeoutError:
+                pass
+            self._refill_event.clear()
+
+            for key, pool in self._pools.items():
+                self._discard_expired(pool)
+                if len(pool) < self.low_watermark:
+                    await self._refill(key, pool)
+
+    def _discard_expired(self, pool: Deque[Tuple[float, str]]):
+        deadline = time.monotonic() - self.ttl
+        while pool and pool[0][0] <= deadline:
+            pool.popleft()
+            self.expired += 1
+
+    async def _refill(self, key: PoolKey, pool: Deque[Tuple[float, str]]):
+        """补充到高水位"""
+        pid, rsa2 = key
+        while len(pool) < self.high_watermark:
+            count = min(self.concurrency, self.high_watermark - len(pool))
+            results = await asyncio.gather(
+                *(self.producer(pid, None, rsa2) for _ in range(count)),
+                return_exceptions=True
+            )
+            now = time.monotonic()
+            for result in results:
+                if isinstance(result, Exception):
+                    self.errors += 1
+                    continue
+                pool.append((now, result))
+                self.produced += 1
+            if all(isinstance(r, Exception) for r in results):
+                logger.error("预签名authInfo失败，pid: %s，稍后重试", pid)
+                return
@@ -0,0 +1,315 @@
+"""
+网关熔断与自适应并发限制
+网关故障时，请求会一直等到超时才失败，占满worker。
+熔断器按接口统计最近调用的错误率与慢调用率，超过阈值后直接拒绝，恢复期后放行少量探测请求；
+自适应并发限制按 AIMD（加性增、乘性减）调整同时进行的网关调用数，超出上限立即返回503。
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+from config.alipay_config import alipay_config
+from services.errors import CircuitOpenError, ConcurrencyLimitError, DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """单个网关接口的熔断器
+
+    - closed：正常放行，记录最近 window 次调用的结果
+    - 最近调用数不少于 min_calls，且错误率或慢调用率达到阈值时进入 open
+    - open：直接拒绝，open_seconds 秒后进入 half_open
+    - half_open：最多放行 half_open_probes 个探测请求，全部成功则恢复 closed，任一失败重新 open
+    """
+
+    def __init__(self, name: str, failure_rate: float = 0.5, slow_call_rate: float = 0.8,
+                 slow_call_seconds: float = 5.0, window: int = 20, min_calls: int = 10,
+                 open_seconds: float = 30.0, half_open_probes: int = 3):
+        """
+        初始化熔断器
+
+        Args:
+            name: 接口名称
+            failure_rate: 触发熔断的错误率
+            slow_call_rate: 触发熔断的慢调用率
+            slow_call_seconds: 超过该耗时（秒）的调用视为慢调用
+            window: 统计的最近调用数
+            min_calls: 计算比例所需的最少调用数
+            open_seconds: 熔断持续时间（秒）
+            half_open_probes: 半开状态下放行的探测请求数
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = STATE_CLOSED
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)  # (失败, 慢调用)
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+
+        # 统计信息
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self):
+        """调用前检查是否放行
+
+        Raises:
+            CircuitOpenError: 熔断中或半开探测名额已用完
+        """
+        if self.state == STATE_OPEN:
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} 已熔断，{remaining:.0f}秒后重试", retry_after=remaining)
+            self.state = STATE_HALF_OPEN
+            self._probes_started = 0
+            self._probes_succeeded = 0
+            logger.info("网关接口 %s 熔断恢复期结束，开始探测", self.name)
+
+        if self.state == STATE_HALF_OPEN:
+            if self._probes_started >= self.half_open_probes:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} 正在探测恢复，请稍后重试", retry_after=1.0)
+            self._probes_started += 1
+
+    def record(self, failed: bool, elapsed: float):
+        """记录一次调用结果
+
+        Args:
+            failed: 调用是否失败
+            elapsed: 调用耗时（秒）
+        """
+        slow = elapsed >= self.slow_call_seconds
+
+        if self.state == STATE_HALF_OPEN:
+            if failed or slow:
+                self._open()
+                return
+            self._probes_succeeded += 1
+            if self._probes_succeeded >= self.half_open_probes:
+                self.state = STATE_CLOSED
+                self._outcomes.clear()
+                logger.info("网关接口 %s 已恢复，熔断关闭", self.name)
+            return
+
+        if self.state != STATE_CLOSED:
+            return
+        self._outcomes.append((failed, slow))
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for f, _ in self._outcomes if f)
+        slow_calls = sum(1 for _, s in self._outcomes if s)
+        if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+            self._open()
+
+    def cancel(self):
+        """调用被取消（如客户端断开），不计入结果；半开状态下归还探测名额"""
+        if self.state == STATE_HALF_OPEN and self._probes_started > 0:
+            self._probes_started -= 1
+
+    def _open(self):
+        self.state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+        logger.warning("网关接口 %s 错误或慢调用过多，熔断 %s 秒", self.name, self.open_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取熔断器统计信息
+
+        Returns:
+            Dict[str, Any]: 状态、窗口内的错误与慢调用数、累计拒绝与熔断次数
+        """
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_failures": sum(1 for f, _ in self._outcomes if f),
+            "window_slow_calls": sum(1 for _, s in self._outcomes if s),
+            "rejected": self.rejected,
+            "opened": self.opened,
+        }
+
+
+class AdaptiveConcurrencyLimit:
+    """AIMD 自适应并发限制
+
+    成功且不慢的调用使上限加性增长（每个上限数量的成功调用约 +1），
+    失败或慢调用使上限乘以 decrease_factor；进行中的调用数达到上限时立即拒绝。
+    """
+
+    def __init__(self, initial: int = 16, min_limit: int = 2, max_limit: int = 64,
+                 decrease_factor: float = 0.5, slow_call_seconds: float = 5.0):
+        """
+        初始化并发限制
+
+        Args:
+            initial: 初始上限
+            min_limit: 最小上限
+            max_limit: 最大上限
+            decrease_factor: 失败或慢调用时上限的缩减倍数
+            slow_call_seconds: 超过该耗时（秒）的调用视为慢调用
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.slow_call_seconds = slow_call_seconds
+
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """占用一个并发名额
+
+        Raises:
+            ConcurrencyLimitError: 进行中的调用数已达上限
+        """
+        if self.in_flight >= int(self.limit):
+            self.rejected += 1
+            raise ConcurrencyLimitError(f"网关并发调用已达上限（{int(self.limit)}）", retry_after=1.0)
+        self.in_flight += 1
+
+    def release(self, failed: Optional[bool], elapsed: float):
+        """释放名额并按调用结果调整上限
+
+        Args:
+            failed: 调用是否失败，None 表示调用被取消、不调整上限
+            elapsed: 调用耗时（秒）
+        """
+        self.in_flight -= 1
+        if failed is None:
+            return
+        if failed or elapsed >= self.slow_call_seconds:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取并发限制统计信息
+
+        Returns:
+            Dict[str, Any]: 当前上限、进行中的调用数与累计拒绝次数
+        """
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+
+class GatewayGuard:
+    """网关调用保护：共享的自适应并发限制 + 按接口的熔断器"""
+
+    def __init__(self, concurrency: AdaptiveConcurrencyLimit,
+                 breaker_factory: Callable[[str], CircuitBreaker]):
+        """
+        初始化网关调用保护
+
+        Args:
+            concurrency: 自适应并发限制
+            breaker_factory: 按接口名称创建熔断器的函数
+        """
+        self.concurrency = concurrency
+        self.breaker_factory = breaker_factory
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, operation: str) -> CircuitBreaker:
+        """获取接口对应的熔断器"""
+        breaker = self._breakers.get(operation)
+        if breaker is None:
+            breaker = self._breakers[operation] = self.breaker_factory(operation)
+        return breaker
+
+    async def call(self, operation: str, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """在熔断器与并发限制保护下执行网关调用
+
+        Args:
+            operation: 接口名称
+            func: 执行网关调用的协程函数
+            *args: 函数参数
+
+        Returns:
+            Any: 函数返回值
+
+        Raises:
+            CircuitOpenError: 接口熔断中
+            ConcurrencyLimitError: 并发调用数达到上限
+        """
+        breaker = self.breaker(operation)
+        breaker.before_call()
+        try:
+            self.concurrency.acquire()
+        except ConcurrencyLimitError:
+            breaker.cancel()
+            raise
+
+        started = time.monotonic()
+        try:
+            result = await func(*args)
+        except (asyncio.CancelledError, DeadlineExceededError):
+            # 调用方放弃（客户端断开或请求时限用完）不代表网关故障，不计入结果
+            self.concurrency.release(None, 0.0)
+            breaker.cancel()
+            raise
+        except Exception:
+            elapsed = time.monotonic() - started
+            self.concurrency.release(True, elapsed)
+            breaker.record(True, elapsed)
+            raise
+
+        elapsed = time.monotonic() - started
+        self.concurrency.release(False, elapsed)
+        breaker.record(False, elapsed)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """获取网关调用保护统计信息
+
+        Returns:
+            Dict[str, Any]: 并发限制与各接口熔断器的状态
+        """
+        return {
+            "concurrency": self.concurrency.stats(),
+            "breakers": {name: breaker.stats() for name, breaker in self._breakers.items()},
+        }
+
+
+def _create_breaker(operation: str) -> CircuitBreaker:
+    """按配置创建熔断器，CIRCUIT_BREAKER_OVERRIDES 中可以为单个接口覆盖阈值"""
+    options = {
+        "failure_rate": alipay_config.circuit_breaker_failure_rate,
+        "slow_call_rate": alipay_config.circuit_breaker_slow_call_rate,
+        "slow_call_seconds": alipay_config.circuit_breaker_slow_call_seconds,
+        "window": alipay_config.circuit_breaker_window,
+        "min_calls": alipay_config.circuit_breaker_min_calls,
+        "open_seconds": alipay_config.circuit_breaker_open_seconds,
+        "half_open_probes": alipay_config.circuit_breaker_half_open_probes,
+    }
+    options.update(alipay_config.circuit_breaker_overrides.get(operation, {}))
+    return CircuitBreaker(operation, **options)
+
+
+# 全局网关调用保护
+gateway_guard = GatewayGuard(
+    concurrency=AdaptiveConcurrencyLimit(
+        initial=alipay_config.gateway_concurrency_initial,
+        min_limit=alipay_config.gateway_concurrency_min,
+        max_limit=alipay_config.gateway_concurrency_max,
+        slow_call_seconds=alipay_config.circuit_breaker_slow_call_seconds
+    ),
+    breaker_factory=_create_breaker
+)
@@ -0,0 +1,73 @@
+"""
+网关连接统计
+通过 httpx 的 trace 扩展记录每次请求是新建连接还是复用连接池中的连接，
+以及新建连接的TCP连接耗时与TLS握手耗时。
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+
+class ConnectionStats:
+    """网关连接复用率与握手耗时统计
+
+    每个请求通过 tracer() 获取独立的 trace 回调；请求过程中完成了 connect_tcp 即为新建连接，
+    未建立连接就开始发送请求则为复用已有的 keep-alive 连接。连接失败的请求两者都不计入。
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.reused_connections = 0
+        self.new_connections = 0
+        self.connect_seconds_total = 0.0
+        self.tls_seconds_total = 0.0
+        self.tls_seconds_max = 0.0
+
+    def tracer(self) -> Callable[[str, Dict[str, Any]], Awaitable[None]]:
+        """创建单个请求使用的 trace 回调，作为 extensions={"trace": ...} 传给 httpx"""
+        self.requests += 1
+        started: Dict[str, float] = {}
+        state = {"connected": False, "sent": False}
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name.endswith(".started"):
+                step = event_name[:-len(".started")]
+                started[step] = time.perf_counter()
+                if step.endswith("send_request_headers") and not state["sent"]:
+                    # 开始发送请求时尚未新建连接，说明使用的是连接池中的连接
+                    state["sent"] = True
+                    if not state["connected"]:
+                        self.reused_connections += 1
+            elif event_name.endswith(".complete"):
+                step = event_name[:-len(".complete")]
+                if step not in started:
+                    return
+                elapsed = time.perf_counter() - started.pop(step)
+                if step == "connection.connect_tcp":
+                    state["connected"] = True
+                    self.new_connections += 1
+                    self.connect_seconds_total += elapsed
+                elif step == "connection.start_tls":
+                    self.tls_seconds_total += elapsed
+                    self.tls_seconds_max = max(self.tls_seconds_max, elapsed)
+
+        return trace
+
+    def stats(self) -> Dict[str, Any]:
+        """获取连接统计信息
+
+        Returns:
+            Dict[str, Any]: 请求数、复用与新建连接数、连接复用率及平均/最大握手耗时
+        """
+        connections = self.reused_connections + self.new_connections
+        return {
+            "requests": self.requests,
+            "reused_connections": self.reused_connections,
+            "new_connections": self.new_connections,
+            "reuse_rate": round(self.reused_connections / connections, 4) if connections else 0.0,
+            "avg_connect_ms": round(self.connect_seconds_total / self.new_connections * 1000, 3)
+            if self.new_connections else 0.0,
+            "avg_tls_handshake_ms": round(self.tls_seconds_total / self.new_connections * 1000, 3)
+            if self.new_connections else 0.0,
+            "max_tls_handshake_ms": round(self.tls_seconds_max * 1000, 3),
+        }
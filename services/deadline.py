@@ -0,0 +1,61 @@
+"""
+请求处理时限
+中间件为每个请求设置截止时间并保存在上下文变量中，服务层的网关调用只使用剩余的时间，
+时间用完后直接放弃，不再为客户端已经不等待的结果占用资源。
+"""
+
+import time
+from contextvars import ContextVar, Token
+from typing import Optional
+from services.errors import DeadlineExceededError
+
+# 客户端可以通过该请求头告知自己的等待时间（秒），实际时限取其与路由时限的较小值
+DEADLINE_HEADER = "X-Request-Timeout"
+
+# 当前请求的截止时间（time.monotonic），None 表示不限时（如后台任务）
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(seconds: Optional[float]) -> Token:
+    """设置当前上下文的处理时限
+
+    Args:
+        seconds: 从现在起的可用时间（秒），None 表示不限时
+
+    Returns:
+        Token: 用于 reset_deadline 恢复之前的设置
+    """
+    return _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def reset_deadline(token: Token):
+    """恢复 set_deadline 之前的时限"""
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """当前请求剩余的时间（秒），不限时返回None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def timeout_for(default: float) -> float:
+    """计算一次下游调用可用的超时时间
+
+    Args:
+        default: 下游调用本身的超时时间（秒）
+
+    Returns:
+        float: 默认超时与剩余时间中的较小值
+
+    Raises:
+        DeadlineExceededError: 剩余时间已用完
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceededError("请求处理时限已用完")
+    return min(default, left)
@@ -0,0 +1,30 @@
+"""
+服务层异常定义
+"""
+
+from typing import Optional
+
+
+class GatewayUnavailableError(Exception):
+    """支付宝网关暂时不可用，调用方应快速失败（对应HTTP 503）"""
+
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message)
+        # 建议客户端重试前等待的秒数（可选，对应 Retry-After 响应头）
+        self.retry_after = retry_after
+
+
+class GatewayBusyError(GatewayUnavailableError):
+    """网关调用线程池已满或排队超时"""
+
+
+class CircuitOpenError(GatewayUnavailableError):
+    """网关接口熔断中，在熔断恢复前直接拒绝"""
+
+
+class ConcurrencyLimitError(GatewayUnavailableError):
+    """网关并发调用数达到自适应上限"""
+
+
+class DeadlineExceededError(Exception):
+    """请求的处理时限已用完，客户端已不再等待结果（对应HTTP 504）"""
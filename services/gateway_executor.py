@@ -0,0 +1,202 @@
+"""
+网关阻塞调用执行器
+将SDK的同步网关调用放到独立、有界的线程池中执行，避免阻塞事件循环
+"""
+
+import asyncio
+import time
+import logging
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+from config.alipay_config import alipay_config
+from services.errors import GatewayBusyError
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayExecutor:
+    """有界线程池执行器
+
+    - 并发上限：同时最多 max_workers 个调用在线程中执行
+    - 有界排队：最多 max_queue 个调用等待空闲线程，超出立即拒绝
+    - 排队超时：等待超过 queue_timeout 秒则放弃
+    通过 stats() 可以区分“繁忙”（排队深）与“卡死”（活跃调用长时间不返回）。
+    """
+
+    def __init__(self, max_workers: int = 8, max_queue: int = 64, queue_timeout: float = 5.0):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 最大并发调用数（线程数）
+            max_queue: 最大排队调用数
+            queue_timeout: 排队等待超时（秒）
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alipay-gateway")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = Lock()
+
+        # 统计信息
+        self._waiting = 0
+        self._active = 0
+        self._active_since: Dict[int, float] = {}
+        self._tokens = itertools.count()
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """延迟创建信号量，使其绑定到运行中的事件循环"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """在线程池中执行阻塞调用
+
+        Args:
+            func: 阻塞函数
+            *args: 函数参数
+
+        Returns:
+            Any: 函数返回值
+
+        Raises:
+            GatewayBusyError: 排队已满或排队超时
+        """
+        semaphore = self._get_semaphore()
+
+        with self._lock:
+            if semaphore.locked() and self._waiting >= self.max_queue:
+                self._rejected += 1
+                raise GatewayBusyError(f"网关调用排队已满（{self._waiting}/{self.max_queue}）")
+            self._waiting += 1
+
+        enqueued_at = time.monotonic()
+        # 不使用 wait_for：旧版本中 acquire 成功与超时同时发生时名额会丢失；
+        # 获取名额后出现任何异常（如超时与取消竞争）都先归还名额
+        acquired = False
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await semaphore.acquire()
+                acquired = True
+        except BaseException as e:
+            if acquired:
+                semaphore.release()
+            if not isinstance(e, TimeoutError):
+                raise
+            with self._lock:
+                self._timed_out += 1
+            raise GatewayBusyError(f"网关调用排队超时（{self.queue_timeout}秒）") from None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        wait_time = time.monotonic() - enqueued_at
+        with self._lock:
+            token = next(self._tokens)
+            self._active += 1
+            self._active_since[token] = time.monotonic()
+            self._total_wait += wait_time
+            self._max_wait = max(self._max_wait, wait_time)
+
+        # 调用方被取消（如超出请求处理时限）时线程中的调用仍在执行，
+        # 因此在线程中的调用真正结束时才释放并发名额，而不是在协程退出时
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._release(token, semaphore, loop, None)
+            raise
+        future.add_done_callback(functools.partial(self._release, token, semaphore, loop))
+        return await asyncio.wrap_future(future)
+
+    def run_sync(self, func: Callable[..., Any], *args) -> Any:
+        """在同步代码中通过线程池执行阻塞调用，与异步调用共用线程数上限与统计
+
+        Args:
+            func: 阻塞函数
+            *args: 函数参数
+
+        Returns:
+            Any: 函数返回值
+
+        Raises:
+            RuntimeError: 在事件循环线程中调用（同步等待会阻塞事件循环，应使用 run）
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("不能在事件循环线程中同步等待网关调用，请使用 AsyncAlipayService 的异步方法")
+        return self._executor.submit(self._run_tracked, func, *args).result()
+
+    def _run_tracked(self, func: Callable[..., Any], *args) -> Any:
+        """在工作线程中执行同步调用并记录活跃状态"""
+        with self._lock:
+            token = next(self._tokens)
+            self._active += 1
+            self._active_since[token] = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._active_since.pop(token, None)
+                self._completed += 1
+
+    def _release(self, token: int, semaphore: asyncio.Semaphore, loop: asyncio.AbstractEventLoop, _future):
+        """线程中的调用结束（或在开始前被取消）后释放并发名额，可能在工作线程中被调用"""
+        with self._lock:
+            self._active -= 1
+            self._active_since.pop(token, None)
+            self._completed += 1
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            # 事件循环已关闭（进程退出中），无需再释放
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """获取执行器统计信息
+
+        Returns:
+            Dict[str, Any]: 排队深度、活跃线程数、等待时间等
+        """
+        with self._lock:
+            now = time.monotonic()
+            started = self._completed + self._active
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._waiting,
+                "active_workers": self._active,
+                "oldest_active_seconds": round(now - min(self._active_since.values()), 3) if self._active_since else 0.0,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "avg_wait_seconds": round(self._total_wait / started, 6) if started else 0.0,
+                "max_wait_seconds": round(self._max_wait, 6),
+            }
+
+    def shutdown(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False)
+
+
+# 全局网关调用执行器
+gateway_executor = GatewayExecutor(
+    max_workers=alipay_config.gateway_executor_workers,
+    max_queue=alipay_config.gateway_executor_queue_size,
+    queue_timeout=alipay_config.gateway_executor_queue_timeout
+)
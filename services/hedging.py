@@ -0,0 +1,166 @@
+"""
+网关对冲请求（hedged requests）
+只读接口的请求超过历史延迟的某个分位数仍未返回时，再发出一个相同的请求，取先成功的结果并取消另一个，
+用少量额外请求削减偶发慢节点造成的长尾延迟。
+
+只有重复执行没有副作用的接口才能对冲：
+- alipay.user.info.share：只读，可以对冲
+- alipay.system.oauth.token：授权码只能使用一次、刷新令牌使用后会被轮换，重复请求会使其中一个失败，不能对冲
+"""
+
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable
+from config.alipay_config import alipay_config
+
+logger = logging.getLogger(__name__)
+
+# 不能对冲的接口及原因
+UNSAFE_TO_HEDGE = {
+    "alipay.system.oauth.token": "授权码只能使用一次，刷新令牌使用后会被轮换",
+}
+
+
+class _LatencyWindow:
+    """最近若干次成功调用的耗时"""
+
+    def __init__(self, size: int):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, elapsed: float):
+        self.samples.append(elapsed)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class Hedger:
+    """对冲请求执行器
+
+    - 每个接口单独统计最近 window 次成功调用的耗时
+    - 样本数不少于 min_samples 后，首个请求超过 percentile 分位耗时（不低于 min_delay）仍未返回时发出对冲请求
+    - 对冲请求数不超过总调用数的 max_hedge_rate
+    """
+
+    def __init__(self, operations: Iterable[str], percentile: float = 0.95, min_delay: float = 0.05,
+                 max_hedge_rate: float = 0.1, window: int = 200, min_samples: int = 20):
+        """
+        初始化对冲执行器
+
+        Args:
+            operations: 允许对冲的接口名称
+            percentile: 触发对冲的延迟分位数
+            min_delay: 最小对冲等待时间（秒）
+            max_hedge_rate: 对冲请求占总调用数的上限
+            window: 每个接口保留的耗时样本数
+            min_samples: 开始对冲所需的最少样本数
+
+        Raises:
+            ValueError: operations 中包含不能对冲的接口
+        """
+        self.operations = set(operations)
+        for operation in self.operations & UNSAFE_TO_HEDGE.keys():
+            raise ValueError(f"接口 {operation} 不能对冲: {UNSAFE_TO_HEDGE[operation]}")
+
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_hedge_rate = max_hedge_rate
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies: Dict[str, _LatencyWindow] = {}
+
+        # 统计信息
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def applies(self, operation: str) -> bool:
+        """接口是否启用对冲"""
+        return operation in self.operations
+
+    def hedge_delay(self, operation: str) -> float:
+        """当前的对冲等待时间（秒），样本不足时返回0表示不对冲"""
+        latencies = self._latencies.get(operation)
+        if latencies is None or len(latencies.samples) < self.min_samples:
+            return 0.0
+        return max(self.min_delay, latencies.percentile(self.percentile))
+
+    async def run(self, operation: str, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """执行调用，必要时发出对冲请求
+
+        Args:
+            operation: 接口名称
+            func: 执行一次请求的协程函数
+            *args: 函数参数
+
+        Returns:
+            Any: 最先成功的请求结果；两个请求都失败时抛出首个请求的异常
+        """
+        self.calls += 1
+        delay = self.hedge_delay(operation)
+        primary = asyncio.create_task(self._timed(operation, func, *args))
+        if not delay:
+            return await primary
+
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+
+            if self.hedged >= self.max_hedge_rate * self.calls:
+                self.budget_exhausted += 1
+                return await primary
+
+            self.hedged += 1
+            hedge = asyncio.create_task(self._timed(operation, func, *args))
+            tasks.append(hedge)
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+            # 两个请求都失败
+            return primary.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _timed(self, operation: str, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        started = time.monotonic()
+        result = await func(*args)
+        latencies = self._latencies.get(operation)
+        if latencies is None:
+            latencies = self._latencies[operation] = _LatencyWindow(self.window)
+        latencies.add(time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """获取对冲统计信息
+
+        Returns:
+            Dict[str, Any]: 调用数、对冲数、对冲请求胜出数、因预算不足未对冲数及各接口当前对冲等待时间
+        """
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "budget_exhausted": self.budget_exhausted,
+            "delays_ms": {op: round(self.hedge_delay(op) * 1000, 3) for op in self._latencies},
+        }
+
+
+# 全局对冲执行器（HEDGE_ENABLED 关闭时不对任何接口对冲）
+hedger = Hedger(
+    operations=alipay_config.hedge_operations if alipay_config.hedge_enabled else (),
+    percentile=alipay_config.hedge_percentile,
+    max_hedge_rate=alipay_config.hedge_max_rate
+)
@@ -0,0 +1,194 @@
+"""
+非阻塞结构化日志
+日志记录在调用线程（事件循环）上只做采样判断、补充请求ID并放入有界队列，
+消息格式化、敏感信息脱敏、JSON序列化和写入都在后台写日志线程中完成。
+
+- 格式化推迟到写入时：请使用 logger.info("...: %s", value) 的惰性参数形式，而不是 f-string
+- INFO 及以下级别按 LOG_INFO_SAMPLE_RATE 采样，WARNING 及以上全部保留
+- 访问令牌、刷新令牌、授权码、签名与私钥在写入前用预编译的正则脱敏
+- 队列满时丢弃新的日志并计数，不阻塞调用方
+"""
+
+import re
+import sys
+import json
+import queue
+import random
+import logging
+import logging.handlers
+from typing import Any, Dict, Optional
+from config.alipay_config import alipay_config
+from services.request_timing import current_request_id
+
+# 需要脱敏的字段（key=value、"key": "value"、key: value 形式）
+_SECRET_FIELD = re.compile(
+    r"""(?i)(["']?\b(?:access_token|refresh_token|auth_token|auth_code|authcode|sign|"""
+    r"""app_private_key|private_key|secret_key)["']?\s*[:=]\s*["']?)([^"'&,\s}]+)"""
+)
+# PEM格式的密钥
+_PEM_BLOCK = re.compile(r"-----BEGIN [A-Z ]+-----.*?-----END [A-Z ]+-----", re.S)
+# 没有字段名的长Base64串（如裸私钥、公钥、签名）
+_LONG_BASE64 = re.compile(r"[A-Za-z0-9+/]{120,}={0,2}")
+
+
+def _mask_value(match: re.Match) -> str:
+    value = match.group(2)
+    return f"{match.group(1)}{value[:4]}***" if len(value) > 8 else f"{match.group(1)}***"
+
+
+def redact(message: str) -> str:
+    """对日志消息中的令牌、授权码、签名与密钥脱敏，令牌类字段保留前4个字符便于关联"""
+    if "-----BEGIN" in message:
+        message = _PEM_BLOCK.sub("[REDACTED KEY]", message)
+    message = _SECRET_FIELD.sub(_mask_value, message)
+    return _LONG_BASE64.sub("[REDACTED]", message)
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行紧凑JSON：ts、level、logger、msg，以及可选的 request_id、exc"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        if record.exc_info:
+            entry["exc"] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+class TextFormatter(logging.Formatter):
+    """本地开发用的可读文本格式，同样脱敏"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id") or record.request_id is None:
+            record.request_id = "-"
+        return redact(super().format(record))
+
+
+class SamplingFilter(logging.Filter):
+    """INFO 及以下级别按比例采样，WARNING 及以上全部保留"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        if random.random() < self.rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """放入有界队列的日志处理器
+
+    与标准 QueueHandler 不同，入队前不格式化消息（格式化在写日志线程中进行），
+    只在调用线程上记录当前请求ID；队列满时丢弃并计数。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 请求ID保存在上下文变量中，只能在产生日志的线程上读取
+        record.request_id = current_request_id()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # 队列满时等待写日志线程腾出位置，保证停止时剩余日志都能写完
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """日志管道：根日志器 -> 采样 -> 有界队列 -> 写日志线程 -> 格式化、脱敏 -> 输出流"""
+
+    def __init__(self):
+        self._listener: Optional[_QueueListener] = None
+        self._handler: Optional[NonBlockingQueueHandler] = None
+        self._sampler: Optional[SamplingFilter] = None
+
+    def setup(self, level: str = "INFO", fmt: str = "json", sample_rate: float = 1.0,
+              queue_size: int = 10000, stream=None):
+        """配置根日志器，重复调用时先停止之前的写日志线程
+
+        Args:
+            level: 日志级别
+            fmt: 输出格式，json 或 text
+            sample_rate: INFO 及以下级别的采样比例（0~1）
+            queue_size: 日志队列容量，满时丢弃新的日志
+            stream: 输出流，默认标准错误
+        """
+        self.stop()
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+        self._sampler = SamplingFilter(sample_rate)
+        self._handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        self._handler.addFilter(self._sampler)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self._handler)
+        root.setLevel(level.upper())
+
+        self._listener = _QueueListener(self._handler.queue, output, respect_handler_level=True)
+        self._listener.start()
+
+    def stop(self):
+        """写完队列中剩余的日志并停止写日志线程"""
+        if self._handler is not None:
+            logging.getLogger().removeHandler(self._handler)
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def stats(self) -> Dict[str, int]:
+        """获取日志管道统计信息
+
+        Returns:
+            Dict[str, int]: 队列长度、采样丢弃数与队列满丢弃数
+        """
+        if self._handler is None:
+            return {"queued": 0, "sampled_out": 0, "dropped": 0}
+        return {
+            "queued": self._handler.queue.qsize(),
+            "sampled_out": self._sampler.dropped,
+            "dropped": self._handler.dropped,
+        }
+
+
+# 全局日志管道
+log_pipeline = LogPipeline()
+
+
+def setup_logging():
+    """按配置启动全局日志管道"""
+    log_pipeline.setup(
+        level=alipay_config.log_level,
+        fmt=alipay_config.log_format,
+        sample_rate=alipay_config.log_info_sample_rate,
+        queue_size=alipay_config.log_queue_size
+    )
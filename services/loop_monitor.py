@@ -0,0 +1,183 @@
+"""
+事件循环延迟监控与阻塞调用检测
+后台任务每隔 interval 秒休眠一次，实际唤醒时间比预期晚的部分即为事件循环延迟（调度延迟），
+持续记录到直方图并通过 stats() 导出。
+
+同步代码（如 DefaultAlipayClient.execute、private_key.sign）在事件循环中执行时，休眠任务无法唤醒。
+独立的看门狗线程检查休眠任务的心跳，超过 block_threshold 秒没有心跳时，
+抓取事件循环线程当前的调用栈并记录告警，即可定位阻塞事件循环的代码。
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from config.alipay_config import alipay_config
+from services.metrics import event_loop_lag
+
+logger = logging.getLogger(__name__)
+
+# 阻塞报告中保留的调用栈深度（从阻塞点向外）
+STACK_LIMIT = 30
+
+
+class LoopMonitor:
+    """事件循环延迟监控器
+
+    - 延迟：休眠任务的实际唤醒时间与预期之差
+    - 阻塞：看门狗线程发现心跳停止超过阈值时，抓取事件循环线程的调用栈
+    每次阻塞只报告一次，阻塞结束后补记总时长。
+    """
+
+    def __init__(self, interval: float = 0.1, block_threshold: float = 0.1,
+                 max_reports: int = 20, window: float = 5.0):
+        """
+        初始化监控器
+
+        Args:
+            interval: 采样间隔（秒）
+            block_threshold: 事件循环阻塞超过该值（秒）时抓取调用栈，0 表示不检测
+            max_reports: 保留的阻塞报告数量
+            window: 计算近期最大延迟的时间窗口（秒）
+        """
+        self.interval = interval
+        self.block_threshold = block_threshold
+
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = 0.0
+
+        # 统计信息
+        self._recent: Deque[float] = deque(maxlen=max(1, int(window / interval)))
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+        self._total_lag = 0.0
+        self._samples = 0
+        self._stalls = 0
+        self._reports: Deque[Dict[str, Any]] = deque(maxlen=max_reports)
+        self._open_report: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在当前事件循环中启动采样任务与看门狗线程"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._sample())
+        if self.block_threshold > 0:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        """停止采样任务与看门狗线程"""
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+
+    async def _sample(self):
+        """按间隔休眠，记录实际唤醒时间比预期晚的部分"""
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            self._heartbeat = now
+            self._record(lag)
+
+    def _record(self, lag: float):
+        event_loop_lag.observe(lag)
+        self._recent.append(lag)
+        self._last_lag = lag
+        self._total_lag += lag
+        self._samples += 1
+        if lag > self._max_lag:
+            self._max_lag = lag
+        if self._open_report is not None:
+            with self._lock:
+                # 阻塞已结束，补记总时长
+                if self._open_report is not None:
+                    self._open_report["blocked_ms"] = round(lag * 1000, 1)
+                    self._open_report = None
+
+    def _watch(self):
+        """看门狗线程：心跳停止超过阈值时抓取事件循环线程的调用栈"""
+        check_interval = min(self.interval, self.block_threshold / 2)
+        reported_heartbeat = None
+        while not self._stopping.wait(check_interval):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.block_threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+            self._report(stalled)
+
+    def _report(self, stalled: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.format_stack(frame, limit=STACK_LIMIT)
+        del frame
+        report = {
+            "ts": round(time.time(), 3),
+            "stalled_ms": round(stalled * 1000, 1),
+            "blocked_ms": None,
+            "stack": [line.rstrip() for line in stack],
+        }
+        with self._lock:
+            self._stalls += 1
+            self._reports.append(report)
+            self._open_report = report
+        logger.warning("事件循环已阻塞 %.0fms（阈值 %.0fms），阻塞位置:\n%s",
+                       stalled * 1000, self.block_threshold * 1000, "".join(stack).rstrip())
+
+    def recent_max_lag(self) -> float:
+        """近期窗口内的最大延迟（秒）"""
+        return max(self._recent, default=0.0)
+
+    def reports(self) -> List[Dict[str, Any]]:
+        """最近的阻塞报告（从新到旧），包含检测时已阻塞的时长、阻塞总时长与事件循环线程的调用栈"""
+        with self._lock:
+            return list(reversed(self._reports))
+
+    def stats(self) -> Dict[str, Any]:
+        """获取监控统计信息
+
+        Returns:
+            Dict[str, Any]: 最近一次、近期最大、历史最大与平均延迟（秒），以及检测到的阻塞次数
+        """
+        return {
+            "running": self.running,
+            "lag_seconds": round(self._last_lag, 6),
+            "recent_max_lag_seconds": round(self.recent_max_lag(), 6),
+            "max_lag_seconds": round(self._max_lag, 6),
+            "avg_lag_seconds": round(self._total_lag / self._samples, 6) if self._samples else 0.0,
+            "stalls": self._stalls,
+        }
+
+
+# 全局事件循环监控器
+loop_monitor = LoopMonitor(
+    interval=alipay_config.loop_monitor_interval,
+    block_threshold=alipay_config.loop_block_threshold,
+    max_reports=alipay_config.loop_block_reports
+)
@@ -0,0 +1,146 @@
+"""
+请求耗时分解
+中间件为每个请求创建 RequestTiming 并放在上下文变量中，服务层用 span() 记录各阶段耗时
+（换取令牌、获取用户信息、签名、频率限制、JSON序列化等），响应时写入 Server-Timing 响应头。
+可选地把每个请求的耗时记录保存在固定大小的环形缓冲区中，便于事后导出排查慢请求。
+"""
+
+import re
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar, Token
+from typing import Any, Deque, Dict, List, Optional
+from config.alipay_config import alipay_config
+
+# 请求ID响应头；客户端传入合法的请求ID时沿用，否则生成新的
+REQUEST_ID_HEADER = "X-Request-ID"
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+
+class RequestTiming:
+    """单个请求的耗时记录，同名阶段多次出现时累加"""
+
+    __slots__ = ("request_id", "started", "spans")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        # 阶段名 -> 累计耗时（秒），保持首次出现的顺序
+        self.spans: Dict[str, float] = {}
+
+    def add(self, name: str, elapsed: float):
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头的值，耗时单位为毫秒"""
+        entries = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in self.spans.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+class span:
+    """记录一个阶段的耗时，可用于 with 语句；不在请求上下文中（如后台任务）时不做任何事"""
+
+    __slots__ = ("name", "timing", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.timing = _current.get()
+
+    def __enter__(self):
+        if self.timing is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.timing is not None:
+            self.timing.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """沿用客户端传入的合法请求ID，否则生成新的"""
+    if incoming and _VALID_REQUEST_ID.fullmatch(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def start_request(request_id: str) -> Token:
+    """开始记录当前请求的耗时
+
+    Returns:
+        Token: 用于 finish_request 恢复上下文
+    """
+    return _current.set(RequestTiming(request_id))
+
+
+def finish_request(token: Token):
+    """结束当前请求的耗时记录"""
+    _current.reset(token)
+
+
+def current() -> Optional[RequestTiming]:
+    """当前请求的耗时记录，不在请求上下文中时返回None"""
+    return _current.get()
+
+
+def current_request_id() -> Optional[str]:
+    """当前请求的ID，不在请求上下文中时返回None"""
+    timing = _current.get()
+    return timing.request_id if timing is not None else None
+
+
+class TimingBuffer:
+    """最近若干个请求的紧凑耗时记录（环形缓冲区，满后覆盖最旧的记录）"""
+
+    def __init__(self, size: int):
+        """
+        初始化缓冲区
+
+        Args:
+            size: 保留的记录数，0 表示不记录
+        """
+        self.size = size
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=size or 1)
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def record(self, timing: RequestTiming, method: str, route: str, status: int):
+        """保存一个请求的耗时记录"""
+        if not self.size:
+            return
+        self._records.append({
+            "id": timing.request_id,
+            "ts": round(time.time(), 3),
+            "method": method,
+            "route": route,
+            "status": status,
+            "total_ms": round(timing.elapsed() * 1000, 1),
+            "spans_ms": {name: round(elapsed * 1000, 1) for name, elapsed in timing.spans.items()},
+        })
+
+    def dump(self, limit: Optional[int] = None, min_total_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """导出记录（从新到旧）
+
+        Args:
+            limit: 最多返回的记录数
+            min_total_ms: 只返回总耗时不低于该值（毫秒）的记录
+
+        Returns:
+            List[Dict[str, Any]]: 耗时记录
+        """
+        records = [r for r in reversed(self._records) if r["total_ms"] >= min_total_ms]
+        return records[:limit] if limit else records
+
+
+# 全局耗时记录缓冲区（REQUEST_TIMING_BUFFER_SIZE 为0时不记录）
+timing_buffer = TimingBuffer(alipay_config.request_timing_buffer_size)
@@ -0,0 +1,228 @@
+"""
+多进程RSA签名引擎
+RSA签名是CPU密集型操作，放在事件循环中会阻塞其他请求，且单进程无法利用多核。
+签名引擎为每个核心启动一个签名进程，按排队深度分发待签名字符串并异步等待结果。
+"""
+
+import asyncio
+import multiprocessing
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+from config.alipay_config import alipay_config
+from services.rsa_signer import RsaSigner, rsa_signer
+
+logger = logging.getLogger(__name__)
+
+# 签名进程内的签名器，由进程初始化函数创建
+_worker_signer: Optional[RsaSigner] = None
+
+
+def _init_worker(rsa_key: str, key_path: Optional[str]):
+    """签名进程初始化：解析一次私钥"""
+    global _worker_signer
+    _worker_signer = RsaSigner(rsa_key=rsa_key, key_path=key_path)
+
+
+def _sign_in_worker(content: str, rsa2: bool) -> str:
+    """在签名进程中执行签名"""
+    return _worker_signer.sign_base64(content, rsa2)
+
+
+class _SignShard:
+    """单个签名进程及其统计信息"""
+
+    def __init__(self, index: int, executor: ProcessPoolExecutor):
+        self.index = index
+        self.executor = executor
+        # 签名进程异常退出后的重启任务，重启期间不分发请求
+        self.restarting: Optional[asyncio.Task] = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker": self.index,
+            "queue_depth": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "restarting": self.restarting is not None,
+            "avg_latency_ms": round(self.total_latency / self.completed * 1000, 3) if self.completed else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 3),
+        }
+
+
+class SignEngine:
+    """多进程签名引擎
+
+    每个签名进程对应一个分片，请求分发到排队最少的分片（排队相同时轮转），
+    因此吞吐随核心数扩展，且可以观察每个核心的排队深度与延迟。
+    签名进程异常退出时，该分片在后台线程中重启，受影响的签名请求换到其他分片重试一次。
+    workers 为 0 时退化为在当前进程内直接签名。
+    """
+
+    def __init__(self, workers: int = None, rsa_key: str = None, key_path: str = None):
+        """
+        初始化签名引擎
+
+        Args:
+            workers: 签名进程数，默认为CPU核心数
+            rsa_key: 私钥内容，默认使用应用私钥
+            key_path: 私钥文件路径，默认使用配置
+        """
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.rsa_key = rsa_key or alipay_config.app_private_key
+        self.key_path = key_path if key_path is not None else alipay_config.app_private_key_path
+        self._shards: List[_SignShard] = []
+        self._cursor = 0
+        self._closed = False
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # 使用spawn避免在多线程的事件循环进程中fork
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.rsa_key, self.key_path)
+        )
+
+    def start(self):
+        """启动签名进程并预热（在应用启动时调用，会阻塞到全部签名进程就绪）"""
+        if self._shards or self.workers <= 0:
+            return
+        self._closed = False
+        self._shards = [_SignShard(index, self._create_executor()) for index in range(self.workers)]
+
+        # 提交一次空签名，确保进程启动和私钥解析发生在启动阶段而不是第一个请求上
+        warm_ups = [shard.executor.submit(_sign_in_worker, "", True) for shard in self._shards]
+        for future in warm_ups:
+            future.result()
+
+        logger.info("签名引擎已启动，签名进程数: %d", self.workers)
+
+    def shutdown(self):
+        """关闭签名进程"""
+        self._closed = True
+        for shard in self._shards:
+            if shard.restarting is not None:
+                shard.restarting.cancel()
+            shard.executor.shutdown(wait=False, cancel_futures=True)
+        self._shards = []
+
+    def _spawn(self) -> ProcessPoolExecutor:
+        """创建并预热一个新的签名进程（在线程中执行，不阻塞事件循环）"""
+        executor = self._create_executor()
+        executor.submit(_sign_in_worker, "", True).result()
+        return executor
+
+    def _restart(self, shard: _SignShard, broken: ProcessPoolExecutor):
+        """签名进程异常退出后在后台重启，同一分片只重启一次"""
+        if shard.executor is not broken or shard.restarting is not None:
+            return
+        logger.warning("签名进程 %d 异常退出，正在重启", shard.index)
+        shard.restarting = asyncio.create_task(self._respawn(shard, broken))
+
+    async def _respawn(self, shard: _SignShard, broken: ProcessPoolExecutor):
+        try:
+            broken.shutdown(wait=False, cancel_futures=True)
+            executor = await asyncio.to_thread(self._spawn)
+            if self._closed:
+                executor.shutdown(wait=False)
+                return
+            shard.executor = executor
+            shard.restarts += 1
+            logger.info("签名进程 %d 已重启", shard.index)
+        except Exception as e:
+            # 分片保留已损坏的进程池，下一次分发到该分片时会再次触发重启
+            logger.error("签名进程 %d 重启失败: %s", shard.index, e)
+        finally:
+            shard.restarting = None
+
+    def _pick(self) -> Optional[_SignShard]:
+        """选择排队最少的可用分片，排队相同时从上次位置之后轮转；全部在重启时返回None"""
+        count = len(self._shards)
+        offset = self._cursor
+        self._cursor = (offset + 1) % count
+        best = None
+        for i in range(count):
+            shard = self._shards[(offset + i) % count]
+            if shard.restarting is None and (best is None or shard.pending < best.pending):
+                best = shard
+        return best
+
+    async def _available_shard(self) -> _SignShard:
+        shard = self._pick()
+        while shard is None:
+            await asyncio.wait(
+                [s.restarting for s in self._shards if s.restarting is not None],
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            shard = self._pick()
+        return shard
+
+    async def sign(self, content: str, rsa2: bool = True) -> str:
+        """异步签名
+
+        Args:
+            content: 待签名字符串
+            rsa2: 是否使用RSA2签名
+
+        Returns:
+            str: Base64编码的签名
+
+        Raises:
+            RuntimeError: 签名引擎未启动
+            BrokenProcessPool: 重试后签名进程仍异常退出
+        """
+        if self.workers <= 0:
+            return rsa_signer.sign_base64(content, rsa2)
+        if not self._shards:
+            raise RuntimeError("签名引擎未启动，请先调用 start()")
+
+        for attempt in range(2):
+            shard = await self._available_shard()
+            executor = shard.executor
+            shard.pending += 1
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wrap_future(executor.submit(_sign_in_worker, content, rsa2))
+            except BrokenProcessPool:
+                shard.failed += 1
+                self._restart(shard, executor)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                shard.failed += 1
+                raise
+            finally:
+                shard.pending -= 1
+
+            latency = time.perf_counter() - started
+            shard.completed += 1
+            shard.total_latency += latency
+            if latency > shard.max_latency:
+                shard.max_latency = latency
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """获取签名引擎统计信息
+
+        Returns:
+            Dict[str, Any]: 各签名进程的排队深度、延迟与重启次数
+        """
+        return {
+            "workers": self.workers,
+            "shards": [shard.stats() for shard in self._shards],
+        }
+
+
+# 全局签名引擎
+sign_engine = SignEngine(workers=alipay_config.sign_engine_workers)
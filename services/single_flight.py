@@ -0,0 +1,86 @@
+"""
+单飞（single-flight）请求合并
+相同操作、相同凭证的并发网关调用只向上游发出一次请求，所有调用方共享同一个结果。
+客户端重试或用户连点时，刷新令牌不会被第一个请求轮换后导致其余请求失败。
+"""
+
+import asyncio
+import logging
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from services import deadline
+from services.errors import DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """按key合并进行中的异步调用
+
+    第一个调用方启动上游请求，之后到达的相同key的调用方等待同一个任务；
+    任务完成（成功或异常）后立即移除，之后的调用会重新发起请求，不缓存结果。
+
+    共享任务在空白上下文中运行，不继承第一个调用方的请求时限和耗时记录；
+    每个调用方按自己的剩余时限等待，时限用完时只有该调用方放弃。
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        # 统计信息
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """执行调用，相同key的并发调用共享结果
+
+        Args:
+            key: 合并key，通常为 (操作名称, 凭证)
+            func: 协程函数
+            *args: 函数参数
+
+        Returns:
+            Any: 函数返回值；上游异常会抛给所有等待的调用方
+
+        Raises:
+            DeadlineExceededError: 当前调用方的请求时限已用完
+        """
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(func(*args), context=contextvars.Context())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+        else:
+            self.coalesced += 1
+
+        # shield：某个调用方被取消（如客户端断开）或超时时不影响共享同一任务的其他调用方
+        left = deadline.remaining()
+        if left is None:
+            return await asyncio.shield(task)
+        try:
+            async with asyncio.timeout(max(left, 0)) as timeout:
+                return await asyncio.shield(task)
+        except TimeoutError:
+            if timeout.expired():
+                raise DeadlineExceededError("请求处理时限已用完") from None
+            raise
+
+    def _on_done(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # 所有调用方都已取消时，取出异常避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """获取合并统计信息
+
+        Returns:
+            Dict[str, int]: 调用总数、被合并的调用数与进行中的上游请求数
+        """
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
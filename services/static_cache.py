@@ -0,0 +1,230 @@
+"""
+内存静态文件缓存
+启动时把静态目录下的页面与资源读入内存，并预先压缩为 gzip 与 brotli（未安装 brotli 时只有 gzip），
+请求时按 Accept-Encoding 直接返回对应的字节串，不再读磁盘、也不再在请求路径上压缩。
+
+- 强ETag：按文件内容的哈希生成，不同编码的表示带不同后缀
+- If-None-Match 命中时返回304
+- HTML 使用 no-cache（每次用ETag校验，未修改时只返回304），其他资源按 max_age 缓存
+- 开发模式（reload）下每次请求检查文件修改时间，文件变化后重新加载
+"""
+
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+from typing import Dict, Optional
+from starlette.requests import Request
+from starlette.responses import Response
+from config.alipay_config import alipay_config
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 值得压缩的内容类型（图片、字体等已压缩的格式不再压缩）
+_COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 {编码: q值}"""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+class StaticAsset:
+    """单个静态文件的内存表示：原始内容与各压缩编码的内容"""
+
+    __slots__ = ("media_type", "mtime_ns", "etag", "bodies", "cache_control")
+
+    def __init__(self, content: bytes, media_type: str, mtime_ns: int, cache_control: str):
+        self.media_type = media_type
+        self.mtime_ns = mtime_ns
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(content).hexdigest()[:32]
+        # 编码 -> 内容，按优先顺序排列；压缩后不更小的编码不保留
+        self.bodies: Dict[str, bytes] = {}
+        if media_type.startswith(_COMPRESSIBLE_TYPES):
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+                if len(compressed) < len(content):
+                    self.bodies["br"] = compressed
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.bodies["gzip"] = compressed
+        self.bodies["identity"] = content
+
+    def etag_for(self, encoding: str) -> str:
+        """不同编码的表示使用不同的强ETag"""
+        return f'"{self.etag}"' if encoding == "identity" else f'"{self.etag}-{encoding}"'
+
+    def choose_encoding(self, accept_encoding: str) -> str:
+        """按客户端的 Accept-Encoding 选择编码，优先 br，其次 gzip"""
+        if len(self.bodies) == 1 or not accept_encoding:
+            return "identity"
+        accepted = _accepted_encodings(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        for encoding in self.bodies:
+            if encoding != "identity" and accepted.get(encoding, wildcard) > 0:
+                return encoding
+        return "identity"
+
+    def matches(self, if_none_match: str) -> bool:
+        """If-None-Match 是否与本文件任一编码的ETag相同（内容相同即可使用客户端缓存）"""
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return any(self.etag_for(encoding) in tags for encoding in self.bodies)
+
+
+class StaticCache:
+    """静态目录的内存缓存"""
+
+    def __init__(self, directory: str, max_age: int = 3600, reload: bool = False):
+        """
+        初始化缓存
+
+        Args:
+            directory: 静态文件目录
+            max_age: 非HTML资源的浏览器缓存时间（秒）
+            reload: 开发模式，每次请求检查文件是否修改
+        """
+        self.directory = os.path.realpath(directory)
+        self.max_age = max_age
+        self.reload = reload
+        self._assets: Dict[str, StaticAsset] = {}
+        self._loaded = False
+
+        # 统计信息
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def load(self):
+        """读取静态目录下的全部文件并预压缩"""
+        assets = {}
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                assets[name] = self._read(path)
+        self._assets = assets
+        self._loaded = True
+        logger.info("静态文件已载入内存: %d 个文件，压缩编码: %s",
+                    len(assets), "br, gzip" if brotli is not None else "gzip")
+
+    def _read(self, path: str) -> StaticAsset:
+        with open(path, "rb") as f:
+            content = f.read()
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        cache_control = "no-cache" if media_type == "text/html" else f"public, max-age={self.max_age}"
+        return StaticAsset(content, media_type, os.stat(path).st_mtime_ns, cache_control)
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        """获取静态文件，开发模式下文件变化（包括新增、删除）时重新加载
+
+        Args:
+            name: 相对于静态目录的路径
+
+        Returns:
+            Optional[StaticAsset]: 文件不存在时返回None
+        """
+        if not self._loaded:
+            self.load()
+        asset = self._assets.get(name)
+        if not self.reload:
+            return asset
+
+        path = os.path.realpath(os.path.join(self.directory, name))
+        if not path.startswith(self.directory + os.sep):
+            return None
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self._assets.pop(name, None)
+            return None
+        if asset is None or asset.mtime_ns != mtime_ns:
+            if not os.path.isfile(path):
+                return None
+            asset = self._assets[name] = self._read(path)
+            self.reloads += 1
+            logger.info("静态文件已重新加载: %s", name)
+        return asset
+
+    def response(self, request: Request, name: str) -> Optional[Response]:
+        """生成静态文件的响应（200 或 304）
+
+        Args:
+            request: 请求
+            name: 相对于静态目录的路径
+
+        Returns:
+            Optional[Response]: 文件不存在时返回None
+        """
+        asset = self.get(name)
+        if asset is None:
+            self.misses += 1
+            return None
+
+        encoding = asset.choose_encoding(request.headers.get("accept-encoding", ""))
+        headers = {"ETag": asset.etag_for(encoding), "Cache-Control": asset.cache_control}
+        if len(asset.bodies) > 1:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and asset.matches(if_none_match):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        self.hits += 1
+        body = asset.bodies[encoding]
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(content=body, media_type=asset.media_type, headers=headers)
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存统计信息
+
+        Returns:
+            Dict[str, int]: 文件数、各编码的总字节数与命中、304、未找到、重新加载次数
+        """
+        sizes: Dict[str, int] = {}
+        for asset in self._assets.values():
+            for encoding, body in asset.bodies.items():
+                sizes[encoding] = sizes.get(encoding, 0) + len(body)
+        return {
+            "files": len(self._assets),
+            "bytes": sizes,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "misses": self.misses,
+            "reloads": self.reloads,
+        }
+
+
+# 全局静态文件缓存
+static_cache = StaticCache(
+    "static",
+    max_age=alipay_config.static_max_age,
+    reload=alipay_config.static_reload
+)
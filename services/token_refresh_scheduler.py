@@ -0,0 +1,166 @@
+"""
+访问令牌主动刷新调度器
+按过期时间维护一个优先队列，在访问令牌过期前的一段时间内于后台刷新，
+加入随机抖动并限制并发，使刷新分散到各个时间点，而不是集中在用户请求的路径上。
+"""
+
+import asyncio
+import heapq
+import random
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from models.user_models import TokenInfo
+from services.token_store import TokenStore, token_user_key
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRefreshScheduler:
+    """主动刷新调度器
+
+    - 每个用户只跟踪最新的令牌，旧令牌的队列条目出队时直接跳过
+    - 计划刷新时间 = 访问令牌过期时间 - margin - [0, jitter) 内的随机值
+    - 同时最多 concurrency 个刷新请求；失败后每隔 retry_interval 秒重试，直到访问令牌过期
+    """
+
+    def __init__(self, refresher: Callable[[str], Awaitable[Dict[str, Any]]], store: TokenStore,
+                 margin: float = 600.0, jitter: float = 300.0, concurrency: int = 4,
+                 retry_interval: float = 60.0):
+        """
+        初始化调度器
+
+        Args:
+            refresher: 使用刷新令牌换取新令牌的协程函数，成功后新令牌会重新交给 schedule()
+            store: 令牌存储，启动时从中加载已有令牌
+            margin: 在访问令牌过期前多少秒开始刷新
+            jitter: 随机提前的最大秒数，用于分散刷新时间
+            concurrency: 最大并发刷新数
+            retry_interval: 刷新失败后的重试间隔（秒）
+        """
+        self.refresher = refresher
+        self.store = store
+        self.margin = margin
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.retry_interval = retry_interval
+
+        # (计划刷新时间, 序号, user_key, refresh_token)
+        self._queue: List[Tuple[float, int, str, str]] = []
+        self._seq = 0
+        self._latest: Dict[str, TokenInfo] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refreshing: Set[asyncio.Task] = set()
+
+        # 统计信息
+        self.scheduled = 0
+        self.refreshed = 0
+        self.failed = 0
+
+    def schedule(self, token: TokenInfo):
+        """跟踪令牌，替换同一用户之前的令牌
+
+        Args:
+            token: 带绝对过期时间的令牌记录
+        """
+        user_key = token_user_key(token)
+        if not user_key or not token.refresh_token or token.expires_at is None:
+            return
+
+        self._latest[user_key] = token
+        due_at = max(token.expires_at - self.margin, time.time()) - random.uniform(0, self.jitter)
+        self._push(due_at, user_key, token.refresh_token)
+        self.scheduled += 1
+
+    def start(self):
+        """启动调度，令牌存储中的已有令牌在后台任务中加载"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def _load(self):
+        """加载令牌存储中的已有令牌（经 store.call()，SQLite后端在线程中读取）"""
+        for token in await self.store.call(self.store.list_tokens):
+            # 加载期间新保存的令牌已由 schedule() 跟踪，比存储中读到的更新
+            if token_user_key(token) not in self._latest:
+                self.schedule(token)
+        logger.info("令牌主动刷新调度已启动，跟踪令牌数: %d", len(self._latest))
+
+    async def stop(self):
+        """停止调度并取消进行中的刷新"""
+        if self._task is None:
+            return
+        tasks = [self._task, *self._refreshing]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        """获取调度统计信息
+
+        Returns:
+            Dict[str, int]: 跟踪的令牌数、队列长度、进行中的刷新数及累计计划、成功、失败次数
+        """
+        return {
+            "tracked": len(self._latest),
+            "queued": len(self._queue),
+            "in_flight": len(self._refreshing),
+            "scheduled": self.scheduled,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+        }
+
+    def _push(self, due_at: float, user_key: str, refresh_token: str):
+        self._seq += 1
+        heapq.heappush(self._queue, (due_at, self._seq, user_key, refresh_token))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        """调度主循环：等待最早的计划时间或新令牌加入"""
+        await self._load()
+        while True:
+            self._wakeup.clear()
+            delay = self._queue[0][0] - time.time() if self._queue else None
+            if delay is None or delay > 0:
+                try:
+                    async with asyncio.timeout(delay):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                continue
+
+            _, _, user_key, refresh_token = heapq.heappop(self._queue)
+            token = self._latest.get(user_key)
+            if token is None or token.refresh_token != refresh_token:
+                # 已被更新的令牌取代
+                continue
+
+            # 达到并发上限时在此等待，后面的条目顺延
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._refresh(user_key, token))
+            self._refreshing.add(task)
+            task.add_done_callback(self._refreshing.discard)
+
+    async def _refresh(self, user_key: str, token: TokenInfo):
+        try:
+            await self.refresher(token.refresh_token)
+            self.refreshed += 1
+        except Exception as e:
+            self.failed += 1
+            now = time.time()
+            if self._latest.get(user_key) is not token:
+                return
+            if min(token.expires_at, token.re_expires_at) > now + self.retry_interval:
+                logger.warning("主动刷新令牌失败，%s秒后重试: %s", self.retry_interval, e)
+                self._push(now + self.retry_interval, user_key, token.refresh_token)
+            else:
+                logger.warning("主动刷新令牌失败，不再重试: %s", e)
+                del self._latest[user_key]
+        finally:
+            self._semaphore.release()
@@ -0,0 +1,388 @@
+"""
+服务端令牌存储
+保存换取或刷新得到的访问令牌，并记录绝对过期时间。
+客户端再次提交仍然有效的刷新令牌时直接返回已保存的令牌，不再访问支付宝网关。
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from config.alipay_config import alipay_config
+from models.user_models import TokenInfo
+
+logger = logging.getLogger(__name__)
+
+
+def build_token_info(token_info: Dict[str, Any], now: float = None) -> TokenInfo:
+    """将网关返回的令牌信息转换为带绝对过期时间的 TokenInfo
+
+    Args:
+        token_info: parse_token_response 返回的令牌信息字典
+        now: 收到响应的时间（Unix时间戳），默认为当前时间
+
+    Returns:
+        TokenInfo: 令牌记录
+    """
+    now = time.time() if now is None else now
+    return TokenInfo(
+        access_token=token_info['access_token'],
+        expires_in=token_info.get('expires_in') or 0,
+        refresh_token=token_info.get('refresh_token') or '',
+        re_expires_in=token_info.get('re_expires_in') or 0,
+        user_id=token_info.get('user_id'),
+        open_id=token_info.get('open_id'),
+        auth_start=token_info.get('auth_start'),
+        expires_at=now + (token_info.get('expires_in') or 0),
+        re_expires_at=now + (token_info.get('re_expires_in') or 0)
+    )
+
+
+def token_info_to_dict(token: TokenInfo, now: float = None) -> Dict[str, Any]:
+    """将令牌记录转换为与 parse_token_response 相同格式的字典，有效期按剩余时间重新计算
+
+    Args:
+        token: 令牌记录
+        now: 当前时间（Unix时间戳），默认为当前时间
+
+    Returns:
+        Dict[str, Any]: 令牌信息字典
+    """
+    now = time.time() if now is None else now
+    return {
+        'access_token': token.access_token,
+        'expires_in': max(0, int(token.expires_at - now)),
+        'refresh_token': token.refresh_token,
+        're_expires_in': max(0, int(token.re_expires_at - now)),
+        'user_id': token.user_id,
+        'open_id': token.open_id,
+        'auth_start': token.auth_start
+    }
+
+
+def token_user_key(token: TokenInfo) -> Optional[str]:
+    """令牌记录的存储key：优先使用user_id，新应用只返回open_id时使用open_id"""
+    return token.user_id or token.open_id
+
+
+class TokenStore(ABC):
+    """令牌存储基类
+
+    记录按 user_id/open_id 保存，同一用户只保留最新的令牌；
+    被服务端（如主动刷新）轮换掉的旧刷新令牌仍指向该用户，直到旧访问令牌过期（至少 alias_grace 秒），
+    持有旧刷新令牌的客户端在此期间刷新时取到最新令牌，而泄露的旧刷新令牌不会长期有效；
+    刷新令牌过期的记录在读取时丢弃，并由 start_purge() 启动的后台任务定期批量清理。
+    """
+
+    # 存储操作是否会阻塞（磁盘IO），为True时 call() 在线程中执行
+    blocking = False
+
+    def __init__(self, alias_grace: float = 300.0):
+        """
+        Args:
+            alias_grace: 被轮换的旧刷新令牌的宽限期（秒）
+        """
+        self.alias_grace = alias_grace
+        self._purge_task: Optional[asyncio.Task] = None
+
+    async def call(self, method: Callable, *args) -> Any:
+        """在事件循环中调用存储方法，会阻塞的后端（SQLite）放到线程中执行
+
+        Args:
+            method: 本存储的方法，如 self.save
+            *args: 方法参数
+
+        Returns:
+            Any: 方法的返回值
+        """
+        if self.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    def start_purge(self, interval: float):
+        """启动定期清理过期记录的后台任务（在事件循环中调用）
+
+        Args:
+            interval: 清理间隔（秒），0 表示不清理
+        """
+        if self._purge_task is None and interval > 0:
+            self._purge_task = asyncio.create_task(self._purge_periodically(interval))
+
+    async def stop_purge(self):
+        """停止定期清理"""
+        if self._purge_task is None:
+            return
+        self._purge_task.cancel()
+        try:
+            await self._purge_task
+        except asyncio.CancelledError:
+            pass
+        self._purge_task = None
+
+    async def _purge_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # 全量清理需要遍历全部记录，两种后端都放到线程中执行
+                removed = await asyncio.to_thread(self.purge_expired)
+                if removed:
+                    logger.info("已清理过期令牌记录: %d", removed)
+            except Exception as e:
+                logger.error("清理过期令牌记录失败: %s", e)
+
+    @abstractmethod
+    def get(self, user_key: str) -> Optional[TokenInfo]:
+        """按 user_id 或 open_id 获取令牌记录"""
+
+    @abstractmethod
+    def get_by_refresh_token(self, refresh_token: str) -> Optional[TokenInfo]:
+        """按刷新令牌获取令牌记录，已被轮换的旧刷新令牌在有效期内返回该用户的最新记录"""
+
+    @abstractmethod
+    def save(self, token: TokenInfo):
+        """保存令牌记录，覆盖同一用户的旧记录"""
+
+    @abstractmethod
+    def delete(self, user_key: str):
+        """删除用户的令牌记录"""
+
+    @abstractmethod
+    def list_tokens(self) -> List[TokenInfo]:
+        """列出刷新令牌仍然有效的全部记录"""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """清理刷新令牌已过期的记录及过期的旧刷新令牌，返回清理的记录数量"""
+
+    def close(self):
+        """释放存储资源"""
+
+    def _alias_expires_at(self, previous: TokenInfo, now: float) -> float:
+        """被轮换的旧刷新令牌的过期时间：旧访问令牌过期前（至少宽限期内）可用，且不超过其本身的有效期"""
+        return min(previous.re_expires_at, max(previous.expires_at, now + self.alias_grace))
+
+
+class InMemoryTokenStore(TokenStore):
+    """进程内令牌存储，重启后丢失"""
+
+    def __init__(self, alias_grace: float = 300.0):
+        super().__init__(alias_grace)
+        self._lock = Lock()
+        self._tokens: Dict[str, TokenInfo] = {}
+        # 刷新令牌 -> (user_key, 该刷新令牌的过期时间)；已被轮换的旧刷新令牌过期时间不超过宽限期
+        self._by_refresh_token: Dict[str, Tuple[str, float]] = {}
+        # user_key -> 指向该用户的全部刷新令牌，删除记录时不必遍历全部刷新令牌
+        self._aliases: Dict[str, Set[str]] = {}
+
+    def get(self, user_key: str) -> Optional[TokenInfo]:
+        with self._lock:
+            return self._get(user_key, time.time())
+
+    def _get(self, user_key: str, now: float) -> Optional[TokenInfo]:
+        token = self._tokens.get(user_key)
+        if token is not None and token.re_expires_at <= now:
+            self._remove(user_key)
+            return None
+        return token
+
+    def get_by_refresh_token(self, refresh_token: str) -> Optional[TokenInfo]:
+        with self._lock:
+            now = time.time()
+            alias = self._by_refresh_token.get(refresh_token)
+            if alias is None:
+                return None
+            user_key, expires_at = alias
+            token = self._get(user_key, now) if expires_at > now else None
+            if token is None:
+                self._drop_alias(refresh_token)
+            return token
+
+    def save(self, token: TokenInfo):
+        user_key = token_user_key(token)
+        if not user_key:
+            return
+        with self._lock:
+            previous = self._tokens.get(user_key)
+            self._tokens[user_key] = token
+            if previous is not None and previous.refresh_token and previous.refresh_token != token.refresh_token:
+                alias = self._by_refresh_token.get(previous.refresh_token)
+                if alias is not None:
+                    self._by_refresh_token[previous.refresh_token] = (
+                        user_key, min(alias[1], self._alias_expires_at(previous, time.time()))
+                    )
+            if token.refresh_token:
+                self._by_refresh_token[token.refresh_token] = (user_key, token.re_expires_at)
+                self._aliases.setdefault(user_key, set()).add(token.refresh_token)
+
+    def delete(self, user_key: str):
+        with self._lock:
+            self._remove(user_key)
+
+    def list_tokens(self) -> List[TokenInfo]:
+        now = time.time()
+        with self._lock:
+            return [token for token in self._tokens.values() if token.re_expires_at > now]
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [key for key, token in self._tokens.items() if token.re_expires_at <= now]
+            for user_key in expired:
+                self._remove(user_key)
+            for refresh_token in [t for t, (_, re_expires_at) in self._by_refresh_token.items()
+                                  if re_expires_at <= now]:
+                self._drop_alias(refresh_token)
+        return len(expired)
+
+    def _remove(self, user_key: str):
+        self._tokens.pop(user_key, None)
+        for refresh_token in self._aliases.pop(user_key, ()):
+            self._by_refresh_token.pop(refresh_token, None)
+
+    def _drop_alias(self, refresh_token: str):
+        alias = self._by_refresh_token.pop(refresh_token, None)
+        if alias is None:
+            return
+        refresh_tokens = self._aliases.get(alias[0])
+        if refresh_tokens is not None:
+            refresh_tokens.discard(refresh_token)
+            if not refresh_tokens:
+                del self._aliases[alias[0]]
+
+
+class SqliteTokenStore(TokenStore):
+    """SQLite令牌存储，重启后仍然有效
+
+    使用WAL日志模式：读不阻塞写，同一主机的多个worker可以共用一个数据库文件。
+    各方法是同步的磁盘操作，在事件循环中请通过 call() 调用。
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = "tokens.db", alias_grace: float = 300.0):
+        """
+        初始化SQLite令牌存储
+
+        Args:
+            path: 数据库文件路径
+            alias_grace: 被轮换的旧刷新令牌的宽限期（秒）
+        """
+        super().__init__(alias_grace)
+        self.path = path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            " user_key TEXT PRIMARY KEY,"
+            " refresh_token TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " re_expires_at REAL NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        # 刷新令牌到用户的映射；re_expires_at 为该刷新令牌自己的过期时间，已被轮换的旧刷新令牌截止到旧访问令牌过期
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS refresh_tokens ("
+            " refresh_token TEXT PRIMARY KEY,"
+            " user_key TEXT NOT NULL,"
+            " re_expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_key ON refresh_tokens (user_key)")
+        logger.info("令牌存储已打开: %s", os.path.abspath(path))
+
+    def get(self, user_key: str) -> Optional[TokenInfo]:
+        return self._fetch_one("SELECT data FROM tokens WHERE user_key = ? AND re_expires_at > ?", user_key)
+
+    def get_by_refresh_token(self, refresh_token: str) -> Optional[TokenInfo]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT t.data FROM refresh_tokens r JOIN tokens t ON t.user_key = r.user_key"
+                " WHERE r.refresh_token = ? AND r.re_expires_at > ? AND t.re_expires_at > ?",
+                (refresh_token, now, now)
+            ).fetchone()
+        return TokenInfo(**json.loads(row[0])) if row else None
+
+    def save(self, token: TokenInfo):
+        user_key = token_user_key(token)
+        if not user_key:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            # 同一用户之前的刷新令牌被轮换，有效期截止到旧访问令牌过期（至少宽限期）
+            self._conn.execute(
+                "UPDATE refresh_tokens SET re_expires_at = MIN(re_expires_at,"
+                " (SELECT MIN(re_expires_at, MAX(expires_at, ?)) FROM tokens WHERE user_key = ?))"
+                " WHERE refresh_token = (SELECT refresh_token FROM tokens WHERE user_key = ?) AND refresh_token != ?",
+                (time.time() + self.alias_grace, user_key, user_key, token.refresh_token)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tokens (user_key, refresh_token, expires_at, re_expires_at, data)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (user_key, token.refresh_token, token.expires_at, token.re_expires_at,
+                 json.dumps(token.model_dump(), ensure_ascii=False))
+            )
+            if token.refresh_token:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO refresh_tokens (refresh_token, user_key, re_expires_at) VALUES (?, ?, ?)",
+                    (token.refresh_token, user_key, token.re_expires_at)
+                )
+
+    def delete(self, user_key: str):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM tokens WHERE user_key = ?", (user_key,))
+            self._conn.execute("DELETE FROM refresh_tokens WHERE user_key = ?", (user_key,))
+
+    def list_tokens(self) -> List[TokenInfo]:
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM tokens WHERE re_expires_at > ?", (time.time(),)).fetchall()
+        return [TokenInfo(**json.loads(row[0])) for row in rows]
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM refresh_tokens WHERE re_expires_at <= ?", (now,))
+            return self._conn.execute("DELETE FROM tokens WHERE re_expires_at <= ?", (now,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _fetch_one(self, sql: str, value: str) -> Optional[TokenInfo]:
+        with self._lock:
+            row = self._conn.execute(sql, (value, time.time())).fetchone()
+        return TokenInfo(**json.loads(row[0])) if row else None
+
+
+def create_token_store(backend: str = "memory", path: str = "tokens.db", alias_grace: float = 300.0) -> TokenStore:
+    """按配置创建令牌存储
+
+    Args:
+        backend: memory（进程内）或 sqlite（持久化）
+        path: sqlite后端的数据库文件路径
+        alias_grace: 被轮换的旧刷新令牌的宽限期（秒）
+
+    Returns:
+        TokenStore: 令牌存储实例
+    """
+    if backend == "memory":
+        return InMemoryTokenStore(alias_grace)
+    if backend == "sqlite":
+        return SqliteTokenStore(path, alias_grace)
+    raise ValueError(f"不支持的令牌存储后端: {backend}")
+
+
+# 全局令牌存储
+token_store = create_token_store(
+    alipay_config.token_store_backend,
+    alipay_config.token_store_path,
+    alipay_config.token_store_alias_grace
+)
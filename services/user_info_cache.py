@@ -0,0 +1,187 @@
+"""
+用户信息缓存
+按访问令牌和user_id缓存 alipay.user.info.share 的结果，避免同一用户在短时间内重复访问网关。
+缓存过期后在宽限期内先返回旧数据，同时在后台刷新（stale-while-revalidate）。
+"""
+
+import asyncio
+import time
+import logging
+import contextvars
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    """缓存条目，同一用户的多个访问令牌共享一个条目"""
+
+    __slots__ = ("user_info", "fetched_at")
+
+    def __init__(self, user_info: Dict[str, Any], fetched_at: float):
+        self.user_info = user_info
+        self.fetched_at = fetched_at
+
+
+class UserInfoCache:
+    """带TTL、LRU上限与后台刷新的用户信息缓存
+
+    - 获取时间不超过 ttl 的条目直接返回（命中）
+    - 超过 ttl 但不超过 ttl + stale_ttl 的条目立即返回旧数据，并在后台刷新（过期命中）
+    - 更旧或不存在的条目同步访问网关（未命中）
+    - 条目数超过 max_entries 时淘汰最久未使用的条目
+    """
+
+    def __init__(self, fetcher: Callable[[str], Awaitable[Dict[str, Any]]],
+                 ttl: float = 300.0, stale_ttl: float = 600.0, max_entries: int = 10000):
+        """
+        初始化用户信息缓存
+
+        Args:
+            fetcher: 使用访问令牌获取用户信息的协程函数
+            ttl: 条目新鲜期（秒）
+            stale_ttl: 新鲜期之后仍可返回旧数据的宽限期（秒）
+            max_entries: 最多缓存的访问令牌数量
+        """
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._by_user: Dict[str, str] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+        # 统计信息
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    async def get(self, access_token: str, user_id: str = None) -> Dict[str, Any]:
+        """获取用户信息
+
+        Args:
+            access_token: 访问令牌
+            user_id: 网关已确认的用户ID（可选），用于复用该用户以其他令牌获取的缓存
+
+        Returns:
+            Dict[str, Any]: 用户信息字典
+        """
+        entry = self._lookup(access_token, user_id)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return entry.user_info
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._schedule_refresh(access_token)
+                return entry.user_info
+
+        self.misses += 1
+        user_info = await self.fetcher(access_token)
+        self._store(access_token, user_info)
+        return user_info
+
+    def invalidate(self, access_token: str = None, user_id: str = None):
+        """删除指定访问令牌或用户的缓存
+
+        Args:
+            access_token: 访问令牌
+            user_id: 用户ID，删除该用户所有令牌对应的缓存
+        """
+        if access_token:
+            self._entries.pop(access_token, None)
+        if user_id:
+            entry = self._entries.get(self._by_user.pop(user_id, ""))
+            if entry is not None:
+                for token in [t for t, e in self._entries.items() if e is entry]:
+                    del self._entries[token]
+
+    async def stop(self):
+        """取消正在进行的后台刷新"""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refreshing.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 条目数与命中、过期命中、未命中、后台刷新、淘汰计数
+        """
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "evictions": self.evictions,
+        }
+
+    def _lookup(self, access_token: str, user_id: Optional[str]) -> Optional[_CacheEntry]:
+        """先按访问令牌查找，再按user_id查找；按user_id命中时把新令牌关联到同一条目"""
+        entry = self._entries.get(access_token)
+        if entry is not None:
+            self._entries.move_to_end(access_token)
+            return entry
+
+        if not user_id:
+            return None
+        entry = self._entries.get(self._by_user.get(user_id, ""))
+        if entry is not None:
+            self._insert(access_token, entry)
+            self._by_user[user_id] = access_token
+        return entry
+
+    def _store(self, access_token: str, user_info: Dict[str, Any]):
+        entry = self._entries.get(access_token)
+        if entry is not None:
+            # 原地更新，关联到同一条目的其他令牌一并生效
+            entry.user_info = user_info
+            entry.fetched_at = time.monotonic()
+            self._entries.move_to_end(access_token)
+        else:
+            self._insert(access_token, _CacheEntry(user_info, time.monotonic()))
+
+        user_id = user_info.get('user_id') or user_info.get('open_id')
+        if user_id:
+            self._by_user[user_id] = access_token
+
+    def _insert(self, access_token: str, entry: _CacheEntry):
+        self._entries[access_token] = entry
+        while len(self._entries) > self.max_entries:
+            evicted_token, evicted = self._entries.popitem(last=False)
+            self.evictions += 1
+            user_id = evicted.user_info.get('user_id') or evicted.user_info.get('open_id')
+            if user_id and self._by_user.get(user_id) == evicted_token:
+                del self._by_user[user_id]
+
+    def _schedule_refresh(self, access_token: str):
+        """后台刷新条目，同一令牌同时只有一个刷新任务"""
+        if access_token in self._refreshing:
+            return
+        # 在空白上下文中运行：不受触发它的请求的处理时限约束，也不向该请求的耗时记录写入
+        self._refreshing[access_token] = asyncio.create_task(self._refresh(access_token),
+                                                             context=contextvars.Context())
+
+    async def _refresh(self, access_token: str):
+        try:
+            user_info = await self.fetcher(access_token)
+            self._store(access_token, user_info)
+            self.refreshes += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 刷新失败时保留旧数据，宽限期结束后由下一次请求同步获取
+            self.refresh_errors += 1
+            logger.warning("后台刷新用户信息失败: %s", e)
+        finally:
+            self._refreshing.pop(access_token, None)
@@ -0,0 +1,272 @@
+"""
+跨进程共享内存频率限制后端
+uvicorn 以多个 worker 运行时，每个进程各有一份内存计数，实际限额会变成 限额 × worker数。
+共享内存后端把计数保存在内存映射文件中，同一台机器上的所有 worker 共用一份计数，无需外部服务。
+
+存储布局：
+- 文件头：魔数、算法、桶数、每桶槽位数、每槽状态长度
+- 计数区：每个桶一个 int64，记录桶内已占用的槽位数，在写入和清理槽位时持桶锁更新
+- 数据区：若干个桶，每个桶包含固定数量的槽位；槽位为 8 字节key哈希 + 若干个 double 状态
+- 每个桶用一把进程内线程锁 + 一把 fcntl 字节范围锁保护（POSIX 记录锁只在进程之间互斥）
+"""
+
+import os
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"RLSHM002"
+_HEADER = struct.Struct("<8sIIII")
+_HEADER_SIZE = 64
+_COUNT = struct.Struct("<q")
+_ALGORITHMS = {"RateLimiter": 1, "GcraRateLimiter": 2}
+
+
+def default_shm_path(name: str = "ratelimit") -> str:
+    """默认的共享内存文件路径：优先使用 /dev/shm，不存在时使用临时目录；不同的限制器使用不同的 name"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"allogintest-{name}")
+
+
+def _key_hash(key: str) -> int:
+    """稳定的64位key哈希（内置hash在每个进程中随机化，不能跨进程使用），0 保留为空槽"""
+    value = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return value or 1
+
+
+class SharedMemoryRateLimiter:
+    """共享内存频率限制器
+
+    算法仍由 RateLimiter / GcraRateLimiter 提供（_check_state 等方法），本类只负责状态的存取，
+    因此两种模式在进程内后端和共享内存后端中的行为一致。
+
+    每个key按哈希落在固定的桶中，在桶内查找相同哈希、空闲或已过期的槽位；
+    桶满时覆盖哈希对应的槽位，被覆盖的key相当于被淘汰，重新开始计数。
+    """
+
+    def __init__(self, algorithm: Any, path: str = None, max_keys: int = 100000,
+                 slots_per_bucket: int = 8, lock_stripes: int = 64):
+        """
+        初始化共享内存频率限制器
+
+        Args:
+            algorithm: 提供限流算法的频率限制器（RateLimiter 或 GcraRateLimiter）
+            path: 共享内存文件路径，默认见 default_shm_path()
+            max_keys: 最多保存的key数量（决定文件大小）
+            slots_per_bucket: 每个桶的槽位数
+            lock_stripes: 进程内线程锁数量
+        """
+        if fcntl is None:
+            raise RuntimeError("共享内存频率限制后端依赖 fcntl，仅支持 Linux/macOS 等POSIX平台")
+
+        self.algorithm = algorithm
+        self.path = path or default_shm_path()
+        self.slots_per_bucket = slots_per_bucket
+        self.n_buckets = max(1, -(-max_keys // slots_per_bucket))
+        self.state_size = algorithm.state_size
+
+        self._slot = struct.Struct(f"<Q{self.state_size}d")
+        self._bucket_size = self._slot.size * slots_per_bucket
+        self._counts = struct.Struct(f"<{self.n_buckets}q")
+        self._data_offset = _HEADER_SIZE + self._counts.size
+        self._size = self._data_offset + self._bucket_size * self.n_buckets
+        self._header = _HEADER.pack(_MAGIC, _ALGORITHMS[type(algorithm).__name__],
+                                    self.n_buckets, slots_per_bucket, self.state_size)
+        self._locks = [Lock() for _ in range(lock_stripes)]
+        # 按线程锁分别计数，避免竞争
+        self._evicted = [0] * lock_stripes
+        self._expired = [0] * lock_stripes
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._init_file()
+            self._mm = mmap.mmap(self._fd, self._size)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _init_file(self):
+        """首个进程负责创建文件并写入文件头
+
+        文件可能已被其他进程映射，截断会导致它们访问映射时收到 SIGBUS，
+        因此只初始化空文件；布局不一致（配置或版本变更）时拒绝启动。
+
+        Raises:
+            RuntimeError: 已有文件的布局与当前配置不一致
+        """
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER_SIZE, 0)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, self._size)
+                os.pwrite(self._fd, self._header, 0)
+                return
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if header != self._header or os.fstat(self._fd).st_size != self._size:
+                raise RuntimeError(
+                    f"共享内存频率限制文件布局与当前配置不一致，可能仍被其他进程使用: {self.path}；"
+                    "请停止所有使用该文件的进程后删除它，或通过 RATE_LIMIT_SHM_PATH 指定新的路径"
+                )
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER_SIZE, 0)
+
+    @contextmanager
+    def _lock_bucket(self, bucket: int):
+        """锁定一个桶：先取进程内线程锁，再取跨进程的字节范围锁"""
+        offset = self._data_offset + bucket * self._bucket_size
+        with self._locks[bucket % len(self._locks)]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, offset)
+            try:
+                yield offset
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, offset)
+
+    def _read_slot(self, offset: int) -> Tuple[int, List[float]]:
+        values = self._slot.unpack_from(self._mm, offset)
+        return values[0], list(values[1:])
+
+    def _write_slot(self, offset: int, key_hash: int, values: List[float]):
+        values = list(values) + [0.0] * (self.state_size - len(values))
+        self._slot.pack_into(self._mm, offset, key_hash, *values)
+
+    def _add_count(self, bucket: int, delta: int):
+        """更新桶的已占用槽位数（调用方需持有该桶的锁）"""
+        offset = _HEADER_SIZE + bucket * _COUNT.size
+        _COUNT.pack_into(self._mm, offset, _COUNT.unpack_from(self._mm, offset)[0] + delta)
+
+    def _find_slot(self, bucket_offset: int, key_hash: int, current_time: float) -> Tuple[Optional[int], bool]:
+        """在桶内查找key的槽位
+
+        Returns:
+            Tuple[Optional[int], bool]: 槽位偏移（桶已满时为None），以及槽位中是否已经是该key的状态
+        """
+        free_offset = None
+        for index in range(self.slots_per_bucket):
+            offset = bucket_offset + index * self._slot.size
+            slot_hash, values = self._read_slot(offset)
+            if slot_hash == key_hash:
+                return offset, True
+            if free_offset is None and (slot_hash == 0 or self.algorithm._is_idle_state(values, current_time)):
+                free_offset = offset
+        return free_offset, False
+
+    def check(self, key: str, cost: int = 1):
+        """
+        检查请求是否被允许，允许时记录本次请求
+
+        Args:
+            key: 请求标识（通常是IP地址或用户ID）
+            cost: 本次请求消耗的配额数
+
+        Returns:
+            RateLimitResult: 检查结果
+        """
+        key_hash = _key_hash(key)
+        bucket = key_hash % self.n_buckets
+        with self._lock_bucket(bucket) as bucket_offset:
+            current_time = time.time()
+            offset, found = self._find_slot(bucket_offset, key_hash, current_time)
+            if offset is None:
+                # 桶已满且都在限流窗口内，覆盖哈希对应的槽位
+                self._evicted[bucket % len(self._locks)] += 1
+                offset = bucket_offset + (key_hash // self.n_buckets % self.slots_per_bucket) * self._slot.size
+            elif not found and self._read_slot(offset)[0]:
+                # 复用已过期key的槽位
+                self._expired[bucket % len(self._locks)] += 1
+            if found:
+                values = self._read_slot(offset)[1]
+            else:
+                values = [0.0] * self.state_size
+                if not self._read_slot(offset)[0]:
+                    self._add_count(bucket, 1)
+            result, new_values = self.algorithm._check_state(values, current_time, cost)
+            self._write_slot(offset, key_hash, new_values)
+        return result
+
+    def is_allowed(self, key: str) -> bool:
+        """
+        检查是否允许请求
+
+        Args:
+            key: 请求标识（通常是IP地址或用户ID）
+
+        Returns:
+            bool: 是否允许请求
+        """
+        return self.check(key).allowed
+
+    def get_remaining_time(self, key: str) -> Optional[int]:
+        """
+        获取距离下次可以请求的剩余时间
+
+        Args:
+            key: 请求标识
+
+        Returns:
+            Optional[int]: 剩余时间（秒），如果可以立即请求则返回None
+        """
+        key_hash = _key_hash(key)
+        with self._lock_bucket(key_hash % self.n_buckets) as bucket_offset:
+            current_time = time.time()
+            offset, found = self._find_slot(bucket_offset, key_hash, current_time)
+            if not found:
+                return None
+            return self.algorithm._remaining_time_state(self._read_slot(offset)[1], current_time)
+
+    def sweep(self) -> int:
+        """清空所有已过期的槽位
+
+        Returns:
+            int: 本次清理的key数量
+        """
+        removed = 0
+        for bucket in range(self.n_buckets):
+            with self._lock_bucket(bucket) as bucket_offset:
+                current_time = time.time()
+                for index in range(self.slots_per_bucket):
+                    offset = bucket_offset + index * self._slot.size
+                    slot_hash, values = self._read_slot(offset)
+                    if slot_hash and self.algorithm._is_idle_state(values, current_time):
+                        self._write_slot(offset, 0, [])
+                        self._add_count(bucket, -1)
+                        removed += 1
+                        self._expired[bucket % len(self._locks)] += 1
+        return removed
+
+    def key_count(self) -> int:
+        """当前占用的槽位数量：对计数区的每桶计数求和，不加锁、不扫描槽位，仅用于观测"""
+        return sum(self._counts.unpack_from(self._mm, _HEADER_SIZE))
+
+    def memory_usage(self) -> int:
+        """共享内存文件大小（字节），所有进程共用"""
+        return self._size
+
+    def stats(self) -> Dict[str, int]:
+        """获取限制器内存统计
+
+        Returns:
+            Dict[str, int]: key数量、共享内存字节数与淘汰计数（淘汰计数仅统计当前进程）
+        """
+        return {
+            "keys": self.key_count(),
+            "bytes": self._size,
+            "evicted_expired": sum(self._expired),
+            "evicted_lru": sum(self._evicted),
+        }
+
+    def close(self):
+        """关闭内存映射（不删除文件，其他进程可能仍在使用）"""
+        self._mm.close()
+        os.close(self._fd)
@@ -89,6 +89,35 @@ def test_auth_info_api():
             else:
                 print(f"❌ RSA签名类型测试失败")
         
+        # 测试批量接口
+        print("\n4. 测试批量authInfo接口...")
+        batch_url = f"{base_url}/api/auth/authinfo/batch"
+        batch_data = {
+            "items": [
+                {"pid": test_pid, "target_id": "test_batch_1", "rsa2": True},
+                {"pid": test_pid, "rsa2": False},
+                {"pid": "", "target_id": "test_batch_invalid"}
+            ]
+        }
+        print(f"请求URL: {batch_url}")
+        
+        response = requests.post(batch_url, json=batch_data, stream=True)
+        print(f"状态码: {response.status_code}")
+        
+        if response.status_code == 200:
+            results = [json.loads(line) for line in response.iter_lines() if line]
+            for result in results:
+                print(json.dumps(result, ensure_ascii=False)[:120])
+            
+            ok_count = len([r for r in results if r.get('authInfo')])
+            error_count = len([r for r in results if r.get('error')])
+            if len(results) == 3 and ok_count == 2 and error_count == 1:
+                print(f"✅ 批量接口测试成功")
+            else:
+                print(f"❌ 批量接口返回结果不符合预期")
+        else:
+            print(f"❌ 批量接口请求失败: {response.text}")
+        
         print("\n=== API测试完成 ===")
         
     except requests.exceptions.ConnectionError:
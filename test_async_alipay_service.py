@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试异步网关客户端：请求签名、响应节点截取与验签与官方SDK一致
+"""
+
+import sys
+import os
+import json
+import base64
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from alipay.aop.api.AlipayClientConfig import AlipayClientConfig
+from alipay.aop.api import DefaultAlipayClient as sdk_client_module
+from alipay.aop.api.DefaultAlipayClient import DefaultAlipayClient
+from alipay.aop.api.request.AlipaySystemOauthTokenRequest import AlipaySystemOauthTokenRequest
+from alipay.aop.api.util.SignatureUtils import get_sign_content, sign_with_rsa2
+
+from config.alipay_config import alipay_config
+from services.alipay_service import parse_token_response
+from services.async_alipay_service import AsyncAlipayService, METHOD_OAUTH_TOKEN, METHOD_USER_INFO_SHARE
+from services.token_store import InMemoryTokenStore
+
+TOKEN_NODE = {
+    "access_token": "authusrB1234",
+    "alipay_user_id": "20880012345678901234567890112345",
+    "expires_in": 1296000,
+    "re_expires_in": 2592000,
+    "refresh_token": "authusrB5678",
+    "user_id": "2088000000000001",
+    "remark": "含有 \"sign\" 字样的字段值",
+}
+
+
+@pytest.fixture(scope="module")
+def gateway_key():
+    """模拟支付宝网关的签名密钥"""
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def service(gateway_key):
+    """使用模拟网关公钥验签的异步服务"""
+    service = AsyncAlipayService(transport="http", token_store=InMemoryTokenStore())
+    service._public_key = gateway_key.public_key()
+    return service
+
+
+def signed_body(key, node: str, content: dict) -> str:
+    """按网关格式生成带签名的响应"""
+    node_json = json.dumps(content, ensure_ascii=False)
+    sign = base64.b64encode(key.sign(node_json.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256())).decode()
+    return f'{{"{node}":{node_json},"sign":"{sign}"}}'
+
+
+def sdk_client(key) -> DefaultAlipayClient:
+    """使用模拟网关公钥验签的官方SDK客户端"""
+    config = AlipayClientConfig()
+    config.app_id = str(alipay_config.app_id)
+    config.app_private_key = alipay_config.get_private_key()
+    config.alipay_public_key = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    config.sign_type = "RSA2"
+    return DefaultAlipayClient(alipay_client_config=config)
+
+
+def test_sign_matches_sdk(service):
+    """待签名字符串与签名结果与SDK一致"""
+    params = {
+        "app_id": str(alipay_config.app_id),
+        "method": METHOD_OAUTH_TOKEN,
+        "charset": "utf-8",
+        "timestamp": "2024-01-01 00:00:00",
+        "grant_type": "authorization_code",
+        "code": "auth-code",
+    }
+    content = service._build_gateway_sign_content(params)
+    assert content == get_sign_content(params)
+    assert service._sign(content) == sign_with_rsa2(alipay_config.get_private_key(), content, "utf-8")
+
+
+def test_extract_node_content_keeps_raw_text():
+    """截取的节点保留原文（空白、转义、嵌套对象），字段值中的 "sign" 不影响截取"""
+    node_json = '{ "a": "x\\u4e2d", "nested": {"sign": "inner"}, "remark": "\\"sign\\"" }'
+    body = f'{{"alipay_user_info_share_response":{node_json},"sign":"abc"}}'
+    assert AsyncAlipayService._extract_node_content(body, "alipay_user_info_share_response") == node_json
+
+
+def test_parse_response_matches_sdk(service, gateway_key, monkeypatch):
+    """验签通过时返回的节点文本与SDK同步调用的结果一致"""
+    body = signed_body(gateway_key, "alipay_system_oauth_token_response", TOKEN_NODE)
+    content = service._parse_gateway_response(body, METHOD_OAUTH_TOKEN)
+
+    monkeypatch.setattr(sdk_client_module, "do_post", lambda *args, **kwargs: body.encode("utf-8"))
+    request = AlipaySystemOauthTokenRequest()
+    request.grant_type = "authorization_code"
+    request.code = "auth-code"
+    sdk_content = sdk_client(gateway_key).execute(request)
+    assert content == sdk_content
+    assert parse_token_response(content) == parse_token_response(sdk_content)
+
+
+def test_parse_response_rejects_bad_signature(service, gateway_key):
+    """节点内容被篡改或缺少签名时拒绝"""
+    body = signed_body(gateway_key, "alipay_system_oauth_token_response", TOKEN_NODE)
+    with pytest.raises(Exception, match="验签失败"):
+        service._parse_gateway_response(body.replace("authusrB1234", "authusrB0000"), METHOD_OAUTH_TOKEN)
+
+    unsigned = json.dumps({"alipay_system_oauth_token_response": TOKEN_NODE})
+    with pytest.raises(Exception, match="缺少签名"):
+        service._parse_gateway_response(unsigned, METHOD_OAUTH_TOKEN)
+
+
+def test_unsigned_error_response(service):
+    """未签名的错误响应交给解析函数生成错误信息"""
+    body = json.dumps({"error_response": {"code": "40002", "msg": "Invalid Arguments", "sub_code": "isv.code-invalid"}})
+    content = service._parse_gateway_response(body, METHOD_OAUTH_TOKEN)
+    with pytest.raises(Exception, match="isv.code-invalid"):
+        parse_token_response(content)
+
+
+def test_get_access_token_over_http(service, gateway_key):
+    """公共参数放在查询串、业务参数以表单POST，签名可用应用公钥验证，响应解析结果与SDK一致"""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, text=signed_body(gateway_key, "alipay_system_oauth_token_response", TOKEN_NODE))
+
+    async def run():
+        service._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await service.get_access_token("auth-code")
+        finally:
+            await service.aclose()
+
+    token_info = asyncio.run(run())
+    assert token_info["access_token"] == "authusrB1234"
+    assert token_info["user_id"] == "2088000000000001"
+    assert service.token_store.get_by_refresh_token("authusrB5678").access_token == "authusrB1234"
+
+    request = requests[0]
+    query = dict(request.url.params)
+    form = dict(httpx.QueryParams(request.content.decode()))
+    assert query["method"] == METHOD_OAUTH_TOKEN
+    assert form == {"grant_type": "authorization_code", "code": "auth-code"}
+
+    sign = query.pop("sign")
+    content = get_sign_content({**query, **form}).encode("utf-8")
+    app_public_key = serialization.load_pem_private_key(
+        alipay_config.get_private_key().encode(), password=None
+    ).public_key()
+    app_public_key.verify(base64.b64decode(sign), content, padding.PKCS1v15(), hashes.SHA256())
+
+
+def test_sdk_request_for_user_info():
+    """SDK方式构造的请求携带用户授权令牌"""
+    request = AsyncAlipayService._build_sdk_request(METHOD_USER_INFO_SHARE, {}, auth_token="token")
+    assert request.udf_params == {"auth_token": "token"}
+    with pytest.raises(ValueError):
+        AsyncAlipayService._build_sdk_request("alipay.trade.pay", {})
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试预签名authInfo池：按水位补充、过期丢弃、生产失败计数，预签名不计入请求路径的操作指标
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from services import auth_info_pool
+from services.auth_info_pool import AuthInfoPool
+from services.metrics import operation_duration
+
+PID = "2088102123816631"
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(auth_info_pool.time, "monotonic", fake)
+    return fake
+
+
+class Producer:
+    """按顺序编号的authInfo生产者，可设置为失败"""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self, pid, target_id, rsa2):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("签名失败")
+        return f"{pid}:{'RSA2' if rsa2 else 'RSA'}:{self.calls}"
+
+
+async def settle():
+    """让后台生产者处理完已唤醒的补充"""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_refill_between_watermarks(clock):
+    """启动时补充到高水位，先进先出取出，低于低水位时再补充到高水位"""
+    producer = Producer()
+    pool = AuthInfoPool(producer, [PID], sign_types=(True, False), low_watermark=2,
+                        high_watermark=4, ttl=600, concurrency=3)
+
+    async def run():
+        pool.start()
+        try:
+            await settle()
+            assert pool.stats()["sizes"] == {f"{PID}:RSA2": 4, f"{PID}:RSA": 4}
+
+            first = [pool.pop(PID) for _ in range(2)]
+            assert first[0].endswith(":1") and first[1].endswith(":2")
+            assert pool.stats()["sizes"][f"{PID}:RSA2"] == 2
+
+            pool.pop(PID)
+            await settle()
+            assert pool.stats()["sizes"][f"{PID}:RSA2"] == 4
+            assert pool.pop(PID, rsa2=False).startswith(f"{PID}:RSA:")
+        finally:
+            await pool.stop()
+
+    asyncio.run(run())
+    assert pool.hits == 4
+    assert pool.produced == 11
+
+
+def test_expired_entries_discarded(clock):
+    """超过有效期的条目不会被取出，池空时回退并唤醒生产者"""
+    producer = Producer()
+    pool = AuthInfoPool(producer, [PID], low_watermark=1, high_watermark=3, ttl=60)
+
+    async def run():
+        pool.start()
+        try:
+            await settle()
+            clock.now += 61
+            assert pool.pop(PID) is None
+            assert pool.expired == 3
+            assert pool.misses == 1
+
+            await settle()
+            assert pool.pop(PID) is not None
+        finally:
+            await pool.stop()
+
+    asyncio.run(run())
+
+
+def test_unknown_pid_and_failures(clock):
+    """未配置的pid直接回退；生产全部失败时计数并等待下次唤醒，不会忙循环"""
+    producer = Producer()
+    producer.fail = True
+    pool = AuthInfoPool(producer, [PID], low_watermark=1, high_watermark=4, concurrency=2)
+    assert pool.pop("2088000000000000") is None
+    assert pool.misses == 0
+
+    async def run():
+        pool.start()
+        try:
+            await settle()
+        finally:
+            await pool.stop()
+
+    asyncio.run(run())
+    assert pool.errors == 2
+    assert producer.calls == 2
+    assert pool.stats()["sizes"] == {f"{PID}:RSA2": 0}
+
+
+def test_watermark_validation():
+    """低水位不能大于高水位"""
+    with pytest.raises(ValueError):
+        AuthInfoPool(Producer(), [PID], low_watermark=5, high_watermark=4)
+
+
+def test_presign_recorded_separately(monkeypatch):
+    """预签名记录在 presign_auth_info 操作下，不计入 generate_auth_info 的请求路径耗时"""
+    import main
+    from services.sign_engine import sign_engine
+
+    monkeypatch.setattr(sign_engine, "workers", 0)
+    assert main.auth_info_pool.producer == main.alipay_service.presign_auth_info
+
+    def observed(operation: str) -> float:
+        return operation_duration.labels(operation).snapshot()[0][-1]
+
+    presigned, generated = observed("presign_auth_info"), observed("generate_auth_info")
+    auth_info = asyncio.run(main.alipay_service.presign_auth_info(PID))
+    assert "sign=" in auth_info
+    assert observed("presign_auth_info") == presigned + 1
+    assert observed("generate_auth_info") == generated
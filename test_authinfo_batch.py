@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量生成authInfo接口：NDJSON逐条输出、单条失败不影响整批、按条目数消耗频率限制配额
+"""
+
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from config.alipay_config import alipay_config
+from rate_limiter import RateLimiter
+from services.alipay_service import AlipayService
+from services.sign_engine import sign_engine
+
+PID = "2088102123816631"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """在当前进程内签名、使用独立频率限制器的测试客户端（不触发应用启动事件）"""
+    monkeypatch.setattr(sign_engine, "workers", 0)
+    monkeypatch.setattr(main, "auth_rate_limiter", RateLimiter(max_requests=5, time_window=60))
+    monkeypatch.setattr(alipay_config, "authinfo_batch_max_items", 50)
+    monkeypatch.setattr(alipay_config, "authinfo_batch_items_per_unit", 10)
+    return TestClient(main.app)
+
+
+def read_lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_streams_ndjson(client):
+    """每条结果一行，包含原始序号，签名与同步服务一致"""
+    items = [{"pid": PID, "target_id": f"target-{i}", "rsa2": i % 2 == 0} for i in range(12)]
+    response = client.post("/api/auth/authinfo/batch", json={"items": items})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = sorted(read_lines(response), key=lambda result: result["index"])
+    assert [result["index"] for result in results] == list(range(12))
+
+    sync_service = AlipayService()
+    for item, result in zip(items, results):
+        assert result["error"] is None
+        assert result["target_id"] == item["target_id"]
+        assert result["sign_type"] == ("RSA2" if item["rsa2"] else "RSA")
+        assert result["authInfo"] == sync_service.generate_auth_info(PID, item["target_id"], item["rsa2"])
+
+
+def test_batch_item_failure_is_isolated(client, monkeypatch):
+    """单条签名失败只体现在该条的 error 字段中"""
+    original = main.alipay_service._sign_auth_info
+
+    async def flaky(pid, target_id=None, rsa2=True):
+        if target_id == "bad":
+            raise ValueError("签名失败")
+        return await original(pid, target_id, rsa2)
+
+    monkeypatch.setattr(main.alipay_service, "_sign_auth_info", flaky)
+    items = [{"pid": PID, "target_id": "good"}, {"pid": PID, "target_id": "bad"}, {"pid": ""}]
+    results = {result["index"]: result for result in read_lines(
+        client.post("/api/auth/authinfo/batch", json={"items": items})
+    )}
+
+    assert results[0]["authInfo"] and results[0]["error"] is None
+    assert results[1]["authInfo"] is None and "签名失败" in results[1]["error"]
+    assert results[2]["error"] == "pid不能为空"
+
+
+def test_batch_cost_by_item_count(client):
+    """每10条消耗一份配额，剩余配额不足时整批拒绝"""
+    response = client.post("/api/auth/authinfo/batch", json={"items": [{"pid": PID}] * 12})
+    assert response.headers["X-RateLimit-Remaining"] == "3"
+
+    response = client.post("/api/auth/authinfo/batch", json={"items": [{"pid": PID}] * 40})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+    response = client.post("/api/auth/authinfo/batch", json={"items": [{"pid": PID}] * 30})
+    assert response.status_code == 200
+    assert response.headers["X-RateLimit-Remaining"] == "0"
+
+
+@pytest.mark.parametrize("count", [0, 51])
+def test_batch_size_bounds(client, count):
+    """空批次和超过上限的批次返回400"""
+    response = client.post("/api/auth/authinfo/batch", json={"items": [{"pid": PID}] * count})
+    assert response.status_code == 400
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试热点路径微基准：与基线比较时识别吞吐下降与内存分配增加，保存基线后再次运行可以比较
+"""
+
+import sys
+import os
+import json
+import logging
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from benchmarks import bench_hot_paths
+
+# 基准模块导入时关闭了INFO日志，不影响其他测试
+logging.disable(logging.NOTSET)
+
+
+def test_compare_detects_regressions(capsys):
+    """吞吐下降或内存分配增加超过阈值时列为回归，基线中没有的基准只打印"""
+    baseline = {
+        "fast": {"ops_per_sec": 1000.0, "alloc_peak_bytes": 4000},
+        "slow": {"ops_per_sec": 1000.0, "alloc_peak_bytes": 4000},
+        "alloc": {"ops_per_sec": 1000.0, "alloc_peak_bytes": 4000},
+        "small": {"ops_per_sec": 1000.0, "alloc_peak_bytes": 100},
+    }
+    results = {
+        "fast": {"ops_per_sec": 850.0, "alloc_peak_bytes": 4500},
+        "slow": {"ops_per_sec": 700.0, "alloc_peak_bytes": 4000},
+        "alloc": {"ops_per_sec": 1000.0, "alloc_peak_bytes": 5000},
+        "small": {"ops_per_sec": 1000.0, "alloc_peak_bytes": 300},
+        "new": {"ops_per_sec": 10.0},
+    }
+
+    regressions = bench_hot_paths.compare(results, baseline, threshold=0.2)
+    assert regressions == ["slow: 吞吐下降 30.0%", "alloc: 内存分配峰值 4000B -> 5000B"]
+    assert "new" in capsys.readouterr().out
+
+
+def test_cases_run():
+    """全部被测函数可以直接调用"""
+    for name, func in bench_hot_paths.build_cases().items():
+        assert func() is not None, name
+
+
+def test_save_then_compare(tmp_path, monkeypatch):
+    """保存基线后与基线比较，没有回归时正常退出，基线不存在时退出码为2"""
+    monkeypatch.setattr(bench_hot_paths, "MIN_TIME", 0.01)
+    monkeypatch.setattr(bench_hot_paths, "REPEATS", 1)
+    monkeypatch.setattr(bench_hot_paths, "ALLOC_SAMPLES", 3)
+    baseline = str(tmp_path / "baseline.json")
+    args = ["bench_hot_paths.py", "--baseline", baseline, "--only", "build_order_param"]
+
+    monkeypatch.setattr(sys, "argv", [*args, "--save"])
+    bench_hot_paths.main()
+    with open(baseline, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["environment"] == bench_hot_paths.environment()
+    assert set(saved["results"]) == {"build_order_param"}
+
+    monkeypatch.setattr(sys, "argv", [*args, "--threshold", "100"])
+    bench_hot_paths.main()
+
+    monkeypatch.setattr(sys, "argv", [*args[:1], "--baseline", str(tmp_path / "missing.json"), *args[3:]])
+    with pytest.raises(SystemExit) as exc:
+        bench_hot_paths.main()
+    assert exc.value.code == 2
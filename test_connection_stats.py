@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试网关连接统计与预热：区分新建与复用的连接，预热建立的连接不计入统计且被之后的请求复用
+"""
+
+import sys
+import os
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+import pytest
+
+from config.alipay_config import alipay_config
+from services.async_alipay_service import AsyncAlipayService
+from services.connection_stats import ConnectionStats
+from services.token_store import InMemoryTokenStore
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """保持连接的最小HTTP服务，记录建立的连接数"""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def _reply(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(b"ok")
+
+    do_GET = do_HEAD = do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    KeepAliveHandler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/gateway.do"
+    server.shutdown()
+    server.server_close()
+
+
+def test_new_and_reused_connections(server_url):
+    """第一次请求新建连接，之后的请求复用keep-alive连接"""
+    stats = ConnectionStats()
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            for _ in range(3):
+                response = await client.get(server_url, extensions={"trace": stats.tracer()})
+                assert response.status_code == 200
+
+    asyncio.run(run())
+    result = stats.stats()
+    assert result["requests"] == 3
+    assert result["new_connections"] == 1
+    assert result["reused_connections"] == 2
+    assert result["reuse_rate"] == pytest.approx(2 / 3, abs=1e-4)
+    assert result["avg_connect_ms"] > 0
+
+
+def test_failed_connection_not_counted():
+    """连接失败的请求既不计为新建也不计为复用"""
+    stats = ConnectionStats()
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            with pytest.raises(httpx.ConnectError):
+                await client.get("http://127.0.0.1:1/", extensions={"trace": stats.tracer()})
+
+    asyncio.run(run())
+    assert stats.stats()["new_connections"] == stats.stats()["reused_connections"] == 0
+
+
+def test_warm_up_connections_reused(server_url, monkeypatch):
+    """预热并发建立连接，不计入连接统计，之后的请求复用预热的连接"""
+    monkeypatch.setattr(alipay_config, "gateway_url", server_url)
+    service = AsyncAlipayService(transport="http", token_store=InMemoryTokenStore())
+
+    async def run():
+        try:
+            await service.warm_up(connections=2)
+            assert KeepAliveHandler.connections == 2
+            assert service.connection_stats.stats()["requests"] == 0
+
+            await service.http_client.post(server_url, extensions={"trace": service.connection_stats.tracer()})
+        finally:
+            await service.aclose()
+
+    asyncio.run(run())
+    assert KeepAliveHandler.connections == 2
+    assert service.connection_stats.stats()["reused_connections"] == 1
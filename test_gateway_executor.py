@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试网关调用执行器：有界排队、排队超时、调用方取消时在线程结束后才释放名额、同步调用不能在事件循环中等待
+"""
+
+import sys
+import os
+import time
+import asyncio
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from services.errors import GatewayBusyError
+from services.gateway_executor import GatewayExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = GatewayExecutor(max_workers=1, max_queue=1, queue_timeout=0.1)
+    yield executor
+    executor.shutdown()
+
+
+def test_queue_full_and_timeout(executor):
+    """排队已满时立即拒绝，排队超时后放弃，名额不会丢失"""
+    release = threading.Event()
+
+    async def run():
+        running = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(executor.run(lambda: "queued"))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(GatewayBusyError, match="排队已满"):
+            await executor.run(lambda: "rejected")
+        with pytest.raises(GatewayBusyError, match="排队超时"):
+            await queued
+
+        release.set()
+        await running
+        assert await executor.run(lambda: "ok") == "ok"
+        assert executor._semaphore._value == 1
+
+    asyncio.run(run())
+    stats = executor.stats()
+    assert (stats["rejected"], stats["timed_out"], stats["completed"]) == (1, 1, 2)
+
+
+def test_cancelled_caller_holds_slot_until_thread_finishes(executor):
+    """调用方被取消后线程中的调用仍在执行，此时不放行新的调用"""
+    release = threading.Event()
+
+    async def run():
+        caller = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        assert executor.stats()["active_workers"] == 1
+
+        with pytest.raises(GatewayBusyError, match="排队超时"):
+            await executor.run(lambda: "blocked")
+
+        release.set()
+        assert await executor.run(lambda: "ok") == "ok"
+
+    asyncio.run(run())
+
+
+def test_run_sync(executor):
+    """同步调用在线程池中执行并计入统计，在事件循环线程中调用时报错"""
+    assert executor.run_sync(threading.current_thread) is not threading.current_thread()
+    assert executor.stats()["completed"] == 1
+
+    async def run():
+        with pytest.raises(RuntimeError, match="事件循环"):
+            executor.run_sync(time.sleep, 0)
+
+    asyncio.run(run())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试网关熔断器与自适应并发限制
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from services import circuit_breaker
+from services.circuit_breaker import (
+    AdaptiveConcurrencyLimit, CircuitBreaker, GatewayGuard,
+    STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+)
+from services.errors import CircuitOpenError, ConcurrencyLimitError, DeadlineExceededError
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", fake)
+    return fake
+
+
+def open_breaker(breaker: CircuitBreaker):
+    """连续记录失败直到熔断"""
+    for _ in range(breaker.min_calls):
+        breaker.before_call()
+        breaker.record(True, 0.01)
+    assert breaker.state == STATE_OPEN
+
+
+def test_breaker_opens_on_failure_rate(clock):
+    """错误率达到阈值前保持closed，达到后进入open并拒绝调用"""
+    breaker = CircuitBreaker("op", failure_rate=0.5, window=10, min_calls=4)
+    for failed in (True, False, False):
+        breaker.before_call()
+        breaker.record(failed, 0.01)
+    assert breaker.state == STATE_CLOSED
+
+    breaker.before_call()
+    breaker.record(True, 0.01)
+    assert breaker.state == STATE_OPEN
+    assert breaker.opened == 1
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after > 0
+    assert breaker.rejected == 1
+
+
+def test_breaker_opens_on_slow_calls(clock):
+    """慢调用率达到阈值时熔断，即使调用都成功"""
+    breaker = CircuitBreaker("op", slow_call_rate=0.5, slow_call_seconds=1.0, window=4, min_calls=4)
+    for elapsed in (2.0, 0.1, 2.0, 0.1):
+        breaker.before_call()
+        breaker.record(False, elapsed)
+    assert breaker.state == STATE_OPEN
+
+
+def test_breaker_half_open_probes_close(clock):
+    """恢复期后只放行 half_open_probes 个探测请求，全部成功后恢复closed"""
+    breaker = CircuitBreaker("op", window=4, min_calls=2, open_seconds=30, half_open_probes=2)
+    open_breaker(breaker)
+
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 2
+    breaker.before_call()
+    assert breaker.state == STATE_HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record(False, 0.01)
+    assert breaker.state == STATE_HALF_OPEN
+    breaker.record(False, 0.01)
+    assert breaker.state == STATE_CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_breaker_half_open_probe_failure_reopens(clock):
+    """任一探测请求失败或过慢时重新熔断"""
+    breaker = CircuitBreaker("op", slow_call_seconds=1.0, window=4, min_calls=2,
+                             open_seconds=30, half_open_probes=2)
+    open_breaker(breaker)
+    clock.now += 31
+    breaker.before_call()
+    breaker.record(True, 0.01)
+    assert breaker.state == STATE_OPEN
+    assert breaker.opened == 2
+
+    clock.now += 31
+    breaker.before_call()
+    breaker.record(False, 5.0)
+    assert breaker.state == STATE_OPEN
+
+
+def test_breaker_cancel_returns_probe(clock):
+    """被取消的探测请求归还名额"""
+    breaker = CircuitBreaker("op", window=4, min_calls=2, open_seconds=30, half_open_probes=1)
+    open_breaker(breaker)
+    clock.now += 31
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.cancel()
+    breaker.before_call()
+    assert breaker.state == STATE_HALF_OPEN
+
+
+def test_adaptive_limit_aimd():
+    """失败时上限乘性减小，成功时加性增长，达到上限时立即拒绝"""
+    limit = AdaptiveConcurrencyLimit(initial=4, min_limit=2, max_limit=5, slow_call_seconds=1.0)
+    for _ in range(4):
+        limit.acquire()
+    with pytest.raises(ConcurrencyLimitError):
+        limit.acquire()
+    assert limit.rejected == 1
+
+    limit.release(True, 0.01)
+    assert limit.limit == 2.0
+    limit.release(False, 2.0)
+    assert limit.limit == 2.0  # 不低于 min_limit
+    limit.release(None, 0.0)
+    assert limit.limit == 2.0  # 取消的调用不调整上限
+    limit.release(False, 0.01)
+    assert limit.limit == 2.5
+    assert limit.in_flight == 0
+
+    for _ in range(20):
+        limit.acquire()
+        limit.release(False, 0.01)
+    assert limit.limit == 5.0
+
+
+def test_guard_ignores_deadline_and_cancellation(clock):
+    """请求时限用完或被取消的调用不计入熔断与并发上限的调整"""
+    guard = GatewayGuard(AdaptiveConcurrencyLimit(initial=4),
+                         lambda name: CircuitBreaker(name, window=2, min_calls=2))
+
+    async def expired():
+        raise DeadlineExceededError("请求处理时限已用完")
+
+    async def failing():
+        raise RuntimeError("网关错误")
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(DeadlineExceededError):
+                await guard.call("op", expired)
+        assert guard.breaker("op").state == STATE_CLOSED
+        assert guard.concurrency.limit == 4.0
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await guard.call("op", failing)
+        assert guard.breaker("op").state == STATE_OPEN
+        assert guard.concurrency.in_flight == 0
+
+    asyncio.run(run())
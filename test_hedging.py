@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试对冲请求：只读接口超过历史延迟分位数时发出对冲请求，取先成功的结果并取消另一个
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from services.hedging import Hedger
+
+
+def test_hedger_rejects_unsafe_operation():
+    """不能重复执行的接口不允许对冲"""
+    with pytest.raises(ValueError):
+        Hedger(["alipay.system.oauth.token"])
+
+
+def test_hedger_hedges_slow_primary():
+    """样本足够后，首个请求超过对冲等待时间仍未返回时发出对冲请求，取先返回的结果"""
+    hedger = Hedger(["op"], percentile=0.5, min_delay=0.01, max_hedge_rate=1.0, min_samples=3)
+    delays = [0.0, 0.0, 0.0, 1.0, 0.0]
+    calls = []
+
+    async def request(tag):
+        index = len(calls)
+        calls.append(tag)
+        await asyncio.sleep(delays[index])
+        return index
+
+    async def run():
+        assert hedger.hedge_delay("op") == 0.0
+        for _ in range(3):
+            await hedger.run("op", request, "x")
+        assert hedger.hedged == 0
+        assert hedger.hedge_delay("op") == 0.01
+
+        assert await hedger.run("op", request, "x") == 4
+
+    asyncio.run(run())
+    assert hedger.hedged == 1
+    assert hedger.hedge_wins == 1
+    assert len(calls) == 5
+
+
+def test_hedger_respects_budget():
+    """对冲请求数达到 max_hedge_rate 后不再对冲"""
+    hedger = Hedger(["op"], min_delay=0.01, max_hedge_rate=0.0, min_samples=1)
+
+    async def request(delay):
+        await asyncio.sleep(delay)
+        return delay
+
+    async def run():
+        await hedger.run("op", request, 0.0)
+        assert await hedger.run("op", request, 0.05) == 0.05
+
+    asyncio.run(run())
+    assert hedger.hedged == 0
+    assert hedger.budget_exhausted == 1
+
+
+def test_hedger_loser_cancelled_and_failure_falls_back():
+    """胜出后取消另一个请求；首个请求失败时等待对冲请求的结果，都失败时抛出首个请求的异常"""
+    hedger = Hedger(["op"], min_delay=0.01, max_hedge_rate=1.0, min_samples=1)
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+
+    async def request(behaviour):
+        step = behaviour.pop(0)
+        if step == "slow":
+            await slow()
+        elif isinstance(step, tuple):
+            await asyncio.sleep(step[1])
+            raise RuntimeError(step[0])
+        else:
+            await asyncio.sleep(step)
+            return step
+
+    async def run():
+        await hedger.run("op", request, [0.0])
+        assert await hedger.run("op", request, ["slow", 0.0]) == 0.0
+        await asyncio.sleep(0)
+        assert cancelled == ["slow"]
+
+        assert await hedger.run("op", request, [("网关错误", 0.02), 0.05]) == 0.05
+        with pytest.raises(RuntimeError, match="首个请求失败"):
+            await hedger.run("op", request, [("首个请求失败", 0.2), ("对冲请求失败", 0.0)])
+
+    asyncio.run(run())
+    assert hedger.hedged == 3
+    assert hedger.hedge_wins == 2
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试事件循环监控：调度延迟采样、阻塞时抓取调用栈（每次阻塞只报告一次）、阻塞报告接口开关与就绪检查
+"""
+
+import sys
+import os
+import time
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import main
+from config.alipay_config import alipay_config
+from services.loop_monitor import LoopMonitor
+
+
+def blocking_call(seconds: float):
+    """在事件循环线程中执行的同步阻塞调用"""
+    time.sleep(seconds)
+
+
+def run_monitor(monitor: LoopMonitor, block: float):
+    """启动监控，阻塞事件循环一次，之后继续运行一段时间再停止"""
+    async def run():
+        monitor.start()
+        try:
+            await asyncio.sleep(0.1)
+            blocking_call(block)
+            await asyncio.sleep(0.1)
+            assert monitor.running
+        finally:
+            await monitor.stop()
+
+    asyncio.run(run())
+
+
+def test_lag_sampling():
+    """阻塞事件循环的时长计入延迟，未开启阻塞检测时不产生报告"""
+    monitor = LoopMonitor(interval=0.02, block_threshold=0)
+    run_monitor(monitor, 0.15)
+
+    stats = monitor.stats()
+    assert not stats["running"]
+    assert stats["max_lag_seconds"] >= 0.12
+    assert stats["recent_max_lag_seconds"] == stats["max_lag_seconds"]
+    assert 0 < stats["avg_lag_seconds"] < stats["max_lag_seconds"]
+    assert stats["stalls"] == 0 and monitor.reports() == []
+
+
+def test_stall_reported_once_with_stack():
+    """阻塞超过阈值时报告一次，调用栈指向阻塞位置，阻塞结束后补记总时长"""
+    monitor = LoopMonitor(interval=0.02, block_threshold=0.05)
+    run_monitor(monitor, 0.3)
+
+    assert monitor.stats()["stalls"] == 1
+    report, = monitor.reports()
+    assert 50 <= report["stalled_ms"] < 300
+    assert report["blocked_ms"] >= 250
+    assert any("blocking_call" in line for line in report["stack"])
+
+
+def test_stalls_endpoint_gated(monkeypatch):
+    """阻塞报告接口默认关闭，开启后返回报告列表"""
+    client = TestClient(main.app)
+    assert client.get("/debug/loop-stalls").status_code == 404
+
+    monkeypatch.setattr(alipay_config, "loop_stalls_endpoint", True)
+    response = client.get("/debug/loop-stalls")
+    assert response.status_code == 200
+    assert response.json()["data"] == main.loop_monitor.reports()
+
+
+def test_readiness_uses_loop_lag(monkeypatch):
+    """监控未运行或近期延迟超过上限时就绪检查返回503"""
+    client = TestClient(main.app)
+    monitor = LoopMonitor(interval=0.1)
+    monkeypatch.setattr(main, "loop_monitor", monitor)
+    assert client.get("/health", params={"mode": "ready"}).status_code == 503
+
+    monkeypatch.setattr(LoopMonitor, "running", property(lambda self: True))
+    response = client.get("/health", params={"mode": "ready"})
+    assert response.status_code == 200
+    assert response.json()["checks"]["event_loop"]["ok"]
+
+    monitor._recent.append(alipay_config.readiness_max_loop_lag + 0.1)
+    response = client.get("/health", params={"mode": "ready"})
+    assert response.status_code == 503
+    assert response.json()["status"] == "not_ready"
+    assert client.get("/health").status_code == 200
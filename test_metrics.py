@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试Prometheus指标：计数器与直方图的文本格式、多线程分片汇总、stats() 展开为 gauge 与 /metrics 接口
+"""
+
+import sys
+import os
+import asyncio
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from services.metrics import MetricsRegistry, observe_operation, operation_duration, operation_errors
+
+
+def test_counter_render():
+    """计数器名称带 _total 后缀，标签值转义"""
+    registry = MetricsRegistry(namespace="app")
+    counter = registry.counter("requests", "请求次数", ("path",))
+    counter.labels("/a").inc()
+    counter.labels("/a").inc(2)
+    counter.labels('say "hi"\n').inc()
+
+    assert registry.render().splitlines() == [
+        "# HELP app_requests_total 请求次数",
+        "# TYPE app_requests_total counter",
+        'app_requests_total{path="/a"} 3',
+        'app_requests_total{path="say \\"hi\\"\\n"} 1',
+    ]
+    with pytest.raises(ValueError):
+        counter.labels()
+
+
+def test_histogram_render():
+    """分桶计数累加，包含 +Inf 分桶、总和与次数"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "耗时", buckets=(0.5, 0.1))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="0.5"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 2.45",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_threads_write_own_shards():
+    """多个线程并发记录，导出时汇总全部分片"""
+    registry = MetricsRegistry()
+    counter = registry.counter("calls", "调用次数")
+    histogram = registry.histogram("seconds", "耗时")
+
+    def worker():
+        for _ in range(1000):
+            counter.inc()
+            histogram.observe(0.001)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert counter.labels().value() == 8000
+    assert "seconds_count 8000" in registry.render()
+
+
+def test_stats_exported_as_gauges():
+    """数值字段导出为 gauge，非法指标名的key作为标签，列表以 index 区分，非数值字段忽略"""
+    registry = MetricsRegistry(namespace="app")
+    registry.register_stats("pool", lambda: {
+        "size": 4,
+        "enabled": True,
+        "mode": "http",
+        "per_method": {"alipay.user.info.share": {"calls": 2}},
+        "shards": [1, 2.5],
+    })
+
+    assert registry.render().splitlines() == [
+        "# TYPE app_pool_size gauge",
+        "app_pool_size 4",
+        "# TYPE app_pool_enabled gauge",
+        "app_pool_enabled 1",
+        "# TYPE app_pool_per_method_calls gauge",
+        'app_pool_per_method_calls{key="alipay.user.info.share"} 2',
+        "# TYPE app_pool_shards gauge",
+        'app_pool_shards{index="0"} 1',
+        'app_pool_shards{index="1"} 2.5',
+    ]
+
+
+def test_observe_operation():
+    """记录耗时与按异常类型区分的失败次数，取消不计为失败"""
+    @observe_operation("test_operation")
+    async def operation(error=None):
+        if error is not None:
+            raise error
+        await asyncio.sleep(0)
+
+    async def run():
+        await operation()
+        with pytest.raises(KeyError):
+            await operation(KeyError("k"))
+        with pytest.raises(asyncio.CancelledError):
+            await operation(asyncio.CancelledError())
+
+    before = operation_errors.labels("test_operation", "KeyError").value()
+    asyncio.run(run())
+    cumulative, _ = operation_duration.labels("test_operation").snapshot()
+    assert cumulative[-1] == 3
+    assert operation_errors.labels("test_operation", "KeyError").value() == before + 1
+    assert ("test_operation", "CancelledError") not in operation_errors._children
+
+
+def test_metrics_endpoint():
+    """请求耗时按路由模板记录，未匹配的路径归为 unmatched，组件统计一并导出"""
+    client = TestClient(main.app)
+    client.get("/no-such-page")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    text = client.get("/metrics").text
+    assert 'allogin_http_request_duration_seconds_count{method="GET",route="/metrics",status="200"}' in text
+    assert 'route="unmatched",status="404"' in text
+    assert "# TYPE allogin_gateway_executor_max_workers gauge" in text
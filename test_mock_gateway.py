@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试本地模拟网关：响应签名可被服务端验签、故障注入、延迟分布与 ALIPAY_MOCK_* 配置覆盖
+"""
+
+import sys
+import os
+import json
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from benchmarks.mock_alipay_gateway import (
+    INVALID_AUTH_CODE, INVALID_AUTH_TOKEN, THROTTLED, LatencyModel, MockAlipayGateway,
+    load_or_create_key, public_key_base64
+)
+from config.alipay_config import AlipayConfig, alipay_config
+from services.async_alipay_service import AsyncAlipayService, METHOD_OAUTH_TOKEN, METHOD_USER_INFO_SHARE
+from services.token_store import InMemoryTokenStore
+
+GATEWAY_URL = "http://mock-gateway/gateway.do"
+
+
+@pytest.fixture(scope="module")
+def gateway_key():
+    """模拟网关的签名密钥"""
+    return load_or_create_key(None)
+
+
+def make_gateway(key, **options) -> MockAlipayGateway:
+    return MockAlipayGateway(key=key, latency=LatencyModel(0), **options)
+
+
+def test_login_flow_against_mock_gateway(gateway_key, monkeypatch):
+    """服务端使用模拟网关公钥验签，完成换取令牌、获取用户信息与刷新令牌"""
+    monkeypatch.setattr(alipay_config, "gateway_url", GATEWAY_URL)
+    gateway = make_gateway(gateway_key)
+    service = AsyncAlipayService(transport="http", token_store=InMemoryTokenStore())
+    service._public_key = gateway_key.public_key()
+
+    async def run():
+        service._http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway))
+        try:
+            token = await service.get_access_token("auth-code-1")
+            user = await service.get_user_info(token["access_token"])
+            refreshed = await service.refresh_access_token(token["refresh_token"], use_stored=False)
+        finally:
+            await service.aclose()
+        return token, user, refreshed
+
+    token, user, refreshed = asyncio.run(run())
+    assert token["user_id"].startswith("2088") and len(token["user_id"]) == 16
+    assert user["user_id"] == token["user_id"]
+    assert user["nick_name"].startswith("模拟用户")
+    assert refreshed["user_id"] == token["user_id"]
+    assert refreshed["refresh_token"] != token["refresh_token"]
+    assert gateway.stats["requests"] == 3
+
+
+def test_fault_injection(gateway_key):
+    """按比例返回HTTP错误、业务错误与限流响应，并计入统计"""
+    params = {"method": METHOD_OAUTH_TOKEN, "grant_type": "authorization_code", "code": "c"}
+
+    async def run():
+        status, _ = await make_gateway(gateway_key, error_rate=1).handle(params)
+        assert status == 502
+
+        gateway = make_gateway(gateway_key, biz_error_rate=1)
+        _, body = await gateway.handle(params)
+        assert json.loads(body)["error_response"] == INVALID_AUTH_CODE
+        _, body = await gateway.handle({"method": METHOD_USER_INFO_SHARE, "auth_token": "mockat1"})
+        assert json.loads(body)["error_response"] == INVALID_AUTH_TOKEN
+        assert gateway.stats["biz_errors"] == 2
+
+        gateway = make_gateway(gateway_key, max_qps=2)
+        bodies = [(await gateway.handle(params))[1] for _ in range(3)]
+        assert [json.loads(body).get("error_response") for body in bodies] == [None, None, THROTTLED]
+        assert gateway.stats["throttled"] == 1
+
+    asyncio.run(run())
+
+
+def test_hang_delays_response(gateway_key):
+    """挂起的请求超过客户端超时仍未响应"""
+    gateway = make_gateway(gateway_key, hang_rate=1, hang_seconds=1)
+
+    async def run():
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.05):
+                await gateway.handle({"method": METHOD_OAUTH_TOKEN})
+
+    asyncio.run(run())
+    assert gateway.stats["hung"] == 1
+
+
+def test_latency_model():
+    """固定延迟与对数正态分布的中位数、99分位"""
+    assert LatencyModel(0).sample() == 0
+    assert LatencyModel(50, 20).sample() == 0.05
+
+    model = LatencyModel(50, 300)
+    samples = sorted(model.sample() for _ in range(20000))
+    assert samples[10000] == pytest.approx(0.05, rel=0.1)
+    assert samples[19800] == pytest.approx(0.3, rel=0.2)
+
+
+def test_key_file_and_config_overrides(tmp_path, monkeypatch):
+    """私钥文件不存在时生成并保存，服务端通过 ALIPAY_MOCK_* 指向模拟网关"""
+    path = str(tmp_path / "mock_key.pem")
+    key = load_or_create_key(path)
+    assert public_key_base64(load_or_create_key(path)) == public_key_base64(key)
+
+    monkeypatch.setenv("ALIPAY_MOCK_GATEWAY_URL", "http://127.0.0.1:9100/gateway.do")
+    monkeypatch.setenv("ALIPAY_MOCK_PUBLIC_KEY", public_key_base64(key))
+    config = AlipayConfig()
+    assert config.gateway_url == "http://127.0.0.1:9100/gateway.do"
+    loaded = serialization.load_pem_public_key(config.get_public_key().encode())
+    assert loaded.public_numbers() == key.public_key().public_numbers()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试滑动窗口与GCRA频率限制器：窗口内计数、按消耗计费、多线程下的分片锁、过期清理、LRU上限、内存统计与限流响应头
+"""
+
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import rate_limiter
+from rate_limiter import GcraRateLimiter, RateLimiter, create_rate_limiter, rate_limit_headers
+
+
+class FakeClock:
+    """可手动推进的 time.time"""
+
+    def __init__(self):
+        self.now = 1700000000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "time", fake)
+    return fake
+
+
+def scanned_memory_usage(limiter) -> int:
+    """逐个key计算的字节数，用于核对增量维护的计数"""
+    total = 0
+    for stripe in limiter._stripes:
+        total += sys.getsizeof(stripe.requests)
+        for key, state in stripe.requests.items():
+            total += sys.getsizeof(key) + limiter._state_size(state)
+    return total
+
+
+def test_sliding_window_limit(clock):
+    """窗口内超过上限时拒绝，窗口滑过最早的请求后恢复"""
+    limiter = RateLimiter(max_requests=3, time_window=60)
+    for remaining in (2, 1, 0):
+        result = limiter.check("ip")
+        assert result.allowed and result.remaining == remaining
+
+    clock.now += 10
+    assert not limiter.is_allowed("ip")
+    assert limiter.get_remaining_time("ip") == 50
+    assert limiter.is_allowed("other")
+
+    clock.now += 50
+    assert limiter.is_allowed("ip")
+    assert limiter.get_remaining_time("unknown") is None
+
+
+def test_sliding_window_cost(clock):
+    """按消耗的配额数计费，超过上限的消耗总是被拒绝"""
+    limiter = RateLimiter(max_requests=5, time_window=60)
+    assert limiter.check("ip", cost=3).remaining == 2
+    clock.now += 10
+    assert limiter.check("ip", cost=1).remaining == 1
+
+    result = limiter.check("ip", cost=3)
+    assert not result.allowed
+    # 需要等最早的3份配额过期，才能容纳3份消耗
+    assert result.retry_after == pytest.approx(50)
+
+    assert not limiter.check("other", cost=6).allowed
+    assert limiter.check("other", cost=5).allowed
+
+
+def test_concurrent_checks_never_exceed_limit():
+    """多线程同时检查同一批key时，每个key允许的请求数恰好等于上限"""
+    limiter = RateLimiter(max_requests=50, time_window=60, stripes=4)
+    keys = [f"ip{i}" for i in range(8)]
+    allowed = {key: 0 for key in keys}
+    lock = threading.Lock()
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        counts = {key: 0 for key in keys}
+        for _ in range(20):
+            for key in keys:
+                if limiter.is_allowed(key):
+                    counts[key] += 1
+        with lock:
+            for key, count in counts.items():
+                allowed[key] += count
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert allowed == {key: 50 for key in keys}
+
+
+def test_rate_limit_headers(clock):
+    """允许时返回剩余配额与重置时间，拒绝时额外返回向上取整的 Retry-After"""
+    limiter = RateLimiter(max_requests=2, time_window=60)
+    assert rate_limit_headers(limiter.check("ip")) == {
+        "X-RateLimit-Limit": "2", "X-RateLimit-Remaining": "1", "X-RateLimit-Reset": "60"
+    }
+    limiter.check("ip")
+    clock.now += 10.5
+    headers = rate_limit_headers(limiter.check("ip"))
+    assert headers["X-RateLimit-Remaining"] == "0"
+    assert headers["Retry-After"] == "50"
+
+
+def test_gcra_burst_and_cost(clock):
+    """GCRA允许突发，之后按发放间隔恢复配额"""
+    limiter = GcraRateLimiter(rate=6, period=60, burst=3)
+    assert limiter.check("ip", cost=2).remaining == 1
+    assert limiter.check("ip").remaining == 0
+
+    result = limiter.check("ip")
+    assert not result.allowed
+    assert result.retry_after == pytest.approx(10)
+    assert limiter.get_remaining_time("ip") == 10
+
+    clock.now += 20
+    assert not limiter.check("ip", cost=3).allowed
+    assert limiter.check("ip", cost=2).allowed
+    assert not limiter.check("ip", cost=4).allowed
+
+
+def test_create_rate_limiter_modes():
+    """按模式创建限制器，GCRA的突发数默认等于每周期请求数"""
+    assert isinstance(create_rate_limiter(5, 60), RateLimiter)
+    gcra = create_rate_limiter(5, 60, mode="gcra")
+    assert isinstance(gcra, GcraRateLimiter)
+    assert gcra.burst == 5
+    with pytest.raises(ValueError):
+        create_rate_limiter(5, 60, mode="token")
+
+
+@pytest.mark.parametrize("limiter_class", [RateLimiter, GcraRateLimiter])
+def test_lru_cap(clock, limiter_class):
+    """key数量达到 max_keys 时淘汰最久未访问的key"""
+    limiter = limiter_class(5, 60, stripes=1, max_keys=3)
+    for key in ("a", "b", "c"):
+        limiter.check(key)
+    limiter.check("a")
+    limiter.check("d")
+
+    keys = list(limiter._stripes[0].requests)
+    assert keys == ["c", "a", "d"]
+    assert limiter.stats()["evicted_lru"] == 1
+    assert limiter.key_count() == 3
+
+
+@pytest.mark.parametrize("limiter_class", [RateLimiter, GcraRateLimiter])
+def test_expired_keys_evicted(clock, limiter_class):
+    """窗口已过期的key在访问同一分片时顺带清理，sweep 清理其余分片"""
+    limiter = limiter_class(5, 60, stripes=2)
+    for i in range(20):
+        limiter.check(f"ip{i}")
+
+    clock.now += 61
+    limiter.check("fresh")
+    evicted = limiter.stats()["evicted_expired"]
+    assert evicted > 0
+    assert limiter.sweep() == 20 - evicted
+    assert limiter.key_count() == 1
+
+
+@pytest.mark.parametrize("limiter_class", [RateLimiter, GcraRateLimiter])
+def test_memory_usage_counter_matches_scan(clock, limiter_class):
+    """增量维护的字节数与逐个key计算的结果一致"""
+    limiter = limiter_class(5, 60, stripes=4, max_keys=40)
+    for i in range(300):
+        limiter.check(f"ip{i % 70}", cost=1 + i % 3)
+        if i % 50 == 0:
+            clock.now += 20
+    assert limiter.memory_usage() == scanned_memory_usage(limiter)
+
+    clock.now += 61
+    limiter.sweep()
+    assert limiter.memory_usage() == scanned_memory_usage(limiter)
+    assert limiter.stats()["keys"] == 0
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试请求处理时限中间件：超时返回504并取消处理函数，客户端不能用非正数或非法的 X-Request-Timeout 关闭时限
+"""
+
+import sys
+import os
+import time
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from config.alipay_config import alipay_config
+from main import RequestDeadlineMiddleware
+from services import deadline
+from services.errors import DeadlineExceededError
+
+finished = []
+
+
+async def remaining(request):
+    return JSONResponse({"remaining": deadline.remaining()})
+
+
+async def slow(request):
+    await asyncio.sleep(0.3)
+    finished.append(request.url.path)
+    return JSONResponse({"done": True})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(alipay_config, "request_deadline_seconds", 2.0)
+    monkeypatch.setattr(alipay_config, "request_deadline_overrides", {"/slow": 0.1, "/unlimited": 0})
+    app = Starlette(routes=[
+        Route("/remaining", remaining),
+        Route("/unlimited", remaining),
+        Route("/slow", slow),
+    ])
+    app.add_middleware(RequestDeadlineMiddleware)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_route_budget_applies(client):
+    """未传请求头时使用路由时限"""
+    left = client.get("/remaining").json()["remaining"]
+    assert 1.5 < left <= 2.0
+
+
+def test_client_budget_shortens(client):
+    """客户端时限小于路由时限时取客户端时限"""
+    left = client.get("/remaining", headers={deadline.DEADLINE_HEADER: "0.5"}).json()["remaining"]
+    assert 0 < left <= 0.5
+
+
+@pytest.mark.parametrize("value", ["0", "-5", "abc", "", "nan"])
+def test_client_cannot_disable_deadline(client, value):
+    """非正数、非法值不能关闭或放宽时限"""
+    left = client.get("/remaining", headers={deadline.DEADLINE_HEADER: value}).json()["remaining"]
+    assert left is not None and 1.5 < left <= 2.0
+
+
+def test_configured_zero_disables(client):
+    """只有配置的时限为0时不限时"""
+    assert client.get("/unlimited").json()["remaining"] is None
+
+
+def test_timeout_cancels_handler(client):
+    """超时返回504，处理函数被取消而不是在后台继续执行"""
+    response = client.get("/slow")
+    assert response.status_code == 504
+    # 等到处理函数本应完成之后再检查
+    time.sleep(0.5)
+    assert "/slow" not in finished
+
+
+def test_timeout_for_uses_remaining_budget():
+    """下游调用的超时取默认值与剩余时间中的较小值，时间用完时直接放弃"""
+    async def run():
+        assert deadline.timeout_for(15) == 15
+        deadline.set_deadline(1.0)
+        assert 0.9 < deadline.timeout_for(15) <= 1.0
+        assert deadline.timeout_for(0.5) == 0.5
+        deadline.set_deadline(0)
+        with pytest.raises(DeadlineExceededError):
+            deadline.timeout_for(15)
+
+    asyncio.run(run())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试请求耗时分解：Server-Timing 响应头、请求ID沿用与生成、环形缓冲区与 /debug/timings 接口
+"""
+
+import sys
+import os
+import re
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from rate_limiter import RateLimiter
+from services import request_timing
+from services.request_timing import RequestTiming, TimingBuffer, span
+from services.sign_engine import sign_engine
+
+PID = "2088102123816631"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """签名在进程内执行、频率限制重新计数的测试客户端"""
+    monkeypatch.setattr(sign_engine, "workers", 0)
+    monkeypatch.setattr(main, "auth_rate_limiter", RateLimiter(max_requests=5, time_window=60))
+    return TestClient(main.app)
+
+
+def test_spans_accumulate():
+    """同名阶段累加，保持首次出现的顺序，总耗时放在最后"""
+    timing = RequestTiming("r1")
+    timing.add("sign", 0.002)
+    timing.add("json", 0.0005)
+    timing.add("sign", 0.001)
+    assert re.fullmatch(r"sign;dur=3\.0, json;dur=0\.5, total;dur=\d+\.\d", timing.server_timing())
+
+
+def test_span_outside_request():
+    """不在请求上下文中时 span 不记录，请求上下文之间互不影响"""
+    with span("background"):
+        pass
+    assert request_timing.current() is None
+
+    async def handle(request_id):
+        token = request_timing.start_request(request_id)
+        try:
+            with span(request_id):
+                await asyncio.sleep(0.01)
+            return request_timing.current_request_id(), dict(request_timing.current().spans)
+        finally:
+            request_timing.finish_request(token)
+
+    async def run():
+        return await asyncio.gather(handle("a"), handle("b"))
+
+    (id_a, spans_a), (id_b, spans_b) = asyncio.run(run())
+    assert (id_a, list(spans_a), id_b, list(spans_b)) == ("a", ["a"], "b", ["b"])
+    assert request_timing.current_request_id() is None
+
+
+def test_request_id():
+    """沿用合法的请求ID，不合法或过长时生成新的"""
+    assert request_timing.new_request_id("abc-123_x.y") == "abc-123_x.y"
+    for incoming in (None, "", "a b", "x" * 65, "id\r\nSet-Cookie: a"):
+        assert re.fullmatch(r"[0-9a-f]{32}", request_timing.new_request_id(incoming))
+
+
+def test_timing_buffer():
+    """缓冲区满后覆盖最旧的记录，导出从新到旧，可按总耗时过滤；大小为0时不记录"""
+    buffer = TimingBuffer(2)
+    for request_id in ("r1", "r2", "r3"):
+        buffer.record(RequestTiming(request_id), "GET", "/x", 200)
+    assert [record["id"] for record in buffer.dump()] == ["r3", "r2"]
+    assert len(buffer.dump(limit=1)) == 1
+    assert buffer.dump(min_total_ms=1000) == []
+
+    disabled = TimingBuffer(0)
+    disabled.record(RequestTiming("r1"), "GET", "/x", 200)
+    assert not disabled.enabled and disabled.dump() == []
+
+
+def test_server_timing_header(client):
+    """响应带有各阶段耗时与请求ID，请求ID沿用客户端传入的值"""
+    response = client.get(f"/api/auth/authinfo/{PID}", params={"target_id": "t1"},
+                          headers={"X-Request-ID": "client-id-1"})
+    assert response.status_code == 200
+    names = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert names[0] == "ratelimit"
+    assert {"sign", "json"} <= set(names)
+    assert names[-1] == "total"
+    assert response.headers["X-Request-ID"] == "client-id-1"
+
+    generated = client.get("/health", headers={"X-Request-ID": "bad id"}).headers["X-Request-ID"]
+    assert generated != "bad id" and len(generated) == 32
+
+
+def test_debug_timings(client, monkeypatch):
+    """启用缓冲区后按路由模板记录请求，未启用时返回404"""
+    assert client.get("/debug/timings").status_code == 404
+
+    monkeypatch.setattr(main, "timing_buffer", TimingBuffer(10))
+    client.get(f"/api/auth/authinfo/{PID}", params={"target_id": "t1"}, headers={"X-Request-ID": "req-1"})
+    records = client.get("/debug/timings").json()["data"]
+    assert records[0]["id"] == "req-1"
+    assert records[0]["route"] == "/api/auth/authinfo/{pid}"
+    assert records[0]["status"] == 200
+    assert "sign" in records[0]["spans_ms"]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试共享内存频率限制后端：与进程内后端判定一致、多进程共用计数、桶满淘汰、布局不一致时拒绝启动
+"""
+
+import sys
+import os
+import multiprocessing
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import rate_limiter
+from rate_limiter import GcraRateLimiter, RateLimiter
+from shared_rate_limiter import SharedMemoryRateLimiter, fcntl
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="共享内存后端仅支持POSIX平台")
+
+
+class FakeClock:
+    """可手动推进的 time.time"""
+
+    def __init__(self):
+        self.now = 1700000000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import shared_rate_limiter
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "time", fake)
+    monkeypatch.setattr(shared_rate_limiter.time, "time", fake)
+    return fake
+
+
+def count_allowed(path: str, key: str, attempts: int) -> int:
+    """在子进程中对同一个key发起请求，返回被允许的次数"""
+    limiter = SharedMemoryRateLimiter(RateLimiter(30, 60), path=path, max_keys=64)
+    try:
+        return sum(limiter.is_allowed(key) for _ in range(attempts))
+    finally:
+        limiter.close()
+
+
+@pytest.mark.parametrize("limiter_class", [RateLimiter, GcraRateLimiter])
+def test_shared_memory_backend(tmp_path, clock, limiter_class):
+    """共享内存后端与进程内后端的判定一致，两个实例共用计数，key数量按槽位增减"""
+    path = str(tmp_path / "ratelimit")
+    first = SharedMemoryRateLimiter(limiter_class(3, 60), path=path, max_keys=64)
+    second = SharedMemoryRateLimiter(limiter_class(3, 60), path=path, max_keys=64)
+    try:
+        assert first.check("ip", cost=2).allowed
+        assert second.check("ip").allowed
+        assert not first.check("ip").allowed
+        assert second.check("other").allowed
+        assert first.key_count() == second.key_count() == 2
+
+        clock.now += 61
+        assert first.check("ip").allowed
+        assert first.key_count() == 2
+        assert first.sweep() == 1
+        assert second.key_count() == 1
+    finally:
+        first.close()
+        second.close()
+
+
+def test_processes_share_one_limit(tmp_path):
+    """多个进程同时请求时，合计允许的次数等于上限"""
+    path = str(tmp_path / "ratelimit")
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        allowed = pool.starmap(count_allowed, [(path, "ip", 20)] * 3)
+    assert sum(allowed) == 30
+
+
+def test_full_bucket_evicts(tmp_path, clock):
+    """桶满且都在窗口内时覆盖槽位，占用的槽位数不超过容量"""
+    limiter = SharedMemoryRateLimiter(RateLimiter(3, 60), path=str(tmp_path / "ratelimit"),
+                                      max_keys=4, slots_per_bucket=2)
+    try:
+        for i in range(10):
+            limiter.check(f"ip{i}")
+        stats = limiter.stats()
+        assert stats["keys"] == 4
+        assert stats["evicted_lru"] == 6
+        assert stats["evicted_expired"] == 0
+    finally:
+        limiter.close()
+
+
+def test_expired_evictions_counted(tmp_path, clock):
+    """复用过期key的槽位和 sweep 清理都计入 evicted_expired"""
+    limiter = SharedMemoryRateLimiter(RateLimiter(3, 60), path=str(tmp_path / "ratelimit"),
+                                      max_keys=2, slots_per_bucket=2)
+    try:
+        limiter.check("a")
+        limiter.check("b")
+        clock.now += 61
+        limiter.check("c")
+        assert limiter.stats()["evicted_expired"] == 1
+        assert limiter.sweep() == 1
+        assert limiter.stats() == {"keys": 1, "bytes": limiter.memory_usage(),
+                                   "evicted_expired": 2, "evicted_lru": 0}
+    finally:
+        limiter.close()
+
+
+def test_layout_mismatch_refuses_to_start(tmp_path, clock):
+    """布局不一致时拒绝启动，不截断其他进程正在使用的文件"""
+    path = str(tmp_path / "ratelimit")
+    running = SharedMemoryRateLimiter(RateLimiter(3, 60), path=path, max_keys=64)
+    try:
+        running.check("ip")
+        size = os.path.getsize(path)
+
+        with pytest.raises(RuntimeError, match="布局"):
+            SharedMemoryRateLimiter(GcraRateLimiter(3, 60), path=path, max_keys=64)
+        with pytest.raises(RuntimeError, match="布局"):
+            SharedMemoryRateLimiter(RateLimiter(3, 60), path=path, max_keys=128)
+
+        assert os.path.getsize(path) == size
+        assert running.check("ip").remaining == 1
+    finally:
+        running.close()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多进程签名引擎：进程数按 uvicorn worker 数分配，签名进程异常退出后重启分片并重试
+"""
+
+import sys
+import os
+import signal
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from config.alipay_config import AlipayConfig
+from services.rsa_signer import rsa_signer
+from services.sign_engine import SignEngine
+
+
+def test_workers_split_across_uvicorn_workers(monkeypatch):
+    """默认签名进程数为CPU核数除以 uvicorn worker 数，至少为1"""
+    monkeypatch.delenv("SIGN_ENGINE_WORKERS", raising=False)
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert AlipayConfig().sign_engine_workers == 2
+    monkeypatch.setenv("WEB_CONCURRENCY", "16")
+    assert AlipayConfig().sign_engine_workers == 1
+    monkeypatch.setenv("SIGN_ENGINE_WORKERS", "3")
+    assert AlipayConfig().sign_engine_workers == 3
+
+
+def test_sign_requires_start():
+    """未启动时签名直接报错，不在事件循环中临时启动进程"""
+    engine = SignEngine(workers=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(engine.sign("content"))
+
+
+def test_in_process_when_no_workers():
+    """workers 为 0 时在当前进程内签名"""
+    engine = SignEngine(workers=0)
+    assert asyncio.run(engine.sign("content")) == rsa_signer.sign_base64("content", True)
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="需要 SIGKILL 结束签名进程")
+def test_shard_failure_restarts_and_retries():
+    """签名进程被杀死后，受影响的请求在其他分片重试成功，该分片在后台重启"""
+    engine = SignEngine(workers=2)
+    engine.start()
+    try:
+        async def run():
+            broken = engine._shards[0]
+            for pid in list(broken.executor._processes):
+                os.kill(pid, signal.SIGKILL)
+            await asyncio.sleep(0.2)
+
+            results = await asyncio.gather(*(engine.sign(f"content-{i}") for i in range(8)))
+            assert results == [rsa_signer.sign_base64(f"content-{i}", True) for i in range(8)]
+
+            if broken.restarting is not None:
+                await broken.restarting
+            assert broken.restarts == 1
+            assert broken.failed >= 1
+            assert await engine.sign("after restart") == rsa_signer.sign_base64("after restart", True)
+
+        asyncio.run(run())
+    finally:
+        engine.shutdown()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试单飞请求合并：并发的相同调用只执行一次、异常分发给全部调用方、每个调用方按自己的时限等待
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services import deadline, request_timing
+from services.errors import DeadlineExceededError
+from services.single_flight import SingleFlight
+
+
+class Upstream:
+    """可控制完成时机的上游调用"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.seen = []
+
+    async def __call__(self, value):
+        self.calls += 1
+        self.seen.append((deadline.remaining(), request_timing.current()))
+        await self.release.wait()
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def test_concurrent_calls_coalesced():
+    """相同key的并发调用共享一次上游请求，不同key各自执行，完成后不缓存结果"""
+    flight = SingleFlight()
+
+    async def run():
+        upstream = Upstream()
+        same = [asyncio.create_task(flight.do("k", upstream, "a")) for _ in range(5)]
+        other = asyncio.create_task(flight.do("other", upstream, "b"))
+        await asyncio.sleep(0)
+        assert flight.stats() == {"calls": 6, "coalesced": 4, "in_flight": 2}
+
+        upstream.release.set()
+        assert await asyncio.gather(*same) == ["a"] * 5
+        assert await other == "b"
+        assert upstream.calls == 2
+        assert flight.stats()["in_flight"] == 0
+
+        assert await flight.do("k", upstream, "c") == "c"
+        assert upstream.calls == 3
+
+    asyncio.run(run())
+
+
+def test_error_fans_out():
+    """上游异常抛给所有等待的调用方，之后的调用重新发起请求"""
+    flight = SingleFlight()
+
+    async def run():
+        upstream = Upstream()
+        error = ValueError("网关错误")
+        tasks = [asyncio.create_task(flight.do("k", upstream, error)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(result is error for result in results)
+
+        assert await flight.do("k", upstream, "ok") == "ok"
+        assert upstream.calls == 2
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_cancel_others():
+    """某个调用方被取消时共享任务继续执行"""
+    flight = SingleFlight()
+
+    async def run():
+        upstream = Upstream()
+        first = asyncio.create_task(flight.do("k", upstream, "a"))
+        second = asyncio.create_task(flight.do("k", upstream, "a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        assert await second == "a"
+        assert first.cancelled()
+
+    asyncio.run(run())
+
+
+def test_each_caller_uses_own_deadline():
+    """共享任务不继承首个调用方的时限与耗时记录，时限较短的调用方单独超时"""
+    flight = SingleFlight()
+
+    async def call(upstream, seconds):
+        deadline.set_deadline(seconds)
+        request_timing.start_request("request")
+        try:
+            return await flight.do("k", upstream, "ok")
+        except DeadlineExceededError:
+            return "deadline"
+
+    async def run():
+        upstream = Upstream()
+        short = asyncio.create_task(call(upstream, 0.05))
+        long = asyncio.create_task(call(upstream, 5))
+        await asyncio.sleep(0.1)
+        assert short.done() and await short == "deadline"
+        upstream.release.set()
+        assert await long == "ok"
+        assert upstream.calls == 1
+        assert upstream.seen == [(None, None)]
+
+    asyncio.run(run())
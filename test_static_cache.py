@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试内存静态文件缓存：按 Accept-Encoding 选择预压缩内容、各编码的强ETag与304、缓存头、开发模式重新加载
+"""
+
+import sys
+import os
+import gzip
+import zlib
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from starlette.requests import Request
+from fastapi.testclient import TestClient
+
+import main
+from services import static_cache as static_cache_module
+from services.static_cache import StaticCache
+
+PAGE = ("<html><body>" + "支付宝登录" * 200 + "</body></html>").encode("utf-8")
+
+
+class FakeBrotli:
+    """未安装 brotli 时代替的压缩模块"""
+
+    @staticmethod
+    def compress(content: bytes, quality: int = 11) -> bytes:
+        return b"br" + zlib.compress(content, 9)
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "login.html").write_bytes(PAGE)
+    (tmp_path / "app.js").write_bytes(b"console.log('login');" * 50)
+    (tmp_path / "logo.png").write_bytes(os.urandom(512))
+    return tmp_path
+
+
+@pytest.fixture
+def cache(static_dir, monkeypatch):
+    monkeypatch.setattr(static_cache_module, "brotli", None)
+    return StaticCache(str(static_dir), max_age=600)
+
+
+def make_request(method: str = "GET", **headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": method,
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_encoding_negotiation(static_dir, monkeypatch):
+    """优先 br，其次 gzip；q=0 的编码不使用，* 匹配未列出的编码，没有 Accept-Encoding 时返回原始内容"""
+    monkeypatch.setattr(static_cache_module, "brotli", FakeBrotli)
+    asset = StaticCache(str(static_dir)).get("login.html")
+    assert list(asset.bodies) == ["br", "gzip", "identity"]
+
+    assert asset.choose_encoding("gzip, deflate, br") == "br"
+    assert asset.choose_encoding("br;q=0, gzip;q=0.5") == "gzip"
+    assert asset.choose_encoding("*") == "br"
+    assert asset.choose_encoding("*;q=0, gzip") == "gzip"
+    assert asset.choose_encoding("deflate") == "identity"
+    assert asset.choose_encoding("gzip;q=invalid") == "identity"
+    assert asset.choose_encoding("") == "identity"
+
+
+def test_precompressed_response(cache):
+    """返回预压缩内容与对应编码的ETag，HTML不缓存、其他资源按 max_age 缓存"""
+    response = cache.response(make_request(accept_encoding="gzip"), "login.html")
+    assert response.status_code == 200
+    assert gzip.decompress(response.body) == PAGE
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"].endswith('-gzip"')
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert response.headers["content-type"].startswith("text/html")
+
+    identity = cache.response(make_request(), "login.html")
+    assert identity.body == PAGE and "Content-Encoding" not in identity.headers
+    assert identity.headers["ETag"] != response.headers["ETag"]
+
+    script = cache.response(make_request(accept_encoding="gzip"), "app.js")
+    assert script.headers["Cache-Control"] == "public, max-age=600"
+
+
+def test_incompressible_asset(cache):
+    """压缩后不更小的内容只保留原始内容，不带 Vary"""
+    response = cache.response(make_request(accept_encoding="gzip, br"), "logo.png")
+    assert list(cache.get("logo.png").bodies) == ["identity"]
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+
+
+def test_not_modified(cache):
+    """If-None-Match 与任一编码的ETag相同（包括弱ETag与 *）时返回304，内容变化后的旧ETag不匹配"""
+    etag = cache.response(make_request(accept_encoding="gzip"), "login.html").headers["ETag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = cache.response(make_request(if_none_match=if_none_match), "login.html")
+        assert response.status_code == 304, if_none_match
+        assert response.body == b""
+        assert response.headers["ETag"] == cache.get("login.html").etag_for("identity")
+
+    assert cache.response(make_request(if_none_match='"stale"'), "login.html").status_code == 200
+    assert cache.stats()["not_modified"] == 4
+
+
+def test_head_request(cache):
+    """HEAD请求返回与GET相同的响应头和内容长度，不带响应体"""
+    response = cache.response(make_request("HEAD", accept_encoding="gzip"), "login.html")
+    assert response.body == b""
+    assert int(response.headers["Content-Length"]) == len(cache.get("login.html").bodies["gzip"])
+
+
+def test_missing_and_reload(static_dir, monkeypatch):
+    """未找到计数；开发模式下文件修改、新增、删除后立即生效，不能访问静态目录之外的文件"""
+    monkeypatch.setattr(static_cache_module, "brotli", None)
+    cache = StaticCache(str(static_dir), reload=True)
+    assert cache.response(make_request(), "missing.html") is None
+    old_etag = cache.get("login.html").etag
+
+    page = static_dir / "login.html"
+    page.write_bytes(b"<html>new</html>")
+    os.utime(page, ns=(page.stat().st_atime_ns, page.stat().st_mtime_ns + 10 ** 9))
+    assert cache.get("login.html").etag != old_etag
+    assert cache.response(make_request(), "login.html").body == b"<html>new</html>"
+
+    (static_dir / "new.css").write_bytes(b"body{}")
+    assert cache.get("new.css").bodies["identity"] == b"body{}"
+    (static_dir / "new.css").unlink()
+    assert cache.get("new.css") is None
+
+    (static_dir.parent / "secret.txt").write_bytes(b"secret")
+    assert cache.get("../secret.txt") is None
+
+    stats = cache.stats()
+    assert (stats["misses"], stats["reloads"]) == (1, 2)
+
+
+def test_login_page_served_from_memory():
+    """首页与静态页面带ETag，未修改时返回304，不存在的文件返回404"""
+    client = TestClient(main.app)
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "login.html"), "rb") as f:
+        assert response.content == f.read()
+
+    assert client.get("/", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert client.head("/static/success.html").status_code == 200
+    assert client.get("/static/missing.html").status_code == 404
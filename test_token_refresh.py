@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试访问令牌主动刷新：调度器按过期时间刷新与重试、持有旧刷新令牌的客户端取到最新令牌、刷新接口频率限制
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import main
+from config.alipay_config import alipay_config
+from rate_limiter import RateLimiter
+from services.async_alipay_service import AsyncAlipayService
+from services.token_refresh_scheduler import TokenRefreshScheduler
+from services.token_store import InMemoryTokenStore, build_token_info
+
+
+def token_dict(refresh_token: str, expires_in: int = 3600, user_id: str = "2088000000000001") -> dict:
+    return {
+        "access_token": f"access-{refresh_token}",
+        "expires_in": expires_in,
+        "refresh_token": refresh_token,
+        "re_expires_in": 86400,
+        "user_id": user_id,
+        "open_id": None,
+        "auth_start": None,
+    }
+
+
+class Gateway:
+    """按调用次数轮换刷新令牌的模拟网关，可设置为失败"""
+
+    def __init__(self, store, scheduler=None):
+        self.store = store
+        self.scheduler = scheduler
+        self.calls = []
+        self.fail = False
+
+    async def __call__(self, refresh_token):
+        self.calls.append(refresh_token)
+        if self.fail:
+            raise RuntimeError("网关错误")
+        token = build_token_info(token_dict(f"{refresh_token}-next"))
+        self.store.save(token)
+        if self.scheduler is not None:
+            self.scheduler.schedule(token)
+        return token_dict(token.refresh_token)
+
+
+def test_scheduler_refreshes_before_expiry():
+    """启动时加载已有令牌，临近过期的令牌在后台刷新，新令牌继续被跟踪"""
+    store = InMemoryTokenStore()
+    store.save(build_token_info(token_dict("soon", expires_in=5)))
+    store.save(build_token_info(token_dict("later", user_id="2088000000000002")))
+    scheduler = TokenRefreshScheduler(None, store, margin=10, jitter=0)
+    gateway = Gateway(store, scheduler)
+    scheduler.refresher = gateway
+
+    async def run():
+        scheduler.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
+    assert gateway.calls == ["soon"]
+    assert scheduler.stats()["tracked"] == 2
+    assert scheduler.refreshed == 1
+    assert store.get("2088000000000001").refresh_token == "soon-next"
+
+
+def test_scheduler_skips_replaced_tokens():
+    """同一用户的令牌被更新后，旧令牌的计划刷新直接跳过"""
+    store = InMemoryTokenStore()
+    scheduler = TokenRefreshScheduler(None, store, margin=10, jitter=0)
+    gateway = Gateway(store)
+    scheduler.refresher = gateway
+
+    async def run():
+        scheduler.schedule(build_token_info(token_dict("old", expires_in=5)))
+        scheduler.schedule(build_token_info(token_dict("new")))
+        scheduler.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
+    assert gateway.calls == []
+    assert scheduler.stats()["queued"] == 1
+
+
+def test_scheduler_retries_until_expiry():
+    """刷新失败后按间隔重试，访问令牌即将过期时不再重试"""
+    store = InMemoryTokenStore()
+    scheduler = TokenRefreshScheduler(None, store, margin=10, jitter=0, retry_interval=0.05)
+    gateway = Gateway(store)
+    gateway.fail = True
+    scheduler.refresher = gateway
+
+    async def run():
+        scheduler.schedule(build_token_info(token_dict("r1", expires_in=1)))
+        scheduler.start()
+        try:
+            await asyncio.sleep(1.3)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
+    assert 10 <= scheduler.failed == len(gateway.calls) <= 25
+    assert scheduler.stats()["tracked"] == 0
+
+
+def test_rotated_refresh_token_gets_latest(monkeypatch):
+    """客户端仍持有被主动刷新轮换的旧刷新令牌时，返回最新令牌；最新令牌即将过期时用最新的刷新令牌刷新"""
+    monkeypatch.setattr(alipay_config, "token_store_min_ttl", 300)
+    store = InMemoryTokenStore(alias_grace=0)
+    service = AsyncAlipayService(token_store=store)
+    store.save(build_token_info(token_dict("r1")))
+    store.save(build_token_info(token_dict("r2")))
+
+    refreshed = []
+
+    async def refresh(refresh_token):
+        refreshed.append(refresh_token)
+        return token_dict(f"{refresh_token}-next")
+
+    monkeypatch.setattr(service, "_refresh_access_token", refresh)
+
+    async def run():
+        assert (await service.refresh_access_token("r1"))["refresh_token"] == "r2"
+        store.save(build_token_info(token_dict("r3", expires_in=10)))
+        assert (await service.refresh_access_token("r1"))["refresh_token"] == "r3-next"
+
+    asyncio.run(run())
+    assert refreshed == ["r3"]
+
+
+def test_refresh_endpoint_rate_limited(monkeypatch):
+    """刷新令牌接口单独计数，超出限制返回429"""
+    monkeypatch.setattr(main, "refresh_rate_limiter", RateLimiter(max_requests=2, time_window=60))
+    client = TestClient(main.app)
+
+    statuses = [client.post("/api/auth/refresh", json={}).status_code for _ in range(3)]
+    assert statuses == [400, 400, 429]
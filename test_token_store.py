@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试令牌存储：绝对过期时间、按用户覆盖、刷新令牌轮换、过期清理与SQLite持久化
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from services.token_store import (
+    InMemoryTokenStore, SqliteTokenStore, TokenStore, build_token_info, create_token_store, token_info_to_dict
+)
+
+
+def make_token(refresh_token: str, user_id: str = "2088000000000001", re_expires_in: int = 86400,
+               expires_in: int = 3600, open_id: str = None):
+    return build_token_info({
+        "access_token": f"access-{refresh_token}",
+        "expires_in": expires_in,
+        "refresh_token": refresh_token,
+        "re_expires_in": re_expires_in,
+        "user_id": user_id,
+        "open_id": open_id,
+    })
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    """按参数创建令牌存储，测试结束后关闭"""
+    stores = []
+
+    def factory(alias_grace: float = 300):
+        if request.param == "memory":
+            store = InMemoryTokenStore(alias_grace=alias_grace)
+        else:
+            store = SqliteTokenStore(str(tmp_path / f"tokens-{len(stores)}.db"), alias_grace=alias_grace)
+        stores.append(store)
+        return store
+
+    yield factory
+    for store in stores:
+        store.close()
+
+
+def test_absolute_expiry_round_trip():
+    """保存绝对过期时间，返回给客户端时按剩余时间重新计算有效期"""
+    token = build_token_info({"access_token": "a", "expires_in": 3600, "refresh_token": "r",
+                              "re_expires_in": 86400, "user_id": "u"}, now=1000.0)
+    assert (token.expires_at, token.re_expires_at) == (4600.0, 87400.0)
+
+    result = token_info_to_dict(token, now=1600.0)
+    assert result["expires_in"] == 3000
+    assert result["re_expires_in"] == 85800
+    assert token_info_to_dict(token, now=5000.0)["expires_in"] == 0
+
+
+def test_current_refresh_token_reusable(make_store):
+    """当前刷新令牌可以多次查询，按 user_id 或 open_id 保存"""
+    store = make_store()
+    store.save(make_token("r1"))
+    store.save(make_token("o1", user_id=None, open_id="open-1"))
+    assert store.get_by_refresh_token("r1").refresh_token == "r1"
+    assert store.get_by_refresh_token("r1").refresh_token == "r1"
+    assert store.get("open-1").refresh_token == "o1"
+    assert store.get_by_refresh_token("unknown") is None
+
+
+def test_save_replaces_user_record(make_store):
+    """同一用户只保留最新记录，删除后按任一刷新令牌都查不到"""
+    store = make_store()
+    store.save(make_token("r1"))
+    store.save(make_token("r2"))
+    assert [token.refresh_token for token in store.list_tokens()] == ["r2"]
+
+    store.delete("2088000000000001")
+    assert store.get("2088000000000001") is None
+    assert store.get_by_refresh_token("r1") is None
+    assert store.get_by_refresh_token("r2") is None
+
+
+def test_rotated_refresh_token_reusable(make_store):
+    """被轮换的旧刷新令牌在旧访问令牌过期前可以多次使用，都返回最新令牌"""
+    store = make_store(0)
+    store.save(make_token("r1"))
+    store.save(make_token("r2"))
+    store.save(make_token("r3"))
+
+    for _ in range(2):
+        assert store.get_by_refresh_token("r1").refresh_token == "r3"
+        assert store.get_by_refresh_token("r2").refresh_token == "r3"
+    assert store.get_by_refresh_token("r3").refresh_token == "r3"
+
+
+def test_rotated_refresh_token_expires_with_old_access_token(make_store):
+    """旧访问令牌已过期且超过宽限期后，被轮换的旧刷新令牌失效，当前刷新令牌不受影响"""
+    store = make_store(0)
+    store.save(make_token("r1", expires_in=0))
+    store.save(make_token("r2"))
+
+    assert store.get_by_refresh_token("r1") is None
+    assert store.get_by_refresh_token("r2").refresh_token == "r2"
+
+    grace = make_store(300)
+    grace.save(make_token("r1", expires_in=0))
+    grace.save(make_token("r2"))
+    assert grace.get_by_refresh_token("r1").refresh_token == "r2"
+
+
+def test_expired_token_not_returned(make_store):
+    """刷新令牌过期后按任一刷新令牌都查不到，purge_expired 清理记录"""
+    store = make_store()
+    store.save(make_token("r1", re_expires_in=0))
+    store.save(make_token("other", user_id="2088000000000002"))
+
+    assert store.get_by_refresh_token("r1") is None
+    store.purge_expired()
+    assert [token.refresh_token for token in store.list_tokens()] == ["other"]
+
+
+def test_sqlite_store_persists(tmp_path):
+    """SQLite后端重新打开后记录仍然有效"""
+    path = str(tmp_path / "tokens.db")
+    store = SqliteTokenStore(path)
+    store.save(make_token("r1"))
+    store.close()
+
+    store = SqliteTokenStore(path)
+    try:
+        assert store.get_by_refresh_token("r1").access_token == "access-r1"
+    finally:
+        store.close()
+
+
+def test_memory_store_alias_index():
+    """删除记录时同时删除指向该用户的全部刷新令牌"""
+    store = InMemoryTokenStore(alias_grace=300)
+    store.save(make_token("r1"))
+    store.save(make_token("r2"))
+    store.save(make_token("x1", user_id="2088000000000002"))
+
+    store.delete("2088000000000001")
+    assert store.get_by_refresh_token("r1") is None
+    assert store.get_by_refresh_token("r2") is None
+    assert set(store._by_refresh_token) == {"x1"}
+    assert list(store._aliases) == ["2088000000000002"]
+
+
+def test_periodic_purge(make_store):
+    """后台任务定期清理过期记录，SQLite后端的调用不在事件循环线程中执行"""
+    store = make_store()
+    store.save(make_token("r1", re_expires_in=0))
+
+    async def run():
+        store.start_purge(0.01)
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            await store.stop_purge()
+        assert await store.call(store.list_tokens) == []
+
+    asyncio.run(run())
+    assert store.get("2088000000000001") is None
+
+
+def test_backend_selection():
+    """按配置创建后端，存储基类不能直接实例化"""
+    assert isinstance(create_token_store("memory"), InMemoryTokenStore)
+    with pytest.raises(ValueError):
+        create_token_store("redis")
+    with pytest.raises(TypeError):
+        TokenStore()
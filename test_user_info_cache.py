@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试用户信息缓存：新鲜期内命中、过期后先返回旧数据并在后台刷新、LRU上限与按用户复用
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from services import deadline, user_info_cache
+from services.user_info_cache import UserInfoCache
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(user_info_cache.time, "monotonic", fake)
+    return fake
+
+
+class Fetcher:
+    """返回带版本号的用户信息，记录每次调用时的请求时限"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    async def __call__(self, access_token):
+        self.calls.append((access_token, deadline.remaining()))
+        if self.fail:
+            raise RuntimeError("网关错误")
+        return {"user_id": "2088000000000001", "nick_name": f"v{len(self.calls)}"}
+
+
+def test_fresh_entry_hits(clock):
+    """新鲜期内不访问网关"""
+    fetcher = Fetcher()
+    cache = UserInfoCache(fetcher, ttl=60, stale_ttl=60)
+
+    async def run():
+        assert (await cache.get("t1"))["nick_name"] == "v1"
+        clock.now += 59
+        assert (await cache.get("t1"))["nick_name"] == "v1"
+
+    asyncio.run(run())
+    assert len(fetcher.calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_stale_while_revalidate(clock):
+    """宽限期内立即返回旧数据，后台只发起一次刷新，刷新不受触发请求的时限约束"""
+    fetcher = Fetcher()
+    cache = UserInfoCache(fetcher, ttl=60, stale_ttl=60)
+
+    async def run():
+        await cache.get("t1")
+        clock.now += 61
+        deadline.set_deadline(0.5)
+        assert (await cache.get("t1"))["nick_name"] == "v1"
+        assert (await cache.get("t1"))["nick_name"] == "v1"
+        await asyncio.sleep(0)
+        assert (await cache.get("t1"))["nick_name"] == "v2"
+
+    asyncio.run(run())
+    assert cache.stats()["stale_hits"] == 2
+    assert cache.refreshes == 1
+    assert fetcher.calls[1] == ("t1", None)
+
+
+def test_refresh_failure_keeps_stale_data(clock):
+    """后台刷新失败时保留旧数据，宽限期结束后同步获取"""
+    fetcher = Fetcher()
+    cache = UserInfoCache(fetcher, ttl=60, stale_ttl=60)
+
+    async def run():
+        await cache.get("t1")
+        fetcher.fail = True
+        clock.now += 61
+        assert (await cache.get("t1"))["nick_name"] == "v1"
+        await asyncio.sleep(0)
+        assert cache.refresh_errors == 1
+
+        clock.now += 60
+        with pytest.raises(RuntimeError):
+            await cache.get("t1")
+
+    asyncio.run(run())
+
+
+def test_lru_cap(clock):
+    """条目数超过上限时淘汰最久未使用的令牌"""
+    fetcher = Fetcher()
+    cache = UserInfoCache(fetcher, ttl=60, max_entries=2)
+
+    async def run():
+        await cache.get("t1")
+        await cache.get("t2")
+        await cache.get("t1")
+        await cache.get("t3")
+        await cache.get("t1")
+        await cache.get("t2")
+
+    asyncio.run(run())
+    assert [token for token, _ in fetcher.calls] == ["t1", "t2", "t3", "t2"]
+    assert cache.evictions == 2
+    assert cache.stats()["size"] == 2
+
+
+def test_same_user_new_token_reuses_entry(clock):
+    """同一用户换了访问令牌时按user_id复用缓存，失效时一并删除"""
+    fetcher = Fetcher()
+    cache = UserInfoCache(fetcher, ttl=60)
+
+    async def run():
+        await cache.get("t1")
+        assert (await cache.get("t2", user_id="2088000000000001"))["nick_name"] == "v1"
+        cache.invalidate(user_id="2088000000000001")
+        assert (await cache.get("t2"))["nick_name"] == "v2"
+
+    asyncio.run(run())
+    assert len(fetcher.calls) == 2